@@ -0,0 +1,43 @@
+"""Fonts and rendered labels, loaded when first used and shared by every part of the app and every app in the
+process."""
+import pygame
+
+FONT_FILE = 'freesansbold.ttf'  # Font of every label, bundled with Pygame
+
+fonts = {}  # Loaded fonts by size
+labels = {}  # Rendered labels by (text, size, color, background)
+
+
+def font(size):
+    """
+    Loads the font the first time a size is asked for. The font module must be initialized.
+    :param size: The size of the font in points.
+    :type size: int
+    :returns: The font of that size.
+    :rtype: pygame.font.Font
+    """
+    loaded = fonts.get(size)
+    if loaded is None:
+        loaded = fonts[size] = pygame.font.Font(FONT_FILE, size)
+    return loaded
+
+
+def label(text, size, color, background=None):
+    """
+    Renders a label the first time it is asked for. It is shared, so it must not be drawn on.
+    :param text: The text of the label.
+    :type text: str
+    :param size: The size of the font in points.
+    :type size: int
+    :param color: The color of the text.
+    :type color: tuple
+    :param background: The color behind the text, or None for a transparent background.
+    :type background: tuple
+    :returns: The rendered label.
+    :rtype: pygame.Surface
+    """
+    key = (text, size, color, background)
+    rendered = labels.get(key)
+    if rendered is None:
+        rendered = labels[key] = font(size).render(text, True, color, background)
+    return rendered
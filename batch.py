@@ -0,0 +1,170 @@
+"""Renders drawing scripts to images without opening a window.
+
+A script is a text file with one command per line. Blank lines and lines starting with # are ignored.
+    size W H              size of the canvas; must come before any drawing (450 450 by default)
+    color R G B           color of the paintbrush (black by default)
+    thickness N           thickness of the paintbrush in pixels (10 by default)
+    opacity P             opacity of the paintbrush in percent (100 by default)
+    antialias 0|1         whether opaque strokes are stamped with blended edges or drawn as lines (0 by default)
+    draw X Y [X Y ...]    draws a stroke through the points with the paintbrush
+    erase X Y [X Y ...]   erases along a stroke through the points
+    fill X Y [4|8]        fills the region containing X, Y with the paintbrush color
+    replace X Y [TOL]     recolors the pixels of the color at X, Y (or within RGB distance TOL of it) to the
+                          paintbrush color
+    clear                 resets the canvas
+Each script is rendered offscreen and saved as a PNG image named after the script.
+
+Run with
+    python3 batch.py --output-dir out --jobs 4 scripts/*.txt
+"""
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # Or every worker process prints it
+
+import pygame  # noqa: E402
+
+from canvas import Canvas  # noqa: E402
+from paint import PaintApp, PaintBrush  # noqa: E402
+
+BACKGROUND_COLOR = (255, 255, 255)
+
+# Number of integer arguments each command takes, as (fewest, most); None for any even number of at least 2
+COMMAND_ARGUMENTS = {"size": (2, 2), "color": (3, 3), "thickness": (1, 1), "opacity": (1, 1), "antialias": (1, 1),
+                     "draw": None, "erase": None, "fill": (2, 3), "replace": (2, 3), "clear": (0, 0)}
+
+
+def parse_script(lines):
+    """
+    :param lines: The lines of a script.
+    :type lines: iterable
+    :returns: The (name, arguments) of each command of the script.
+    :rtype: list
+    :raises ValueError: If a line isn't a valid command.
+    """
+    commands = []
+    for number, line in enumerate(lines, 1):
+        words = line.split()
+        if not words or words[0].startswith("#"):
+            continue
+        name = words[0].lower()
+        if name not in COMMAND_ARGUMENTS:
+            raise ValueError("line %d: unknown command %r" % (number, words[0]))
+        try:
+            arguments = [int(word) for word in words[1:]]
+        except ValueError:
+            raise ValueError("line %d: %s takes integer arguments" % (number, name)) from None
+        counts = COMMAND_ARGUMENTS[name]
+        if counts is None:
+            valid = len(arguments) >= 2 and len(arguments) % 2 == 0
+        else:
+            valid = counts[0] <= len(arguments) <= counts[1]
+        if not valid:
+            raise ValueError("line %d: wrong number of arguments for %s" % (number, name))
+        if name == "size" and commands:
+            raise ValueError("line %d: size must come before the other commands" % number)
+        commands.append((name, arguments))
+    return commands
+
+
+def render(commands):
+    """
+    Runs the commands of a script on a new canvas.
+    :param commands: The (name, arguments) of each command, as returned by parse_script.
+    :type commands: list
+    :returns: The painted canvas.
+    :rtype: Canvas
+    """
+    size = (PaintApp.WINDOW_WIDTH, PaintApp.WINDOW_WIDTH)
+    if commands and commands[0][0] == "size":
+        size = commands[0][1]
+    canvas = Canvas(size[0], size[1], BACKGROUND_COLOR)
+    pb = PaintBrush()
+    for name, arguments in commands:
+        if name == "color":
+            pb.set_color(tuple(arguments))
+        elif name == "thickness":
+            pb.set_thickness(arguments[0])
+        elif name == "opacity":
+            pb.opacity = min(max(arguments[0], 0), 100) / 100
+        elif name == "antialias":
+            pb.antialias = bool(arguments[0])
+        elif name == "draw" or name == "erase":
+            pb.is_painting = name == "draw"
+            pb.end_stroke()  # Each command is a stroke of its own
+            pb.draw_stroke(canvas, list(zip(arguments[::2], arguments[1::2])), BACKGROUND_COLOR)
+        elif name == "fill":
+            pos = tuple(arguments[:2])
+            if canvas.get_rect().collidepoint(pos):
+                canvas.fill(pos, canvas.get_at(pos), pb.color, arguments[2] if len(arguments) > 2 else 8)
+        elif name == "replace":
+            pos = tuple(arguments[:2])
+            if canvas.get_rect().collidepoint(pos):
+                canvas.replace(canvas.get_at(pos), pb.color, arguments[2] if len(arguments) > 2 else 0)
+        elif name == "clear":
+            canvas.clear()
+    return canvas
+
+
+def render_script(path, output_dir):
+    """
+    Renders a script file and saves the image. Runs in the worker processes.
+    :param path: The path of the script.
+    :type path: str
+    :param output_dir: The directory to save the image in.
+    :type output_dir: str
+    :returns: The path of the image, or None if the script failed, the seconds it took, and the error message if
+        the script failed.
+    :rtype: tuple
+    """
+    started = time.perf_counter()
+    output = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + ".png")
+    try:
+        with open(path) as script:
+            commands = parse_script(script)
+        pygame.image.save(render(commands).to_surface(), output)
+    except (OSError, ValueError, pygame.error) as error:
+        return None, time.perf_counter() - started, str(error)
+    return output, time.perf_counter() - started, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render drawing scripts to images without opening a window.")
+    parser.add_argument("scripts", nargs="+", help="script files to render")
+    parser.add_argument("-o", "--output-dir", default=".", help="directory to save the images in")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of processes to render scripts in")
+    args = parser.parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    failures = 0
+    output_dirs = [args.output_dir] * len(args.scripts)
+    if args.jobs > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(args.jobs)
+        # Hand out scripts a few at a time so short scripts don't wait on inter-process round trips
+        results = executor.map(render_script, args.scripts, output_dirs,
+                               chunksize=max(1, len(args.scripts) // (4 * args.jobs)))
+    else:
+        executor = None
+        results = map(render_script, args.scripts, output_dirs)
+    for path, (output, seconds, error) in zip(args.scripts, results):
+        if error is None:
+            print("%s -> %s %.1f ms" % (path, output, 1000 * seconds))
+        else:
+            failures += 1
+            print("%s: %s" % (path, error), file=sys.stderr)
+    if executor is not None:
+        executor.shutdown()
+    elapsed = time.perf_counter() - started
+    rendered = len(args.scripts) - failures
+    print("%d images in %.2f s with %d job(s), %.1f images/s"
+          % (rendered, elapsed, args.jobs, rendered / elapsed))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
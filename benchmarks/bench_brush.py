@@ -0,0 +1,85 @@
+"""Compares the anti-aliased stamp brush against the hard-edged lines the brush draws by default, on the same strokes
+painted a frame's worth of cursor movement at a time, for each brush thickness.
+Throughput is given in stamps per second: the number of stamps the anti-aliased brush places along the strokes,
+divided by the time each way takes to paint them.
+
+Run from the repository root with
+    python3 benchmarks/bench_brush.py
+No window is opened; the SDL dummy video driver is used.
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from brush import BrushStroke, StampCache  # noqa: E402
+from canvas import Canvas  # noqa: E402
+
+SIZE = 1024
+STROKES = 40
+POINTS_PER_FRAME = 4  # Cursor samples drawn together by one flush of the stroke
+BLACK = (0, 0, 0)
+
+
+def random_strokes(seed=1):
+    """:returns: Random walks across the canvas, with steps as long as the cursor moves between two samples."""
+    rng = random.Random(seed)
+    strokes = []
+    for _ in range(STROKES):
+        x, y = rng.randrange(SIZE), rng.randrange(SIZE)
+        points = []
+        for _ in range(60):
+            x = min(max(x + rng.randint(-12, 12), 0), SIZE - 1)
+            y = min(max(y + rng.randint(-12, 12), 0), SIZE - 1)
+            points.append((x, y))
+        strokes.append(points)
+    return strokes
+
+
+def frames(points):
+    """:returns: The points drawn by each flush of a stroke, each starting where the last one ended."""
+    return [points[max(i - 1, 0):i + POINTS_PER_FRAME] for i in range(0, len(points), POINTS_PER_FRAME)]
+
+
+def paint(strokes, thickness, stamps, antialias):
+    canvas = Canvas(SIZE, SIZE)
+    count = 0
+    for points in strokes:
+        stroke = BrushStroke(canvas, BLACK, thickness, 1.0, stamps, antialias=antialias)
+        for part in frames(points):
+            stroke.add(part)
+        count += stroke.stamps
+    return count
+
+
+def best_time(operation, repeats=5):
+    """:returns: The shortest time an operation took in seconds, and what it returned."""
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = operation()
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+
+def main():
+    pygame.init()
+    strokes = random_strokes()
+    stamps = StampCache()
+    print("%-10s %8s %12s %12s %14s %14s" % ("thickness", "stamps", "lines (ms)", "stamps (ms)", "lines stamps/s",
+                                              "stamps/s"))
+    for thickness in (10, 20, 30, 40):
+        lines_time, _ = best_time(lambda: paint(strokes, thickness, stamps, False))
+        stamps_time, count = best_time(lambda: paint(strokes, thickness, stamps, True))
+        print("%-10d %8d %12.1f %12.1f %14.0f %14.0f" % (thickness, count, 1000 * lines_time, 1000 * stamps_time,
+                                                          count / lines_time, count / stamps_time))
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
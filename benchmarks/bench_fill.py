@@ -0,0 +1,152 @@
+"""Compares PaintApp.fill, which looks its region up in the canvas's region index, against the original per-pixel
+BFS fill, both the first time the painting is filled and when it is filled again.
+
+Run from the repository root with
+    python3 benchmarks/bench_fill.py
+No window is opened; the SDL dummy video driver is used.
+"""
+import collections
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from paint import PaintApp  # noqa: E402
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+
+
+def bfs_fill(win, width, start_pos, tar, repl):
+    """
+    The original 8-way BFS fill of PaintApp.fill, kept as the reference implementation.
+    :param win: The surface to fill on.
+    :type win: pygame.Surface
+    :param width: The width and height of the painting area.
+    :type width: int
+    :param start_pos: The starting position from which to fill the contiguous region.
+    :type start_pos: tuple
+    :param tar: The color of the region to fill.
+    :type tar: tuple
+    :param repl: The color to fill the region with.
+    :type repl: tuple
+    """
+    dx = [-1, 0, 1, -1, 1, -1, 0, 1]
+    dy = [-1, -1, -1, 0, 0, 1, 1, 1]
+    visited = [[False for _ in range(width + 1)] for _ in range(width + 1)]
+    if tar == repl:
+        return
+    bfs_queue = collections.deque()
+    bfs_queue.append((start_pos[0], start_pos[1]))
+    while len(bfs_queue) > 0:
+        top_point = bfs_queue.popleft()
+        pygame.draw.rect(win, repl, (top_point[0], top_point[1], 1, 1))
+        for i in range(8):
+            new_x = top_point[0] + dx[i]
+            new_y = top_point[1] + dy[i]
+            if 0 <= new_x < width and 0 <= new_y < width and win.get_at((new_x, new_y)) == tar and not \
+                    visited[new_x][new_y]:
+                bfs_queue.append((new_x, new_y))
+                visited[new_x][new_y] = True
+
+
+def draw_empty(painting, width):
+    """Clears the painting so the whole canvas is one region."""
+    painting.fill(WHITE, (0, 0, width, width))
+
+
+def draw_maze(painting, width):
+    """Draws walls every 4 pixels with alternating gaps, making one long serpentine corridor."""
+    draw_empty(painting, width)
+    for y in range(3, width - 1, 4):
+        gap_x = 0 if (y // 4) % 2 else width - 2
+        painting.fill(BLACK, (0, y, width, 1))
+        painting.fill(WHITE, (gap_x, y, 2, 1))
+
+
+def draw_tiny(painting, width):
+    """Draws a 5x5 box enclosing a 3x3 region in the middle of the painting."""
+    draw_empty(painting, width)
+    pygame.draw.rect(painting, BLACK, (width // 2 - 2, width // 2 - 2, 5, 5), 1)
+
+
+def draw_noise(painting, width):
+    """Paints 45% of the pixels black at random, so regions have ragged, diagonally connected edges."""
+    draw_empty(painting, width)
+    noise = np.random.default_rng(1).random((width, width)) < 0.45
+    pixels = pygame.surfarray.pixels2d(painting)
+    pixels[noise] = painting.map_rgb(BLACK)
+    del pixels
+
+
+SCENARIOS = {"full canvas": draw_empty, "maze": draw_maze, "tiny region": draw_tiny, "noise": draw_noise}
+
+
+def time_bfs(scenario, width, repeats):
+    """
+    Times the BFS fill of the middle of a painting of the scenario.
+    :returns: The best time in seconds and the filled painting of the last run.
+    :rtype: tuple
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        painting = pygame.Surface((width, width), 0, 32)
+        scenario(painting, width)
+        started = time.perf_counter()
+        bfs_fill(painting, width, (width // 2, width // 2), WHITE, RED)
+        best = min(best, time.perf_counter() - started)
+    return best, pygame.surfarray.array2d(painting)
+
+
+def time_fill(app, scenario, connectivity, repeats):
+    """
+    Times PaintApp.fill of the middle of the painting, painting the scenario before each run so that the region
+    index has to label it, and then times filling the same region again.
+    :returns: The best time in seconds of the first fill and of the fills after it, and the painting after the first
+        fill of the last run.
+    :rtype: tuple
+    """
+    width = app.WINDOW_WIDTH
+    center = (width // 2, width // 2)
+    painting = pygame.Surface((width, width), 0, 32)
+    scenario(painting, width)
+    best = best_again = float("inf")
+    for _ in range(repeats):
+        app.canvas.clear()
+        app.canvas.blit(painting, (0, 0))
+        started = time.perf_counter()
+        app.fill(center, WHITE, RED, connectivity)
+        best = min(best, time.perf_counter() - started)
+        filled = pygame.surfarray.array2d(app.canvas.to_surface())
+        for tar, repl in ((RED, BLUE), (BLUE, RED)):
+            started = time.perf_counter()
+            app.fill(center, tar, repl, connectivity)
+            best_again = min(best_again, time.perf_counter() - started)
+    return best, best_again, filled
+
+
+def main():
+    app = PaintApp()
+    width = app.WINDOW_WIDTH
+    print("%-12s %6s %12s %12s %12s %9s" % ("scenario", "conn", "bfs (ms)", "first (ms)", "again (ms)", "speedup"))
+    for name, scenario in SCENARIOS.items():
+        bfs_time, bfs_painting = time_bfs(scenario, width, 1)
+        for connectivity in (8, 4):
+            first_time, again_time, painting = time_fill(app, scenario, connectivity, 20)
+            # The connectivities only fill different pixels when regions touch diagonally
+            if connectivity == 8 or name != "noise":
+                assert (painting == bfs_painting).all(), "fill differs from the BFS fill on %s" % name
+            print("%-12s %6d %12.2f %12.3f %12.3f %8.0fx" % (name, connectivity, bfs_time * 1000, first_time * 1000,
+                                                               again_time * 1000, bfs_time / first_time))
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Times importing a 4000x3000 photo saved as JPEG and PNG: decoding it, scaling it down to fit the painting by area
+averaging, and quantizing it to the colors of the panel with and without dithering, against scaling it down with
+pygame.transform.smoothscale.
+
+Run from the repository root with
+    python3 benchmarks/bench_import.py
+No window is opened; the SDL dummy video driver is used.
+"""
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np  # noqa: E402
+import pygame  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import imaging  # noqa: E402
+from paint import Panel  # noqa: E402
+
+PHOTO_SIZE = (4000, 3000)  # Width and height of the photo imported
+BOUNDS = ((450, 450), (2048, 2048))  # Sizes of painting the photo is scaled down to fit
+RUNS = 5  # Times each step is timed, the fastest kept
+
+
+def photo():
+    """:returns: A surface of smooth gradients with noise over them, compressing about as well as a photo."""
+    x, y = np.meshgrid(np.linspace(0, 1, PHOTO_SIZE[0]), np.linspace(0, 1, PHOTO_SIZE[1]), indexing="ij")
+    rng = np.random.default_rng(1)
+    channels = [128 + 100 * np.sin(6 * x + 2 * y), 255 * x * y, 128 + 100 * np.cos(5 * y - 3 * x)]
+    pixels = np.stack(channels, axis=2) + rng.normal(0, 8, PHOTO_SIZE + (3,))
+    return pygame.surfarray.make_surface(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def fastest(function):
+    """:returns: The fewest milliseconds a call of function took over RUNS calls, and what it returned."""
+    best = None
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return 1000 * best, result
+
+
+def main():
+    pygame.font.init()  # The panel renders the labels of its buttons
+    palette = [(255, 255, 255)] + list(Panel().colors.values())
+    image = photo()
+    with tempfile.TemporaryDirectory() as directory:
+        print("%-5s %-11s %10s %13s %13s %12s %11s %12s" % ("file", "size", "decode (ms)", "average (ms)",
+                                                           "quantize (ms)", "dither (ms)", "total (ms)",
+                                                           "smooth (ms)"))
+        for extension in ("jpg", "png"):
+            path = os.path.join(directory, "photo." + extension)
+            pygame.image.save(image, path)
+            decode, (rgb, _) = fastest(lambda: imaging.decode(path))
+            for bounds in BOUNDS:
+                size = imaging.fit_size(rgb.shape[:2], bounds)
+                average, pixels = fastest(lambda: imaging.area_average(rgb, size))
+                quantize, _ = fastest(lambda: imaging.quantize(pixels, palette))
+                dither, _ = fastest(lambda: imaging.quantize(pixels, palette, dither=True))
+                total, _ = fastest(lambda: imaging.load_image(path, bounds, palette=palette, dither=True))
+                smooth, _ = fastest(lambda: pygame.transform.smoothscale(image, size))
+                print("%-5s %-11s %10.1f %13.1f %13.1f %12.1f %11.1f %12.1f"
+                      % (extension, "%dx%d" % size, decode, average, quantize, dither, total, smooth))
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Times compositing the area a brushstroke changed on the middle layer of paintings of growing layer counts, through
+the cached composites of the layers below and above it, against blending every layer of the stack over the area.
+
+Run from the repository root with
+    python3 benchmarks/bench_layers.py
+No window is opened; the SDL dummy video driver is used.
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from brush import BrushStroke, StampCache  # noqa: E402
+from canvas import Canvas  # noqa: E402
+from layers import LayerStack  # noqa: E402
+
+SIZE = 1024
+LAYER_COUNTS = (1, 2, 4, 8, 16, 32)
+STROKES = 200  # Strokes painted on the active layer and timed
+WHITE = (255, 255, 255)
+
+
+def painted_stack(layer_count, rng, stamps):
+    """:returns: A stack of layers with a few translucent strokes on each, the middle one active."""
+    stack = LayerStack(Canvas(SIZE, SIZE, WHITE))
+    for index in range(layer_count):
+        if index:
+            stack.add()
+        canvas = stack.active_layer().canvas
+        for _ in range(4):
+            stroke = BrushStroke(canvas, tuple(rng.randrange(256) for _ in range(3)), 40, 0.7, stamps)
+            stroke.add([(rng.randrange(SIZE), rng.randrange(SIZE)) for _ in range(5)])
+        stack.active_layer().opacity = 0.8 if index else 1.0
+    stack.select(layer_count // 2)
+    stack.rebuild()
+    return stack
+
+
+def blend_all(stack, rect):
+    """Composites an area by blending every layer of the stack over the background, as without the caches."""
+    composite = stack.composite
+    for tile in composite.tiles_under(rect):
+        tile_rect = composite.tile_rect(tile)
+        area = tile_rect.clip(rect).move(-tile_rect.left, -tile_rect.top)
+        surface = composite.surface(tile)
+        surface.fill(composite.background_color, area)
+        for layer in stack.layers:
+            stack.blend(surface, layer, tile, area)
+
+
+def time_edits(stack, strokes, stamps, composite):
+    """:returns: The milliseconds taken to composite the area changed by each stroke on average."""
+    total = 0.0
+    for points in strokes:
+        changed = BrushStroke(stack.active_layer().canvas, (0, 0, 0), 20, 1.0, stamps).add(points)
+        started = time.perf_counter()
+        composite(stack, changed)
+        total += time.perf_counter() - started
+    return 1000 * total / len(strokes)
+
+
+def main():
+    pygame.init()
+    stamps = StampCache()
+    rng = random.Random(1)
+    strokes = []
+    for _ in range(STROKES):
+        x, y = rng.randrange(SIZE), rng.randrange(SIZE)
+        strokes.append([(x, y), (x + rng.randint(-60, 60), y + rng.randint(-60, 60))])
+    print("%-8s %14s %14s" % ("layers", "cached (ms)", "all layers"))
+    for layer_count in LAYER_COUNTS:
+        stack = painted_stack(layer_count, random.Random(layer_count), stamps)
+        if stack.composite is None:
+            stack.set_opacity(0.99)  # Composite a single layer too, for comparison
+        cached = time_edits(stack, strokes, stamps, LayerStack.update)
+        blended = time_edits(stack, strokes, stamps, blend_all)
+        print("%-8d %14.3f %14.3f" % (layer_count, cached, blended))
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Measures the CPU used by PaintApp.run while idle and its input-to-pixel latency while drawing a stroke.
+
+Run from the repository root with
+    python3 benchmarks/bench_loop.py [--fps N]
+No window is opened; the SDL dummy video driver is used and input is posted from a second thread.
+"""
+import argparse
+import math
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from paint import PaintApp  # noqa: E402
+
+IDLE_SECONDS = 2.0
+STROKE_SAMPLES = 2000
+SAMPLE_INTERVAL = 0.001  # Seconds between two posted mouse motions
+
+
+def feed_input(results):
+    """
+    Leaves the app idle, then draws a circular stroke and quits.
+    :param results: Dictionary the idle CPU use is stored in.
+    :type results: dict
+    """
+    time.sleep(0.5)  # Let the app show its first frame
+    cpu_started = time.process_time()
+    time.sleep(IDLE_SECONDS)
+    results["idle cpu"] = (time.process_time() - cpu_started) / IDLE_SECONDS
+
+    pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(225, 125), button=1))
+    for i in range(STROKE_SAMPLES):
+        angle = 2 * math.pi * i / STROKE_SAMPLES
+        pos = (225 + int(100 * math.sin(angle)), 225 - int(100 * math.cos(angle)))
+        pygame.event.post(pygame.event.Event(pygame.MOUSEMOTION, pos=pos, rel=(0, 0), buttons=(1, 0, 0)))
+        time.sleep(SAMPLE_INTERVAL)
+    pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONUP, pos=(225, 125), button=1))
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fps", type=int, default=60, help="target frames per second of the app")
+    args = parser.parse_args()
+
+    app = PaintApp(target_fps=args.fps)
+    results = {}
+    feeder = threading.Thread(target=feed_input, args=(results,), daemon=True)
+    feeder.start()
+    try:
+        app.run(show_stats=True)
+    except SystemExit:
+        pass
+    feeder.join()
+    print("idle cpu: %.2f%% of a core" % (100 * results["idle cpu"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Profiles the CPU time of a frame of PaintApp.run without input, with the retained Panel and with the original
+Panel, which re-rendered every button and updated the whole display on every frame.
+
+Run from the repository root with
+    python3 benchmarks/bench_panel.py
+No window is opened; the SDL dummy video driver is used.
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from paint import PaintApp, Panel  # noqa: E402
+
+BLUE = (0, 255, 255)
+RED = (255, 0, 0)
+BLACK = (0, 0, 0)
+FRAMES = 2000
+
+
+class LegacyPanel(Panel):
+    """Does the per-frame work of the original Panel: a new font, every label rendered again, the color rectangles
+    rebuilt, everything blitted and a full display update."""
+
+    TOOL_LABELS = {"Fill": " F ", "Draw": " D ", "Erase": " E ", "Replace": " R ", "Clear": " C "}
+    BRUSH_LABELS = {10: " 1 ", 20: " 2 ", 30: " 3 ", 40: " 4 "}
+
+    def __init__(self):
+        super().__init__()
+        self.font = pygame.font.Font('freesansbold.ttf', 16)
+
+    def set_to_indicate_as_current_tool(self, tool):
+        self.font = pygame.font.Font('freesansbold.ttf', 16)
+        self.tool_images = {t: (self.font.render(label, True, BLACK, BLUE),) * 2 for t, label in
+                            self.TOOL_LABELS.items()}
+        self.tool_images[tool] = (self.font.render(self.TOOL_LABELS[tool], True, BLACK, RED),) * 2
+        self.tool = tool
+
+    def set_to_indicate_as_current_brush_thickness(self, thickness):
+        self.brush_images = {t: (self.font.render(label, True, BLACK, BLUE),) * 2 for t, label in
+                             self.BRUSH_LABELS.items()}
+        self.brush_images[thickness] = (self.font.render(self.BRUSH_LABELS[thickness], True, BLACK, RED),) * 2
+        self.thickness = thickness
+
+    def set_to_indicate_as_current_color(self, color):
+        self.color_cells = {name: pygame.rect.RectType(cell) for name, cell in self.color_cells.items()}
+        self.color = color
+
+    def display(self, win, dirty=None):
+        for tool, button in self.get_tool_buttons().items():
+            win.blit(button[0], button[1])
+        for thickness, button in self.get_brush_buttons().items():
+            win.blit(button[0], button[1])
+        pygame.draw.rect(win, (255, 255, 255), (self.COLOR_STRIP_X, self.COLOR_STRIP_Y, self.COLOR_STRIP_WIDTH,
+                                                self.COLOR_STRIP_HEIGHT))
+        for name, button in self.get_color_buttons().items():
+            pygame.draw.rect(win, button[0], button[1])
+        # The original pushed the whole window to the display
+        if dirty is None:
+            pygame.display.update()
+        else:
+            dirty.add(win.get_rect())
+
+
+def profile(panel_class):
+    """
+    Handles FRAMES frames without input.
+    :returns: The CPU time per frame in microseconds and the number of pixels pushed to the display.
+    :rtype: tuple
+    """
+    app = PaintApp()
+    app.panel = panel_class()
+    started = time.process_time()
+    for _ in range(FRAMES):
+        app.handle_frame([])
+    return (time.process_time() - started) / FRAMES * 1e6, app.dirty.total_pixels_pushed
+
+
+def main():
+    print("%-10s %18s %16s" % ("panel", "cpu/frame (us)", "pixels pushed"))
+    for name, panel_class in (("original", LegacyPanel), ("retained", Panel)):
+        cpu, pushed = profile(panel_class)
+        print("%-10s %18.1f %16d" % (name, cpu, pushed))
+
+
+if __name__ == '__main__':
+    main()
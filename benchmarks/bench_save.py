@@ -0,0 +1,65 @@
+"""Times saving a painting as a PNG image and in the native format, an autosave checkpoint after a stroke, and
+recovering an autosaved session, on canvases of growing size with the same painted area.
+
+Run from the repository root with
+    python3 benchmarks/bench_save.py
+No window is opened; the SDL dummy video driver is used.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import storage  # noqa: E402
+from brush import BrushStroke  # noqa: E402
+from canvas import Canvas  # noqa: E402
+
+SIZES = (1000, 4000, 16000)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+
+
+def timed(operation):
+    """:returns: The milliseconds the operation took."""
+    started = time.perf_counter()
+    operation()
+    return 1000 * (time.perf_counter() - started)
+
+
+def main():
+    pygame.init()
+    directory = tempfile.mkdtemp()
+    print("%-12s %10s %10s %12s %10s %10s" % ("canvas", "png (ms)", "native", "checkpoint", "journal", "recover"))
+    try:
+        for size in SIZES:
+            canvas = Canvas(size, size)
+            # The same strokes on every canvas: a painted area of 1000x1000 pixels
+            for y in range(0, 1000, 50):
+                BrushStroke(canvas, BLACK, 10, antialias=False).add([(0, y), (999, y + 25)])
+            canvas.fill((500, 10), (255, 255, 255), RED)
+            png = timed(lambda: storage.save(canvas, os.path.join(directory, "painting.png"))) \
+                if size <= 4000 else float("nan")  # A PNG of the whole canvas soon takes seconds
+            native = timed(lambda: storage.save(canvas, os.path.join(directory, "painting.canvas")))
+            autosave_dir = os.path.join(directory, "autosave%d" % size)
+            autosaver = storage.Autosaver(canvas, autosave_dir)
+            BrushStroke(canvas, RED, 20, antialias=False).add([(100, 100), (400, 300)])
+            checkpoint = timed(autosaver.checkpoint)
+            # The journal is written in the background; wait for it to measure how long it took
+            journal = timed(lambda: (autosaver.pending.put(None), autosaver.thread.join()))
+            autosaver.journal.close()
+            recover = timed(lambda: storage.recover(autosave_dir))
+            print("%-12s %10.1f %10.1f %12.3f %10.1f %10.1f" % ("%dx%d" % (size, size), png, native, checkpoint,
+                                                                 journal, recover))
+    finally:
+        shutil.rmtree(directory)
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Times moving a selection of growing size over a painted canvas: a frame of dragging the floating pixels, which only
+redraws the part of the window the selection left and the part it covers, against redrawing the whole viewport each
+frame; lifting the pixels off the painting and dropping them back; and the bytes the clipboard keeps for them.
+
+Run from the repository root with
+    python3 benchmarks/bench_selection.py
+No window is opened; the SDL dummy video driver is used.
+"""
+import math
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from paint import PaintApp  # noqa: E402
+
+SELECTION_SIZES = (32, 64, 128, 256, 400)  # Width and height in canvas pixels of the selections moved
+FRAMES = 300  # Frames of dragging timed for each selection, the selection moving a little each frame
+LIFTS = 20  # Times each selection is lifted and dropped
+
+
+def painted_app(indexed=False):
+    """:returns: An app whose painting is covered in strokes, so redrawing the viewport blits allocated tiles."""
+    app = PaintApp(canvas_size=(2048, 2048), indexed=indexed)
+    rng = random.Random(1)
+    colors = list(app.panel.colors.values())
+    for _ in range(60):
+        app.pb.set_color(rng.choice(colors))
+        app.prev_pos = None
+        app.stroke_points = [(rng.randrange(450), rng.randrange(450)) for _ in range(5)]
+        app.flush_stroke()
+    app.prev_pos = None
+    app.history.commit()
+    app.dirty.flush()
+    return app
+
+
+def full_redraw(app):
+    """Shows the floating pixels by redrawing the whole viewport from the painting, then drawing them over it."""
+    app.dirty.add(app.viewport.draw(app.win))
+    app.selection_shown = None  # Draw the selection as the app does, over the redrawn viewport
+    app.display_selection()
+
+
+def time_drag(app, size, display):
+    """:returns: The milliseconds a frame of dragging took on average, and the pixels it pushed to the display."""
+    app.selection = pygame.Rect(20, 20, size, size)
+    app.lift_selection()
+    app.dirty.flush()
+    total = 0.0
+    pixels = 0
+    for frame in range(FRAMES):
+        angle = 2 * math.pi * frame / 30
+        app.selection.topleft = (20 + round(8 * math.cos(angle)), 20 + round(8 * math.sin(angle)))
+        started = time.perf_counter()
+        display(app)
+        pixels += app.dirty.flush()
+        total += time.perf_counter() - started
+    app.cancel_selection()
+    app.display_selection()
+    app.dirty.flush()
+    return 1000 * total / FRAMES, pixels // FRAMES
+
+
+def time_lift(app, size):
+    """:returns: The milliseconds lifting a selection and dropping it 8 pixels away took on average."""
+    started = time.perf_counter()
+    for _ in range(LIFTS):
+        app.selection = pygame.Rect(20, 20, size, size)
+        app.lift_selection()
+        app.selection.move_ip(8, 8)
+        app.drop_selection()
+        app.dirty.flush()
+    elapsed = time.perf_counter() - started
+    for _ in range(LIFTS):
+        app.undo()
+    app.dirty.flush()
+    return 1000 * elapsed / LIFTS
+
+
+def main():
+    app = painted_app()
+    print("%-6s %12s %10s %12s %10s %10s" % ("size", "drag (ms)", "pixels", "redraw (ms)", "pixels", "lift (ms)"))
+    for size in SELECTION_SIZES:
+        drag, drag_pixels = time_drag(app, size, PaintApp.display_selection)
+        redraw, redraw_pixels = time_drag(app, size, full_redraw)
+        lift = time_lift(app, size)
+        print("%-6d %12.3f %10d %12.3f %10d %10.3f" % (size, drag, drag_pixels, redraw, redraw_pixels, lift))
+    pygame.quit()
+
+    print()
+    print("%-8s %6s %12s %14s" % ("canvas", "size", "raw bytes", "clipboard bytes"))
+    for indexed in (False, True):
+        app = painted_app(indexed)
+        for size in SELECTION_SIZES:
+            rect = pygame.Rect(20, 20, size, size)
+            app.clipboard.copy(app.canvas, rect)
+            raw = size * size * app.canvas.format.get_bytesize()
+            print("%-8s %6d %12d %14d" % ("indexed" if indexed else "RGB", size, raw, app.clipboard.stored_bytes()))
+        pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Times a frame of the rubber-band preview of the shape tools on a painted canvas, for shapes of growing size: with
+the backing store, which only restores and redraws the area under the last and the new preview, against redrawing the
+whole viewport from the painting before drawing the preview over it.
+
+Run from the repository root with
+    python3 benchmarks/bench_shapes.py
+No window is opened; the SDL dummy video driver is used.
+"""
+import math
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from paint import PaintApp  # noqa: E402
+
+SHAPE_SIZES = (16, 64, 128, 256, 400)  # Width and height in window pixels of the shapes previewed
+FRAMES = 300  # Preview frames timed for each shape, the cursor moving a little each frame
+START = (20, 20)  # Window position the shapes are dragged from
+
+
+def painted_app():
+    """:returns: An app whose painting is covered in strokes, so redrawing the viewport blits allocated tiles."""
+    app = PaintApp(canvas_size=(2048, 2048))
+    rng = random.Random(1)
+    for _ in range(60):
+        app.pb.set_color(tuple(rng.randrange(256) for _ in range(3)))
+        app.prev_pos = None
+        app.stroke_points = [(rng.randrange(450), rng.randrange(450)) for _ in range(5)]
+        app.flush_stroke()
+    app.prev_pos = None
+    app.history.commit()
+    app.dirty.flush()
+    return app
+
+
+def full_redraw_preview(app):
+    """Shows the preview by redrawing the whole viewport from the painting, then drawing the shape over it."""
+    app.dirty.add(app.viewport.draw(app.win))
+    app.preview_rect = None  # Draw the shape as the app does, over the redrawn viewport
+    app.draw_preview()
+
+
+def time_preview(app, tool, size, preview):
+    """:returns: The milliseconds a preview frame took on average, and the pixels it pushed to the display."""
+    app.set_current_tool(tool)
+    app.shape_start = app.viewport.to_canvas(START)
+    total = 0.0
+    pixels = 0
+    for frame in range(FRAMES):
+        angle = 2 * math.pi * frame / 30
+        app.shape_end = app.viewport.to_canvas((START[0] + size + round(4 * math.cos(angle)),
+                                                START[1] + size + round(4 * math.sin(angle))))
+        started = time.perf_counter()
+        preview(app)
+        pixels += app.dirty.flush()
+        total += time.perf_counter() - started
+    app.cancel_shape()
+    app.dirty.flush()
+    return 1000 * total / FRAMES, pixels // FRAMES
+
+
+def main():
+    app = painted_app()
+    print("%-10s %6s %14s %12s %14s %12s" % ("shape", "size", "backing (ms)", "pixels", "redraw (ms)", "pixels"))
+    for tool in PaintApp.SHAPE_TOOLS:
+        for size in SHAPE_SIZES:
+            backing, backing_pixels = time_preview(app, tool, size, PaintApp.draw_preview)
+            redraw, redraw_pixels = time_preview(app, tool, size, full_redraw_preview)
+            print("%-10s %6d %14.3f %12d %14.3f %12d" % (tool, size, backing, backing_pixels, redraw, redraw_pixels))
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
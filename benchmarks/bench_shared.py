@@ -0,0 +1,233 @@
+"""Load test of the shared painting server: many simulated clients paint strokes on it at once over local loopback,
+each sending a frame's worth of stroke points 30 times per second, while a client joining late catches up from the
+latest snapshot.
+
+For each number of clients a new server.py is started, and the test reports how many operations per second the server
+ordered and the clients received, the bytes of a stroke operation on the wire, the time from sending an operation to
+receiving it back in order, and what it took the late client to join. The late client's painting and that of a client
+connected from the start are compared once both have received every operation. A client then sends the largest
+stroke operation a client sends, with MAX_POINTS points far enough apart that each step takes 4 bytes, and the test
+fails unless the server orders it instead of dropping the client.
+
+Run from the repository root with
+    python3 benchmarks/bench_shared.py
+No window is opened; the SDL dummy video driver is used.
+"""
+import asyncio
+import collections
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import shared  # noqa: E402
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "server.py")
+CLIENT_COUNTS = (4, 16, 64)
+SIZE = 2048  # Width and height of the painting
+DURATION = 4.0  # Seconds the clients paint for
+FRAME_INTERVAL = 1 / 30  # Seconds between the operations of a client
+POINTS = 4  # Points a frame adds to a stroke
+STROKE_FRAMES = 20  # Frames a stroke lasts
+COLORS = ((0, 0, 0), (255, 0, 0), (0, 0, 255), (0, 160, 0))
+
+
+class SimulatedClient:
+    """A client painting random strokes, which can keep what it receives to replay it later."""
+
+    def __init__(self, keep=False):
+        """
+        :param keep: Whether to keep the snapshot and every operation received.
+        :type keep: bool
+        """
+        self.keep = keep
+        self.id = None
+        self.snapshot = None
+        self.operations = []  # (sender, operation) of each operation received, if kept
+        self.sent = collections.deque()  # perf_counter() when each operation still to come back was sent
+        self.latencies = []
+        self.received = 0  # Number of operations received
+        self.stroke_bytes = []  # Length on the wire of each stroke operation sent
+        self.marker = None  # Id of the client whose operation to stop receiving at
+        self.stopped = asyncio.Event()  # Set once the marker's operation is received
+        self.welcomed = None  # perf_counter() when the snapshot and the operations before it were received
+
+    async def connect(self, address):
+        """Connects to the server at address, keeps the snapshot it sends and starts receiving operations."""
+        self.reader, self.writer = await asyncio.open_connection(*address)
+        length, _ = shared.MESSAGE.unpack(await self.reader.readexactly(shared.MESSAGE.size))
+        welcome = await self.reader.readexactly(length)
+        self.id = shared.WELCOME.unpack_from(welcome)[2]
+        self.snapshot = welcome[shared.WELCOME.size:]
+        self.receiving = asyncio.get_running_loop().create_task(self.receive())
+
+    async def receive(self):
+        """Counts the operations received, timing the client's own ones from when they were sent."""
+        buffer = b""
+        while True:
+            data = await self.reader.read(1 << 16)
+            if not data:
+                return
+            buffer += data
+            offset = 0
+            now = time.perf_counter()
+            while len(buffer) - offset >= shared.MESSAGE.size:
+                length, sender = shared.MESSAGE.unpack_from(buffer, offset)
+                end = offset + shared.MESSAGE.size + length
+                if end > len(buffer):
+                    break
+                self.received += 1
+                if self.keep:
+                    self.operations.append((sender, buffer[offset + shared.MESSAGE.size:end]))
+                if sender == self.id:
+                    self.latencies.append(now - self.sent.popleft())
+                elif sender == self.marker:
+                    self.stopped.set()
+                offset = end
+            buffer = buffer[offset:]
+            if self.welcomed is None:
+                self.welcomed = now
+
+    def send(self, op):
+        """Sends an operation without waiting."""
+        self.sent.append(time.perf_counter())
+        self.writer.write(shared.MESSAGE.pack(len(op), 0) + op)
+
+    async def paint(self, until, rng):
+        """Paints random strokes until perf_counter() reaches until."""
+        position = (rng.randrange(SIZE), rng.randrange(SIZE))
+        frame = 0
+        color = COLORS[0]
+        next_frame = time.perf_counter() + rng.random() * FRAME_INTERVAL
+        while next_frame < until:
+            await asyncio.sleep(max(next_frame - time.perf_counter(), 0))
+            if frame % STROKE_FRAMES == 0:
+                color = rng.choice(COLORS)
+            points = [position]
+            for _ in range(POINTS):
+                x, y = points[-1]
+                points.append((min(max(x + rng.randint(-12, 12), 0), SIZE - 1),
+                               min(max(y + rng.randint(-12, 12), 0), SIZE - 1)))
+            op = shared.stroke_op(points, frame % STROKE_FRAMES == 0, color, 10, 1.0)
+            self.stroke_bytes.append(shared.MESSAGE.size + len(op))
+            self.send(op)
+            position = points[-1]
+            frame += 1
+            if frame % STROKE_FRAMES == 0:
+                self.send(shared.END)
+            next_frame += FRAME_INTERVAL
+
+    def replica(self):
+        """:returns: The painting the kept snapshot and operations give."""
+        replica = shared.decode_snapshot(self.snapshot)
+        for sender, op in self.operations:
+            replica.apply(sender, op)
+        return replica
+
+
+def start_server():
+    """:returns: A server.py process serving a new painting, and its (host, port)."""
+    process = subprocess.Popen([sys.executable, SERVER, "--port", "0", "--canvas-size", str(SIZE), str(SIZE)],
+                               stdout=subprocess.PIPE, text=True)
+    host, port = process.stdout.readline().split()[-1].rsplit(":", 1)
+    return process, (host, int(port))
+
+
+async def load_test(client_count, address):
+    """:returns: The measurements of a load test of client_count clients painting on the server at address."""
+    observer = SimulatedClient(keep=True)
+    clients = [observer] + [SimulatedClient() for _ in range(client_count - 1)]
+    for client in clients:
+        await client.connect(address)
+    started = time.perf_counter()
+    until = started + DURATION
+    painting = [asyncio.get_running_loop().create_task(client.paint(until, random.Random(index)))
+                for index, client in enumerate(clients)]
+    # Join with strokes in progress, once the server has taken a snapshot unless there are few clients
+    await asyncio.sleep(0.75 * DURATION)
+    joiner = SimulatedClient(keep=True)
+    joined = time.perf_counter()
+    await joiner.connect(address)
+    while joiner.welcomed is None:
+        await asyncio.sleep(0.001)
+    join_time = joiner.welcomed - joined
+    tail = len(joiner.operations)
+    decoded = time.perf_counter()
+    joiner.replica()
+    decode_time = time.perf_counter() - decoded
+    await asyncio.gather(*painting)
+    elapsed = time.perf_counter() - started
+    # Stop both painting clients at the same operation: the one of a client that sends nothing else
+    marker = SimulatedClient()
+    await marker.connect(address)
+    observer.marker = joiner.marker = marker.id
+    marker.send(shared.END)
+    await asyncio.wait_for(asyncio.gather(observer.stopped.wait(), joiner.stopped.wait()), 30)
+    consistent = observer.replica().canvas.to_surface().get_view("2").raw == \
+        joiner.replica().canvas.to_surface().get_view("2").raw
+    sent = sum(len(client.latencies) for client in clients)
+    for client in clients + [joiner, marker]:
+        client.receiving.cancel()
+        client.writer.close()
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    return {"ordered": sent / elapsed, "delivered": sum(client.received for client in clients) / elapsed,
+            "stroke bytes": statistics.mean(size for client in clients for size in client.stroke_bytes),
+            "median": 1000 * latencies[len(latencies) // 2], "p95": 1000 * latencies[int(0.95 * len(latencies))],
+            "snapshot": len(joiner.snapshot), "tail": tail, "join": 1000 * join_time, "decode": 1000 * decode_time,
+            "consistent": consistent}
+
+
+async def largest_stroke_test(address):
+    """:returns: The bytes of the largest stroke operation, and whether the server ordered it and the stroke's end."""
+    client = SimulatedClient()
+    await client.connect(address)
+    # A thin back and forth stroke, cheap to paint, with steps too long to take a byte per coordinate
+    points = [(100 + 130 * (index % 2), 100) for index in range(shared.MAX_POINTS)]
+    op = shared.stroke_op(points, True, COLORS[0], 1, 1.0, antialias=False)
+    client.send(op)
+    client.send(shared.END)
+    while len(client.latencies) < 2 and not client.receiving.done():
+        await asyncio.sleep(0.001)
+    ordered = len(client.latencies) == 2
+    client.receiving.cancel()
+    client.writer.close()
+    return len(op), ordered
+
+
+def main():
+    print("%-8s %10s %12s %8s %10s %10s %12s %6s %10s %10s %10s"
+          % ("clients", "ops/s", "received/s", "bytes", "median ms", "p95 ms", "snapshot KB", "tail", "join ms",
+             "replay ms", "consistent"))
+    for client_count in CLIENT_COUNTS:
+        process, address = start_server()
+        try:
+            result = asyncio.run(load_test(client_count, address))
+        finally:
+            process.send_signal(signal.SIGINT)
+            summary = process.communicate()[0].strip()
+        print("%-8d %10.0f %12.0f %8.1f %10.2f %10.2f %12.1f %6d %10.1f %10.1f %10s"
+              % (client_count, result["ordered"], result["delivered"], result["stroke bytes"], result["median"],
+                 result["p95"], result["snapshot"] / 1024, result["tail"], result["join"], result["decode"],
+                 "yes" if result["consistent"] else "NO"))
+        print("  server: %s" % summary)
+    process, address = start_server()
+    try:
+        size, ordered = asyncio.run(largest_stroke_test(address))
+    finally:
+        process.send_signal(signal.SIGINT)
+        process.communicate()
+    print("largest stroke operation: %d points in %d bytes, %s"
+          % (shared.MAX_POINTS, size, "ordered" if ordered else "the server DROPPED the client"))
+    if not ordered:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
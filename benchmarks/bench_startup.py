@@ -0,0 +1,40 @@
+"""Launches the paint app in new processes with --startup-time and reports the time to its first frame, as the app
+measures it from when it starts running and as the launching process sees it, interpreter startup included. The time
+to start the interpreter and load the app's modules alone is measured by launching processes that only import paint.
+
+Run from the repository root with
+    python3 benchmarks/bench_startup.py
+No window is opened; the SDL dummy video driver is used.
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+LAUNCHES = 10
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+PAINT = os.path.join(ROOT, "paint.py")
+
+
+def main():
+    environment = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    first_frames, imports, launches = [], [], []
+    for _ in range(LAUNCHES):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import paint"], cwd=ROOT, env=environment, check=True)
+        imports.append(1000 * (time.perf_counter() - started))
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, PAINT, "--startup-time"], env=environment, check=True,
+                                capture_output=True, text=True).stdout
+        launches.append(1000 * (time.perf_counter() - started))
+        first_frames.append(float(re.search(r"time to first frame: ([\d.]+) ms", output).group(1)))
+    print("%-32s %10s %10s" % ("over %d launches" % LAUNCHES, "median ms", "min ms"))
+    for name, times in (("time to first frame", first_frames), ("process start to paint imported", imports),
+                        ("process start to exit", launches)):
+        print("%-32s %10.1f %10.1f" % (name, statistics.median(times), min(times)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""Times the canvas operations and the per-frame work of the main loop on synthetic paintings, to catch performance
+regressions.
+
+Run from the repository root with
+    python3 benchmarks/bench_suite.py --output results.json
+and compare a later run against the stored results with
+    python3 benchmarks/bench_suite.py --baseline results.json --threshold 0.2
+which exits with status 1 if the median time of any benchmark grew by more than the threshold (20%).
+No window is opened; the SDL dummy video driver is used.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np  # noqa: E402
+import pygame  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from paint import PaintApp  # noqa: E402
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+
+
+def draw_empty(painting):
+    """Leaves the painting blank, so the whole canvas is one region."""
+    painting.fill(WHITE)
+
+
+def draw_noise(painting):
+    """Paints 45% of the pixels black at random, so regions have ragged, diagonally connected edges."""
+    painting.fill(WHITE)
+    noise = np.random.default_rng(1).random(painting.get_size()) < 0.45
+    pixels = pygame.surfarray.pixels2d(painting)
+    pixels[noise] = painting.map_rgb(BLACK)
+    del pixels
+
+
+def draw_maze(painting):
+    """Draws walls every 4 pixels with alternating gaps, making one long serpentine corridor."""
+    painting.fill(WHITE)
+    width, height = painting.get_size()
+    for y in range(3, height - 1, 4):
+        gap_x = 0 if (y // 4) % 2 else width - 2
+        painting.fill(BLACK, (0, y, width, 1))
+        painting.fill(WHITE, (gap_x, y, 2, 1))
+
+
+def draw_rings(painting):
+    """Draws concentric circles 6 pixels apart around the middle of the painting."""
+    painting.fill(WHITE)
+    center = painting.get_rect().center
+    for radius in range(3, max(painting.get_size()), 6):
+        pygame.draw.circle(painting, BLACK, center, radius, 1)
+
+
+def draw_cells(painting):
+    """Draws a grid of lines every 8 pixels, making many small 7x7 regions."""
+    painting.fill(WHITE)
+    width, height = painting.get_size()
+    for x in range(7, width, 8):
+        painting.fill(BLACK, (x, 0, 1, height))
+    for y in range(7, height, 8):
+        painting.fill(BLACK, (0, y, width, 1))
+
+
+CANVASES = {"empty": draw_empty, "noise": draw_noise, "maze": draw_maze, "rings": draw_rings,
+            "cells": draw_cells}
+
+
+def measure(operation, setup=None, warmup=3, repeats=20):
+    """
+    Times an operation.
+    :param operation: Function to time.
+    :type operation: function
+    :param setup: Function called before each run of the operation without being timed, or None.
+    :type setup: function
+    :param warmup: Number of runs before the timed ones.
+    :type warmup: int
+    :param repeats: Number of timed runs.
+    :type repeats: int
+    :returns: The best, median and mean time of the runs in milliseconds, and the number of runs.
+    :rtype: dict
+    """
+    times = []
+    for run in range(warmup + repeats):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        operation()
+        if run >= warmup:
+            times.append(1000 * (time.perf_counter() - started))
+    return {"min_ms": min(times), "median_ms": statistics.median(times), "mean_ms": statistics.mean(times),
+            "runs": repeats}
+
+
+def stroke_points(size):
+    """:returns: The canvas positions of a zigzag stroke across a painting of the given width and height."""
+    return [(x, size[1] // 4 if (x // 40) % 2 else 3 * size[1] // 4) for x in range(0, size[0], 40)]
+
+
+def motion_events(size):
+    """:returns: The events of dragging the cursor along a circle in the painting with the left button held."""
+    center = (size[0] // 2, size[1] // 2)
+    radius = min(size) // 3
+    return [pygame.event.Event(pygame.MOUSEMOTION, pos=(round(center[0] + radius * np.cos(angle)),
+                                                        round(center[1] + radius * np.sin(angle))),
+                               rel=(0, 0), buttons=(1, 0, 0))
+            for angle in np.linspace(0, 2 * np.pi, 32)]
+
+
+def run_benchmarks(app, warmup, repeats):
+    """
+    Times fill, replace and stroke drawing on every synthetic canvas, and the panel and frame work of the main loop.
+    :param app: The app to run the operations in.
+    :type app: PaintApp
+    :param warmup: Number of runs of each benchmark before the timed ones.
+    :type warmup: int
+    :param repeats: Number of timed runs of each benchmark.
+    :type repeats: int
+    :returns: The times of each benchmark by name.
+    :rtype: dict
+    """
+    size = app.canvas.get_rect().size
+    center = (size[0] // 2, size[1] // 2)
+    results = {}
+    for name, draw in CANVASES.items():
+        painting = pygame.Surface(size, 0, 32)
+        draw(painting)
+
+        def reset():
+            app.canvas.clear()
+            app.canvas.blit(painting, (0, 0))
+            app.history.commit()
+
+        def fill():
+            app.fill(center, app.canvas.get_at(center), RED)
+            app.history.commit()
+
+        def replace():
+            app.replace(BLACK, RED)
+            app.history.commit()
+
+        def draw_stroke():
+            app.prev_pos = None  # Start a new stroke
+            app.stroke_points = stroke_points(size)
+            app.flush_stroke()
+            app.history.commit()
+
+        results["fill/" + name] = measure(fill, reset, warmup, repeats)
+        results["replace/" + name] = measure(replace, reset, warmup, repeats)
+        results["draw/" + name] = measure(draw_stroke, reset, warmup, repeats)
+
+    def redraw_panel():
+        app.panel.shown = {}  # Forget what was shown so every button is drawn again
+
+    results["panel/idle"] = measure(lambda: app.display_panel(), None, warmup, repeats)
+    results["panel/redraw"] = measure(lambda: app.display_panel(), redraw_panel, warmup, repeats)
+    results["frame/idle"] = measure(lambda: app.handle_frame([]), None, warmup, repeats)
+    events = motion_events(size)
+    app.handle_frame([pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=events[0].pos, button=1)])
+    results["frame/stroke"] = measure(lambda: app.handle_frame(events), None, warmup, repeats)
+    app.handle_frame([pygame.event.Event(pygame.MOUSEBUTTONUP, pos=events[-1].pos, button=1)])
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints how the median time of each benchmark changed since the baseline.
+    :param results: The times of each benchmark by name.
+    :type results: dict
+    :param baseline: The times of each benchmark by name in the baseline.
+    :type baseline: dict
+    :param threshold: The largest relative growth of a median time that isn't a regression.
+    :type threshold: float
+    :returns: The names of the benchmarks that regressed.
+    :rtype: list
+    """
+    regressions = []
+    print("%-16s %12s %12s %8s" % ("benchmark", "base (ms)", "now (ms)", "change"))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["median_ms"], result["median_ms"]
+        change = after / before - 1 if before else 0.0
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print("%-16s %12.3f %12.3f %+7.0f%%%s" % (name, before, after, 100 * change, "  REGRESSION" if regressed
+                                                    else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the canvas operations and the main loop.")
+    parser.add_argument("--size", type=int, default=PaintApp.WINDOW_WIDTH, help="width and height of the canvas")
+    parser.add_argument("--warmup", type=int, default=3, help="untimed runs before each benchmark")
+    parser.add_argument("--repeats", type=int, default=20, help="timed runs of each benchmark")
+    parser.add_argument("--indexed", action="store_true", help="benchmark an indexed canvas of the panel's colors")
+    parser.add_argument("--output", help="file to write the results to as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative growth of a median time that counts as a regression")
+    args = parser.parse_args()
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        # Times on a canvas of another size or pixel format aren't comparable
+        if (baseline["size"], baseline["indexed"]) != (args.size, args.indexed):
+            parser.error("%s was run on an %s %dx%d canvas; run with the same --size and --indexed to compare"
+                         % (args.baseline, "indexed" if baseline["indexed"] else "RGB", baseline["size"],
+                            baseline["size"]))
+
+    app = PaintApp(canvas_size=(args.size, args.size), indexed=args.indexed)
+    results = run_benchmarks(app, args.warmup, args.repeats)
+    pygame.quit()
+    report = {"python": platform.python_version(), "pygame": pygame.version.ver, "numpy": np.__version__,
+              "size": args.size, "indexed": args.indexed, "results": results}
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if baseline is None:
+        print("%-16s %12s %12s" % ("benchmark", "min (ms)", "median (ms)"))
+        for name, result in results.items():
+            print("%-16s %12.3f %12.3f" % (name, result["min_ms"], result["median_ms"]))
+        return
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print("%d benchmark(s) regressed by more than %.0f%%" % (len(regressions), 100 * args.threshold))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
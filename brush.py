@@ -0,0 +1,543 @@
+"""Stamp-based brush engine: strokes are painted as anti-aliased circular stamps placed along the path, and blended
+onto the canvas with NumPy. Opaque strokes that aren't anti-aliased are drawn as hard-edged lines instead, which is
+faster."""
+import collections
+import math
+
+import numpy as np
+import pygame
+
+
+class StampCache:
+    """Anti-aliased circular alpha masks by diameter.
+    The masks of the standard brush sizes are computed up front and always kept; masks of other sizes are computed
+    when first used and the least recently used are dropped once there are more than capacity of them."""
+
+    def __init__(self, standard_sizes=(10, 20, 30, 40), capacity=16):
+        """Computes the masks of the standard sizes.
+        :param self: The calling object/object being initialized
+        :type self: StampCache
+        :param standard_sizes: The diameters whose masks are always kept.
+        :type standard_sizes: tuple
+        :param capacity: The most masks of other diameters to keep.
+        :type capacity: int
+        """
+        self.capacity = capacity
+        self.standard = {size: self.make_mask(size) for size in standard_sizes}
+        self.custom = collections.OrderedDict()  # Masks of other diameters, the least recently used first
+
+    @staticmethod
+    def make_mask(diameter):
+        """
+        :param diameter: The diameter of the stamp in pixels.
+        :type diameter: float
+        :returns: The alpha (0 to 255) of every pixel of a square around the stamp, indexed [y, x]. The stamp is
+            centered on the middle pixel.
+        :rtype: numpy.ndarray
+        """
+        radius = max(diameter, 1) / 2
+        side = 2 * math.ceil(radius) + 1
+        ys, xs = np.mgrid[0:side, 0:side]
+        # A pixel is covered as much as its center lies within half a pixel inside the edge of the circle
+        alpha = np.clip(radius + 0.5 - np.hypot(ys - side // 2, xs - side // 2), 0, 1)
+        return np.rint(255 * alpha).astype(np.uint8)
+
+    def get(self, diameter):
+        """
+        :param self: The calling object
+        :type self: StampCache
+        :param diameter: The diameter of a stamp in pixels.
+        :type diameter: float
+        :returns: The mask of a stamp of that diameter, as returned by make_mask.
+        :rtype: numpy.ndarray
+        """
+        mask = self.standard.get(diameter)
+        if mask is not None:
+            return mask
+        mask = self.custom.get(diameter)
+        if mask is None:
+            mask = self.custom[diameter] = self.make_mask(diameter)
+            if len(self.custom) > self.capacity:
+                self.custom.popitem(last=False)
+        else:
+            self.custom.move_to_end(diameter)
+        return mask
+
+
+def stamp_positions(points, spacing, offset, within=None):
+    """
+    :param points: The positions of a path, in order. A single position is a path of no length.
+    :type points: list
+    :param spacing: The distance between two stamps along the path.
+    :type spacing: float
+    :param offset: The distance along the path of the first stamp.
+    :type offset: float
+    :param within: The rectangle of the canvas to place stamps within, or None to place them all along the path.
+    :type within: pygame.Rect
+    :returns: The positions of the stamps, rounded to pixels, and the distance along the path of the next stamp
+        after the end of the path.
+    :rtype: tuple
+    """
+    if len(points) == 1:
+        points = [points[0], points[0]]
+    positions = []
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        length = math.hypot(x1 - x0, y1 - y0)
+        end = length  # Distance along the segment of the last stamp to place
+        if within is not None:
+            span = clip_segment((x0, y0), (x1, y1), within)
+            if span is None:
+                end = -1.0
+            else:
+                end = span[1] * length
+                if offset < span[0] * length:
+                    # Skip the stamps before the segment enters the rectangle
+                    offset += math.floor((span[0] * length - offset) / spacing) * spacing
+        while offset <= end:
+            along = offset / length if length else 0.0
+            positions.append((round(x0 + (x1 - x0) * along), round(y0 + (y1 - y0) * along)))
+            offset += spacing
+        if offset <= length:
+            # Skip the stamps after the segment leaves the rectangle
+            offset += (math.floor((length - offset) / spacing) + 1) * spacing
+        offset -= length
+    return positions, offset
+
+
+def clip_segment(start, end, rect):
+    """
+    :param start: The position a line starts at.
+    :type start: tuple
+    :param end: The position the line ends at.
+    :type end: tuple
+    :param rect: A rectangle.
+    :type rect: pygame.Rect
+    :returns: The fractions of the way from start to end between which the line is within the rectangle, or None if
+        it misses the rectangle.
+    :rtype: tuple
+    """
+    first, last = 0.0, 1.0
+    for origin, delta, low, high in ((start[0], end[0] - start[0], rect.left, rect.right),
+                                     (start[1], end[1] - start[1], rect.top, rect.bottom)):
+        if delta == 0:
+            if not low <= origin <= high:
+                return None
+            continue
+        enter, leave = sorted(((low - origin) / delta, (high - origin) / delta))
+        first, last = max(first, enter), min(last, leave)
+        if first > last:
+            return None
+    return first, last
+
+
+def point_along(start, end, along):
+    """
+    :param start: The position a line starts at.
+    :type start: tuple
+    :param end: The position the line ends at.
+    :type end: tuple
+    :param along: The fraction of the way from start to end.
+    :type along: float
+    :returns: The position that far along the line, rounded to pixels.
+    :rtype: tuple
+    """
+    return round(start[0] + (end[0] - start[0]) * along), round(start[1] + (end[1] - start[1]) * along)
+
+
+def segment_tiles(segment, reach, size):
+    """
+    :param segment: The (start, end) canvas positions of a line.
+    :type segment: tuple
+    :param reach: How far from the line it may paint, in pixels.
+    :type reach: int
+    :param size: The width and height of a tile in pixels.
+    :type size: int
+    :returns: The (column, row) of every tile the line may paint, found a column of tiles at a time so that a long
+        diagonal line doesn't take every tile of its bounding rectangle.
+    :rtype: list
+    """
+    (x0, y0), (x1, y1) = sorted(segment)
+    tiles = []
+    for column in range((x0 - reach) // size, (x1 + reach) // size + 1):
+        # The rows the line may paint are those within reach of the part of it within reach of the column
+        left = max(column * size - reach, x0)
+        right = min((column + 1) * size + reach, x1)
+        if x0 == x1:
+            top, bottom = y0, y1
+        else:
+            top, bottom = sorted((y0 + (y1 - y0) * (left - x0) / (x1 - x0), y0 + (y1 - y0) * (right - x0) / (x1 - x0)))
+        rows = range(math.floor(top - reach) // size, math.floor(bottom + reach) // size + 1)
+        tiles += [(column, row) for row in rows]
+    return tiles
+
+
+def blend_alphas():
+    """
+    :returns: The alpha to blend a color at to raise the alpha a pixel was painted with from a to b, at a * 256 + b;
+        0 if b isn't higher.
+    :rtype: numpy.ndarray
+    """
+    # A pixel blended with the color at alpha a is color + (original - color) * (1 - a), so raising a to b is
+    # blending the color over it at alpha (b - a) / (1 - a)
+    a, b = np.mgrid[0:256, 0:256]
+    return np.rint(255 * np.clip(b - a, 0, None) / np.maximum(255 - a, 1)).astype(np.uint8).ravel()
+
+
+class BrushStroke:
+    """A stroke of stamps of one color, diameter and opacity, painted in parts as the cursor moves.
+    The alpha of the stroke is kept for each tile it crosses, and stamps only raise it, so overlapping stamps and
+    the joints between the parts of the stroke don't build up paint: every pixel ends as if it were blended with the
+    color once, at the highest alpha of any stamp covering it.
+    An opaque stroke that isn't anti-aliased has no alpha to keep: each part is drawn as lines with round joints."""
+
+    SPACING = 0.25  # Distance between two stamps, as a fraction of the diameter
+    CHUNK_SIZE = 256  # Most pixels the stamps blended at once, or the lines drawn at once, span either way
+    BLEND_ALPHAS = blend_alphas()
+
+    def __init__(self, canvas, color, diameter, opacity=1.0, stamps=None, clip=None, antialias=True):
+        """Initializes a stroke that hasn't painted anything yet.
+        :param self: The calling object/object being initialized
+        :type self: BrushStroke
+        :param canvas: The canvas to paint on.
+        :type canvas: Canvas
+        :param color: The color of the stroke.
+        :type color: tuple
+        :param diameter: The diameter of the stamps in pixels.
+        :type diameter: float
+        :param opacity: The alpha of the middle of the stroke, from 0 to 1.
+        :type opacity: float
+        :param stamps: The cache to take the mask of the stamps from, or None for a new one.
+        :type stamps: StampCache
+        :param clip: The rectangle of the canvas to paint within, or None to paint anywhere on it.
+        :type clip: pygame.Rect
+        :param antialias: Whether to blend the edges of an opaque stroke; a translucent stroke always is.
+        :type antialias: bool
+        """
+        self.canvas = canvas
+        self.clip = clip
+        self.paintable = canvas.get_rect() if clip is None else canvas.get_rect().clip(clip)  # Rectangle painted within
+        self.color = canvas.snap(color)
+        self.diameter = diameter
+        self.opacity = opacity
+        self.antialias = antialias
+        self.hard = not antialias and opacity >= 1  # Whether the stroke is drawn as lines rather than stamped
+        mask = (stamps or StampCache(())).get(diameter)
+        self.half = len(mask) // 2
+        # The stamp as an RGBA surface whose alpha is the mask, to take the highest alpha of overlapping stamps with
+        # SDL: its pixels are kept with it since the surface shares their memory
+        self.stamp_pixels = np.zeros(mask.shape + (4,), dtype=np.uint8)
+        self.stamp_pixels[:, :, 3] = np.rint(mask * min(max(opacity, 0.0), 1.0))
+        self.stamp = pygame.image.frombuffer(self.stamp_pixels, mask.shape[::-1], "RGBA")
+        self.spacing = max(self.SPACING * diameter, 1.0)
+        self.offset = 0.0  # Distance along the path from its last point to the next stamp
+        self.last = None  # Canvas position the stroke was last painted to
+        self.tile_alphas = {}  # Alpha of the stroke over each tile it crossed, indexed [y, x]
+        # Tile of the color whose alpha is set to blend it over part of a tile; it shares its memory with the BGRA
+        # array, indexed [y, x], so the alpha is written without locking or transposing, and its byte order is that of
+        # the tiles so SDL blits it without converting
+        self.layer_pixels = None
+        self.layer = None
+        self.stamps = 0  # Number of stamps painted
+
+    def add(self, points):
+        """
+        Paints the stroke along a path, continuing from where it was last painted to.
+        :param self: The calling object
+        :type self: BrushStroke
+        :param points: The canvas positions to paint through, in order.
+        :type points: list
+        :returns: The rectangle of the canvas that changed, or None if nothing changed.
+        :rtype: pygame.Rect
+        """
+        if self.last is not None and tuple(points[0]) != self.last:
+            points = [self.last] + list(points)
+        self.last = tuple(points[-1])
+        if self.hard:
+            return self.add_lines(points)
+        # Stamps further from the painting than their radius can't paint it
+        positions, self.offset = stamp_positions(points, self.spacing, self.offset,
+                                                 self.paintable.inflate(2 * self.half + 2, 2 * self.half + 2))
+        if not positions:
+            return None
+        self.stamps += len(positions)
+        changed = []
+        for chunk, bounds in self.chunks(positions):
+            self.paint_stamps(chunk, bounds, changed)
+        if not changed:
+            return None
+        changed = changed[0].unionall(changed[1:])
+        self.canvas.invalidate(changed)
+        return changed
+
+    def chunks(self, positions):
+        """
+        :param self: The calling object
+        :type self: BrushStroke
+        :param positions: The positions of stamps, in the order they are placed along the path.
+        :type positions: list
+        :returns: The positions split into runs whose centers span at most CHUNK_SIZE pixels either way, each with
+            the rectangle of the canvas its stamps cover.
+        :rtype: list
+        """
+        xs, ys = zip(*positions)
+        left, right, top, bottom = min(xs), max(xs), min(ys), max(ys)
+        if right - left > self.CHUNK_SIZE or bottom - top > self.CHUNK_SIZE:
+            chunks = []
+            for x, y in positions:
+                if not chunks or max(right, x) - min(left, x) > self.CHUNK_SIZE or \
+                        max(bottom, y) - min(top, y) > self.CHUNK_SIZE:
+                    if chunks:
+                        chunks[-1] = (chunks[-1], self.cover(left, right, top, bottom))
+                    chunks.append([])
+                    left = right = x
+                    top = bottom = y
+                chunks[-1].append((x, y))
+                left, right, top, bottom = min(left, x), max(right, x), min(top, y), max(bottom, y)
+            chunks[-1] = (chunks[-1], self.cover(left, right, top, bottom))
+            return chunks
+        return [(positions, self.cover(left, right, top, bottom))]
+
+    def cover(self, left, right, top, bottom):
+        """
+        :param self: The calling object
+        :type self: BrushStroke
+        :param left: The smallest x of the centers of stamps.
+        :type left: int
+        :param right: The largest x of the centers of stamps.
+        :type right: int
+        :param top: The smallest y of the centers of stamps.
+        :type top: int
+        :param bottom: The largest y of the centers of stamps.
+        :type bottom: int
+        :returns: The rectangle of the canvas the stamps cover.
+        :rtype: pygame.Rect
+        """
+        return pygame.Rect(left - self.half, top - self.half, right - left + 2 * self.half + 1,
+                           bottom - top + 2 * self.half + 1)
+
+    def paint_stamps(self, positions, bounds, changed):
+        """
+        Takes the highest alpha of stamps at every pixel of the part of their bounding rectangle that can be painted,
+        then blends it onto each tile it overlaps at once.
+        :param self: The calling object
+        :type self: BrushStroke
+        :param positions: The positions of the stamps, spanning at most CHUNK_SIZE pixels either way.
+        :type positions: list
+        :param bounds: The rectangle of the canvas the stamps cover.
+        :type bounds: pygame.Rect
+        :param changed: The rectangles of the canvas that changed, to add the ones the stamps change to.
+        :type changed: list
+        """
+        painted = bounds.clip(self.paintable)
+        if painted.width == 0 or painted.height == 0:
+            return
+        left = painted.left + self.half
+        top = painted.top + self.half
+        pixels = np.zeros((painted.height, painted.width, 4), dtype=np.uint8)
+        pygame.image.frombuffer(pixels, painted.size, "RGBA").blits(
+            [(self.stamp, (x - left, y - top), None, pygame.BLEND_RGBA_MAX) for x, y in positions], doreturn=False)
+        alpha = pixels[:, :, 3]
+        left, top = painted.topleft
+        for tile in self.canvas.tiles_under(painted):
+            rect = self.canvas.tile_rect(tile)
+            area = rect.clip(painted)
+            if self.blend(tile, rect, area,
+                          alpha[area.top - top:area.bottom - top, area.left - left:area.right - left]):
+                changed.append(area)
+
+    def add_lines(self, points):
+        """
+        Draws the stroke along a path as lines, with a disc at every point so the joints are round.
+        A part of a stroke spanning at most CHUNK_SIZE pixels either way, like the part drawn in a frame, is drawn at
+        once into a mask that is then copied to every tile it covers, so that where the tiles meet doesn't change
+        which pixels the lines cover. Longer lines are drawn tile by tile, so that no mask is larger than a tile.
+        :param self: The calling object
+        :type self: BrushStroke
+        :param points: The canvas positions to paint through, in order.
+        :type points: list
+        :returns: The rectangle of the canvas that changed, or None if nothing changed.
+        :rtype: pygame.Rect
+        """
+        reach = self.diameter // 2 + 1  # How far from the points the lines may paint
+        if len(points) == 1:
+            points = [points[0], points[0]]
+        segments = zip(points, points[1:])
+        xs, ys = zip(*points)
+        # Lines reaching far outside the painting are cut where they leave an area around it, so that drawing them
+        # takes the time and memory of the part of them near the painting only
+        near = self.paintable.inflate(2 * (reach + self.CHUNK_SIZE), 2 * (reach + self.CHUNK_SIZE))
+        if min(xs) < near.left or max(xs) >= near.right or min(ys) < near.top or max(ys) >= near.bottom:
+            clipped = []
+            for start, end in segments:
+                span = clip_segment(start, end, near)
+                if span is not None:
+                    clipped.append((point_along(start, end, span[0]), point_along(start, end, span[1])))
+            segments = clipped
+        elif max(xs) - min(xs) + 2 * reach < self.CHUNK_SIZE and max(ys) - min(ys) + 2 * reach < self.CHUNK_SIZE:
+            segments = None
+        if segments is None:
+            parts = [(pygame.Rect(min(xs) - reach, min(ys) - reach, max(xs) - min(xs) + 2 * reach + 1,
+                                  max(ys) - min(ys) + 2 * reach + 1), [points])]
+        else:
+            by_tile = collections.defaultdict(list)
+            for segment in segments:
+                for tile in segment_tiles(segment, reach, self.canvas.TILE_SIZE):
+                    by_tile[tile].append(segment)
+            parts = []
+            for tile, tile_segments in by_tile.items():
+                xs, ys = zip(*(point for segment in tile_segments for point in segment))
+                parts.append((self.canvas.tile_rect(tile).clip(
+                    min(xs) - reach, min(ys) - reach, max(xs) - min(xs) + 2 * reach + 1,
+                    max(ys) - min(ys) + 2 * reach + 1), tile_segments))
+        changed = []
+        for part, lines in parts:
+            self.draw_lines(part, lines, changed)
+        if not changed:
+            return None
+        changed = changed[0].unionall(changed[1:])
+        self.canvas.invalidate(changed)
+        return changed
+
+    def draw_lines(self, part, lines, changed):
+        """
+        Draws lines within a rectangle of the canvas, with a disc at every point of them.
+        :param self: The calling object
+        :type self: BrushStroke
+        :param part: The rectangle of the canvas to draw within.
+        :type part: pygame.Rect
+        :param lines: The canvas positions each line goes through, at least two.
+        :type lines: list
+        :param changed: The rectangles of the canvas that changed, to add the ones the lines change to.
+        :type changed: list
+        """
+        painted = part.clip(self.paintable)
+        if painted.width == 0 or painted.height == 0:
+            return
+        left, top = part.topleft
+        # The mask is 0 where the lines don't cover and the color where they do, with 0 as its color key, so SDL
+        # blits the lines onto opaque tiles without converting the mask
+        mask = pygame.Surface(part.size, 0, 8)
+        mask.set_palette_at(1, self.color[:3])
+        mask.set_colorkey(0)
+        lines = [[(x - left, y - top) for x, y in line] for line in lines]
+        for line in lines:
+            pygame.draw.lines(mask, 1, False, line, self.diameter)
+        if self.diameter > 2:
+            for line in lines:
+                for point in line:
+                    pygame.draw.circle(mask, 1, point, self.diameter / 2)
+        covered = pygame.surfarray.array2d(mask)  # Indexed [x, y]; a copy, so the mask isn't locked
+        for tile in self.canvas.tiles_under(painted):
+            # Painting a tile its own color changes nothing, so don't allocate it
+            if tile not in self.canvas.tiles and self.canvas.tile_color(tile) == self.color:
+                continue
+            rect = self.canvas.tile_rect(tile)
+            area = rect.clip(painted)
+            area_covered = covered[area.left - left:area.right - left, area.top - top:area.bottom - top]
+            if not area_covered.any():
+                continue
+            surface = self.canvas.surface(tile)
+            if self.canvas.transparent:
+                # Blitting would leave the pixels opaque, where erasing a layer paints them transparent
+                pixels = pygame.surfarray.pixels2d(surface)[area.left - rect.left:area.right - rect.left,
+                                                            area.top - rect.top:area.bottom - rect.top]
+                pixels[area_covered.astype(bool)] = self.canvas.map_color(self.color)
+                del pixels
+            else:
+                surface.blit(mask, (area.left - rect.left, area.top - rect.top), area.move(-left, -top))
+            changed.append(area)
+
+    def blend(self, tile, rect, area, alpha):
+        """
+        Raises the alpha of the stroke over part of a tile, blending the color into the pixels whose alpha rose.
+        :param self: The calling object
+        :type self: BrushStroke
+        :param tile: The (column, row) of the tile.
+        :type tile: tuple
+        :param rect: The rectangle of the canvas covered by the tile.
+        :type rect: pygame.Rect
+        :param area: The rectangle of the canvas within the tile to raise the alpha of.
+        :type area: pygame.Rect
+        :param alpha: The alpha of the stamps over area, indexed [y, x].
+        :type alpha: numpy.ndarray
+        :returns: Whether the tile was painted: an unallocated tile of the color isn't, nor is a tile the stamps
+            only reach with their transparent corners.
+        :rtype: bool
+        """
+        # Painting a tile its own color changes nothing, so don't allocate it
+        if tile not in self.canvas.tiles and self.canvas.tile_color(tile) == self.color:
+            return False
+        tile_alpha = self.tile_alphas.get(tile)
+        if tile_alpha is None:
+            if not alpha.any():
+                return False  # Only the transparent corners of the stamps reach the tile
+            tile_alpha = self.tile_alphas[tile] = np.zeros((rect.height, rect.width), dtype=np.uint8)
+        rows = slice(area.top - rect.top, area.bottom - rect.top)
+        columns = slice(area.left - rect.left, area.right - rect.left)
+        old = tile_alpha[rows, columns]
+        surface = self.canvas.surface(tile)
+        if self.canvas.palette is not None:
+            # An indexed canvas can't hold blended colors, so pixels take the color once they are half covered
+            pixels = pygame.surfarray.pixels2d(surface).T[rows, columns]  # Indexed [y, x]
+            pixels[(alpha >= 128) & (old < 128)] = surface.map_rgb(self.color)
+            del pixels
+        elif self.canvas.transparent:
+            self.blend_transparent(surface, rows, columns, old, alpha)
+        else:
+            if self.layer is None:
+                size = self.canvas.TILE_SIZE
+                self.layer_pixels = np.empty((size, size, 4), dtype=np.uint8)
+                self.layer_pixels[:, :, :3] = self.color[::-1]
+                self.layer = pygame.image.frombuffer(self.layer_pixels, (size, size), "BGRA")
+            self.layer_pixels[:area.height, :area.width, 3] = self.blend_alpha(old, alpha)
+            surface.blit(self.layer, (area.left - rect.left, area.top - rect.top), ((0, 0), area.size))
+        np.maximum(old, alpha, out=old)
+        return True
+
+    def blend_alpha(self, old, alpha):
+        """
+        :param self: The calling object
+        :type self: BrushStroke
+        :param old: The alpha the stroke painted pixels with so far.
+        :type old: numpy.ndarray
+        :param alpha: The alpha to raise it to.
+        :type alpha: numpy.ndarray
+        :returns: The alpha to blend the color over the pixels at to raise it.
+        :rtype: numpy.ndarray
+        """
+        # Look the alphas up at old * 256 + alpha in the flattened table, which is faster than indexing it by both
+        index = old.astype(np.uint16)
+        index <<= 8
+        index |= alpha
+        return self.BLEND_ALPHAS.take(index)
+
+    def blend_transparent(self, surface, rows, columns, old, alpha):
+        """
+        Blends the color into part of a tile of a transparent canvas. Pixels are mixed with the color as if their
+        colors were multiplied by their alpha, so painting over transparent pixels doesn't darken the stroke, and
+        painting with a transparent color, like the eraser on a layer does, makes pixels transparent.
+        :param self: The calling object
+        :type self: BrushStroke
+        :param surface: The tile, with an alpha per pixel.
+        :type surface: pygame.Surface
+        :param rows: The rows of the tile to blend into.
+        :type rows: slice
+        :param columns: The columns of the tile to blend into.
+        :type columns: slice
+        :param old: The alpha the stroke painted the pixels with so far, indexed [y, x].
+        :type old: numpy.ndarray
+        :param alpha: The alpha to raise it to, indexed [y, x].
+        :type alpha: numpy.ndarray
+        """
+        blend = self.blend_alpha(old, alpha).astype(np.float32) / 255
+        rgb = pygame.surfarray.pixels3d(surface).transpose(1, 0, 2)[rows, columns]  # Indexed [y, x]
+        pixel_alpha = pygame.surfarray.pixels_alpha(surface).T[rows, columns]
+        color_alpha = self.color[3] / 255
+        kept = pixel_alpha * (1 - blend) / 255
+        new_alpha = kept + color_alpha * blend
+        premultiplied = rgb * kept[:, :, None] + np.multiply.outer(color_alpha * blend, self.color[:3])
+        # Fully transparent pixels keep their color
+        opaque = new_alpha > 0
+        rgb[opaque] = np.rint(premultiplied[opaque] / new_alpha[opaque, None])
+        pixel_alpha[:] = np.rint(255 * new_alpha)
+        del rgb, pixel_alpha
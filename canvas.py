@@ -0,0 +1,772 @@
+"""Paintings of any size, stored as lazily allocated tiles and shown through a scrollable, zoomable viewport."""
+import math
+
+import numpy as np
+import pygame
+
+from regions import RegionIndex
+from recolor import replace_color
+
+
+class Canvas:
+    """A painting of any size stored as square tiles.
+    A tile is only allocated once something is painted on part of it. Until then it costs no memory and every pixel
+    of it is the background color, or the single color a fill or replace gave the whole tile.
+    An indexed canvas only has the colors of its palette and stores a byte per pixel instead of 4; its tiles are
+    converted to RGB when they are shown or exported.
+    A transparent canvas, e.g. a layer over other ones, has an alpha per pixel and colors are RGBA; its background
+    color is transparent black."""
+
+    TILE_SIZE = 128  # Width and height in pixels of a tile
+
+    def __init__(self, width, height, background_color=(255, 255, 255), palette=None, transparent=False):
+        """Initializes a canvas of the background color.
+        :param self: The calling object/object being initialized
+        :type self: Canvas
+        :param width: The width of the canvas in pixels.
+        :type width: int
+        :param height: The height of the canvas in pixels.
+        :type height: int
+        :param background_color: The color of the unpainted canvas.
+        :type background_color: tuple
+        :param palette: The colors of an indexed canvas, at most 256, or None for a canvas of any RGB color.
+        :type palette: list
+        :param transparent: Whether pixels have an alpha, in which case background_color is ignored.
+        :type transparent: bool
+        """
+        self.width = width
+        self.height = height
+        self.palette = None
+        self.transparent = transparent
+        if transparent:
+            if palette is not None:
+                raise ValueError("an indexed canvas can't be transparent")
+            background_color = (0, 0, 0, 0)
+        if palette is not None:
+            if not 0 < len(palette) <= 256:
+                raise ValueError("a palette has 1 to 256 colors, not %d" % len(palette))
+            # Repeat the first color in the unused entries, so that colors only ever map to the palette's own
+            self.palette = [tuple(color[:3]) for color in palette]
+            self.palette += [self.palette[0]] * (256 - len(self.palette))
+        self.format = self.new_surface((1, 1))  # Surface with the pixel format of every tile
+        self.background_color = self.snap(background_color)
+        self.tiles = {}  # Surfaces of the allocated tiles by (column, row)
+        self.uniform = {}  # Colors of the unallocated tiles that aren't the background color by (column, row)
+        self.indexes = {}  # Region index used by fills of each connectivity
+        self.changed = set()  # Tiles whose pixels changed since take_changed was last called
+
+    def new_surface(self, size):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :param size: The (width, height) of the surface.
+        :type size: tuple
+        :returns: A new surface with the pixel format of the tiles.
+        :rtype: pygame.Surface
+        """
+        if self.transparent:
+            return pygame.Surface(size, pygame.SRCALPHA, 32)
+        if self.palette is None:
+            return pygame.Surface(size, 0, 32)
+        surface = pygame.Surface(size, 0, 8)
+        surface.set_palette(self.palette)
+        return surface
+
+    def snap(self, color):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :param color: A color.
+        :type color: tuple
+        :returns: The RGB color the canvas stores for it, which is the closest color of the palette of an indexed
+            canvas, or the RGBA color of a transparent canvas (opaque if color has no alpha).
+        :rtype: tuple
+        """
+        color = tuple(self.format.unmap_rgb(self.format.map_rgb(color)))
+        return color if self.transparent else color[:3]
+
+    def map_color(self, color):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :param color: A color.
+        :type color: tuple
+        :returns: The value of a pixel of the color in the tiles, unsigned like the values of their pixel arrays.
+        :rtype: int
+        """
+        # The value of an opaque color with an alpha in the top byte comes back negative
+        return self.format.map_rgb(color) & 0xFFFFFFFF
+
+    def get_rect(self):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :returns: The rectangle of the whole canvas.
+        :rtype: pygame.Rect
+        """
+        return pygame.Rect(0, 0, self.width, self.height)
+
+    def tile_rect(self, tile):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :param tile: The (column, row) of a tile.
+        :type tile: tuple
+        :returns: The rectangle of the canvas covered by the tile.
+        :rtype: pygame.Rect
+        """
+        size = self.TILE_SIZE
+        return self.get_rect().clip(pygame.Rect(tile[0] * size, tile[1] * size, size, size))
+
+    def tiles_under(self, rect):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :param rect: A rectangle of the canvas.
+        :type rect: pygame.Rect
+        :returns: The (column, row) of every tile overlapping the rectangle.
+        :rtype: list
+        """
+        rect = self.get_rect().clip(rect)
+        if rect.width == 0 or rect.height == 0:
+            return []
+        size = self.TILE_SIZE
+        columns = range(rect.left // size, (rect.right - 1) // size + 1)
+        rows = range(rect.top // size, (rect.bottom - 1) // size + 1)
+        return [(column, row) for row in rows for column in columns]
+
+    def tile_color(self, tile):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :param tile: The (column, row) of an unallocated tile.
+        :type tile: tuple
+        :returns: The color of every pixel of the tile.
+        :rtype: tuple
+        """
+        return self.uniform.get(tile, self.background_color)
+
+    def surface(self, tile):
+        """
+        Allocates the tile if it isn't allocated yet.
+        :param self: The calling object
+        :type self: Canvas
+        :param tile: The (column, row) of a tile.
+        :type tile: tuple
+        :returns: The surface holding the pixels of the tile.
+        :rtype: pygame.Surface
+        """
+        surface = self.tiles.get(tile)
+        if surface is None:
+            surface = self.new_surface(self.tile_rect(tile).size)
+            surface.fill(self.uniform.pop(tile, self.background_color))
+            self.tiles[tile] = surface
+        return surface
+
+    def region_index(self, connectivity):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :param connectivity: 8 to connect pixels that touch diagonally, 4 to only connect pixels that share an edge.
+        :type connectivity: int
+        :returns: The index of the regions of the canvas with that connectivity.
+        :rtype: RegionIndex
+        """
+        index = self.indexes.get(connectivity)
+        if index is None:
+            index = self.indexes[connectivity] = RegionIndex(self, connectivity)
+        return index
+
+    def invalidate(self, rect):
+        """
+        Records that the pixels of the tiles under a rectangle changed, and makes the region indexes forget them.
+        Every change of pixels other than a fill must be reported.
+        :param self: The calling object
+        :type self: Canvas
+        :param rect: The rectangle of the canvas that changed, or None if nothing changed.
+        :type rect: pygame.Rect
+        """
+        if rect is not None:
+            tiles = self.tiles_under(rect)
+            self.changed.update(tiles)
+            for index in self.indexes.values():
+                index.invalidate(tiles)
+
+    def take_changed(self):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :returns: The tiles whose pixels changed since the last call, which are forgotten.
+        :rtype: set
+        """
+        changed = self.changed
+        self.changed = set()
+        return changed
+
+    def set_uniform(self, tile, color):
+        """
+        Makes every pixel of a tile one color, freeing the tile's memory. The tile is recorded as changed, but the
+        change isn't reported to the region indexes.
+        :param self: The calling object
+        :type self: Canvas
+        :param tile: The (column, row) of a tile.
+        :type tile: tuple
+        :param color: The color of the tile, or None for the background color.
+        :type color: tuple
+        """
+        self.tiles.pop(tile, None)
+        self.changed.add(tile)
+        color = self.background_color if color is None else self.snap(color)
+        if color == self.background_color:
+            self.uniform.pop(tile, None)
+        else:
+            self.uniform[tile] = color
+
+    def used_tiles(self):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :returns: The tiles that aren't of the background color, allocated or not.
+        :rtype: set
+        """
+        return set(self.tiles) | set(self.uniform)
+
+    def allocated_bytes(self):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :returns: The number of bytes of pixels held by the allocated tiles.
+        :rtype: int
+        """
+        return sum(surface.get_bytesize() * surface.get_width() * surface.get_height()
+                   for surface in self.tiles.values())
+
+    def get_at(self, pos):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :param pos: A position on the canvas.
+        :type pos: tuple
+        :returns: The RGB color of the pixel at pos, or its RGBA color on a transparent canvas.
+        :rtype: tuple
+        """
+        tile = (pos[0] // self.TILE_SIZE, pos[1] // self.TILE_SIZE)
+        surface = self.tiles.get(tile)
+        if surface is None:
+            return self.tile_color(tile)
+        rect = self.tile_rect(tile)
+        color = tuple(surface.get_at((pos[0] - rect.left, pos[1] - rect.top)))
+        return color if self.transparent else color[:3]
+
+    def clear(self):
+        """
+        Resets every pixel of the canvas to the background color.
+        :param self: The calling object
+        :type self: Canvas
+        """
+        self.changed |= self.used_tiles()
+        self.tiles = {}
+        self.uniform = {}
+        self.indexes = {}
+
+    def fill_rect(self, rect, color):
+        """
+        Makes every pixel of a rectangle one color. Tiles it covers whole are set to the color without being
+        allocated, freeing their memory.
+        :param self: The calling object
+        :type self: Canvas
+        :param rect: A rectangle of the canvas.
+        :type rect: pygame.Rect
+        :param color: The color to fill it with.
+        :type color: tuple
+        :returns: The rectangle of the canvas that changed, or None if rect is off the canvas.
+        :rtype: pygame.Rect
+        """
+        area = self.get_rect().clip(rect)
+        if area.width == 0 or area.height == 0:
+            return None
+        color = self.snap(color)
+        for tile in self.tiles_under(area):
+            tile_rect = self.tile_rect(tile)
+            if area.contains(tile_rect):
+                self.set_uniform(tile, color)
+            elif tile in self.tiles or self.tile_color(tile) != color:
+                self.surface(tile).fill(color, area.clip(tile_rect).move(-tile_rect.left, -tile_rect.top))
+        self.invalidate(area)
+        return area
+
+    def blit(self, source, dest):
+        """
+        Copies the pixels of a surface onto the canvas.
+        :param self: The calling object
+        :type self: Canvas
+        :param source: The surface to copy.
+        :type source: pygame.Surface
+        :param dest: The position on the canvas of the top-left corner of source.
+        :type dest: tuple
+        :returns: The rectangle of the canvas that changed, or None if source is off the canvas.
+        :rtype: pygame.Rect
+        """
+        area = self.get_rect().clip(source.get_rect(topleft=dest))
+        for tile in self.tiles_under(area):
+            rect = self.tile_rect(tile)
+            surface = self.surface(tile)
+            if self.transparent:
+                # Blitting pixels with an alpha blends them, so clear the pixels and take their maximum with the
+                # cleared ones to copy them instead
+                surface.fill((0, 0, 0, 0), area.clip(rect).move(-rect.left, -rect.top))
+                surface.blit(source, (dest[0] - rect.left, dest[1] - rect.top), special_flags=pygame.BLEND_RGBA_MAX)
+            else:
+                surface.blit(source, (dest[0] - rect.left, dest[1] - rect.top))
+        if area.width == 0 or area.height == 0:
+            return None
+        self.invalidate(area)
+        return area
+
+    def to_surface(self, rect=None, native=False):
+        """
+        :param self: The calling object
+        :type self: Canvas
+        :param rect: The rectangle of the canvas to copy, or None for the whole canvas.
+        :type rect: pygame.Rect
+        :param native: Whether to copy the pixels in the pixel format of the tiles, a byte per pixel for an indexed
+            canvas, rather than as RGB.
+        :type native: bool
+        :returns: A new RGB surface with the pixels of the rectangle, or an RGBA one for a transparent canvas.
+        :rtype: pygame.Surface
+        """
+        rect = self.get_rect() if rect is None else self.get_rect().clip(rect)
+        if native:
+            result = self.new_surface(rect.size)
+        else:
+            result = pygame.Surface(rect.size, pygame.SRCALPHA if self.transparent else 0, 32)
+        # Blitting pixels with an alpha blends them, so take their maximum with the zeroed result to copy them instead
+        flags = pygame.BLEND_RGBA_MAX if self.transparent else 0
+        for tile in self.tiles_under(rect):
+            tile_rect = self.tile_rect(tile)
+            surface = self.tiles.get(tile)
+            if surface is None:
+                result.fill(self.tile_color(tile), tile_rect.clip(rect).move(-rect.left, -rect.top))
+            else:
+                result.blit(surface, (tile_rect.left - rect.left, tile_rect.top - rect.top), special_flags=flags)
+        return result
+
+    def fill(self, pos, tar, repl, connectivity=8, before_change=None, area=None):
+        """
+        Fills the region of color tar containing pos with the color repl.
+        :param self: The calling object
+        :type self: Canvas
+        :param pos: The position on the canvas to fill from.
+        :type pos: tuple
+        :param tar: The color of the region to fill.
+        :type tar: tuple
+        :param repl: The color to fill the region with.
+        :type repl: tuple
+        :param connectivity: 8 to fill across diagonal neighbours, 4 to only fill across edge neighbours.
+        :type connectivity: int
+        :param before_change: Function called with the rectangle of each tile before the tile is changed, or None.
+        :type before_change: function
+        :param area: The rectangle of the canvas to limit the fill to, as if the canvas ended at its edges, or None.
+        :type area: pygame.Rect
+        :returns: The rectangle of the canvas that changed, or None if nothing changed.
+        :rtype: pygame.Rect
+        """
+        changed = [rect for rect in self.fill_steps(pos, tar, repl, connectivity, before_change, area)
+                   if rect is not None]
+        if not changed:
+            return None
+        return changed[0].unionall(changed[1:])
+
+    def fill_steps(self, pos, tar, repl, connectivity=8, before_change=None, area=None):
+        """
+        Fills the region of color tar containing pos with the color repl in steps, so that a large fill can be spread
+        over many frames. The region is looked up in the region index, and then recolored one tile at a time; stopping
+        before the last step leaves part of the region filled.
+        Unallocated tiles of color tar within the area are filled whole without being allocated.
+        :param self: The calling object
+        :type self: Canvas
+        :param pos: The position on the canvas to fill from.
+        :type pos: tuple
+        :param tar: The color of the region to fill.
+        :type tar: tuple
+        :param repl: The color to fill the region with.
+        :type repl: tuple
+        :param connectivity: 8 to fill across diagonal neighbours, 4 to only fill across edge neighbours.
+        :type connectivity: int
+        :param before_change: Function called with the rectangle of the part of each tile within the area before it is
+            changed, or None.
+        :type before_change: function
+        :param area: The rectangle of the canvas to limit the fill to, as if the canvas ended at its edges, or None.
+        :type area: pygame.Rect
+        :returns: Generator of the rectangle of the canvas changed by each step, or None for a step that changed
+            nothing.
+        :rtype: generator
+        """
+        tar = self.snap(tar)
+        repl = self.snap(repl)
+        area = self.get_rect() if area is None else self.get_rect().clip(area)
+        if tar == repl or not area.collidepoint(pos):
+            return
+        tar_value = self.map_color(tar)
+        repl_value = self.map_color(repl)
+        if area == self.get_rect():
+            index = self.region_index(connectivity)
+        else:
+            # Cut the regions at the edges of the area, labeling only the tiles it cuts apart from the canvas's index
+            index = RegionIndex(self, connectivity, area)
+        # Find the regions making up the region of color tar, labeling the tiles it reaches for the first time
+        tile = (pos[0] // self.TILE_SIZE, pos[1] // self.TILE_SIZE)
+        rect = index.tile_rect(tile)
+        regions = index.tile_regions(tile)
+        label = regions.label_at(pos[0] - rect.left, pos[1] - rect.top)
+        if regions.values[label] != tar_value:
+            return
+        found = {tile: {label}}  # Labels of the regions to fill by tile
+        stack = [(tile, label)]
+        while stack:
+            tile, label = stack.pop()
+            regions = index.regions[tile]
+            for other in regions.touching[regions.touching_starts[label]:regions.touching_starts[label + 1]]:
+                if regions.values[other] == tar_value and other not in found[tile]:
+                    found[tile].add(other)
+                    stack.append((tile, other))
+            if label not in regions.on_border:
+                continue
+            for neighbour in index.neighbours(tile):
+                reached = neighbour not in found
+                neighbour_found = found.setdefault(neighbour, set())
+                neighbour_values = None
+                for other in index.linked(tile, neighbour).get(label, ()):
+                    if neighbour_values is None:
+                        neighbour_values = index.regions[neighbour].values
+                    if neighbour_values[other] == tar_value and other not in neighbour_found:
+                        neighbour_found.add(other)
+                        stack.append((neighbour, other))
+                if reached:
+                    # Labeling a tile is the costly part, so let a job pause after reaching each one. The steps only
+                    # depend on the pixels, not on which tiles were labeled before, so a replay runs the same ones
+                    yield None
+        # Recolor the regions found, a tile at a time
+        for tile, labels in sorted(found.items()):
+            if not labels:
+                continue
+            rect = index.tile_rect(tile)
+            whole = index.is_whole(tile)
+            if before_change is not None:
+                before_change(rect)
+            # The regions of the index of the other connectivity may be split or joined by the new color, and so may
+            # those of a tile cut by the area
+            for other in self.indexes.values():
+                if other is not index and (other is not index.whole or not whole):
+                    other.invalidate((tile,))
+            regions = index.regions[tile]
+            local = rect.move(-tile[0] * self.TILE_SIZE, -tile[1] * self.TILE_SIZE)
+            if regions.labels is None:
+                # Every pixel of an unallocated tile is in its one region
+                if whole:
+                    self.set_uniform(tile, repl)
+                else:
+                    self.surface(tile).fill(repl, local)
+                    self.changed.add(tile)
+                regions.values[0] = repl_value
+                yield rect
+                continue
+            selected = np.zeros(len(regions.values), dtype=bool)
+            selected[list(labels)] = True
+            mask = selected[regions.labels]
+            pixels = pygame.surfarray.pixels2d(self.tiles[tile]).T[local.top:local.bottom, local.left:local.right]
+            pixels[mask] = repl_value
+            del pixels
+            self.changed.add(tile)
+            for label in labels:
+                regions.values[label] = repl_value
+            ys, xs = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+            yield pygame.Rect(rect.left + xs[0], rect.top + ys[0], xs[-1] + 1 - xs[0], ys[-1] + 1 - ys[0])
+
+    def replace(self, target, replacement, tolerance=0, area=None, before_change=None):
+        """
+        Replaces every pixel of the canvas that matches the target color.
+        :param self: The calling object
+        :type self: Canvas
+        :param target: The RGB color to replace, and its alpha on a transparent canvas (opaque if it has none).
+        :type target: tuple
+        :param replacement: The RGB color to replace target with.
+        :type replacement: tuple
+        :param tolerance: The largest Euclidean distance in RGB space from target that still matches, 0 to only
+            match target exactly. On a transparent canvas only pixels of the same alpha as target match.
+        :type tolerance: float
+        :param area: The rectangle of the canvas to recolor, or None for the whole canvas.
+        :type area: pygame.Rect
+        :param before_change: Function called with a rectangle of the canvas before its pixels are replaced, or None.
+        :type before_change: function
+        :returns: The number of pixels replaced and the rectangle of the canvas that changed, or None if no pixel
+            was replaced.
+        :rtype: tuple
+        """
+        count = 0
+        changed = []
+        for tile_count, tile_changed in self.replace_steps(target, replacement, tolerance, area, before_change):
+            if tile_count:
+                count += tile_count
+                changed.append(tile_changed)
+        if not changed:
+            return 0, None
+        return count, changed[0].unionall(changed[1:])
+
+    def replace_steps(self, target, replacement, tolerance=0, area=None, before_change=None):
+        """
+        Replaces every pixel of the canvas that matches the target color one tile at a time, so that a large
+        replacement can be spread over many frames.
+        Unallocated tiles of a matching color are recolored whole without being allocated.
+        :param self: The calling object
+        :type self: Canvas
+        :param target: The RGB color to replace, and its alpha on a transparent canvas (opaque if it has none).
+        :type target: tuple
+        :param replacement: The RGB color to replace target with.
+        :type replacement: tuple
+        :param tolerance: The largest Euclidean distance in RGB space from target that still matches, 0 to only
+            match target exactly. On a transparent canvas only pixels of the same alpha as target match.
+        :type tolerance: float
+        :param area: The rectangle of the canvas to recolor, or None for the whole canvas.
+        :type area: pygame.Rect
+        :param before_change: Function called with a rectangle of the canvas before its pixels are replaced, or None.
+        :type before_change: function
+        :returns: Generator of the number of pixels replaced by each step and the rectangle of the canvas it changed,
+            or None if it replaced no pixel.
+        :rtype: generator
+        """
+        area = self.get_rect() if area is None else self.get_rect().clip(area)
+        # Keep the alpha of the target on a transparent canvas, so that opaque black doesn't match transparent pixels
+        target = self.snap(target) if self.transparent else tuple(target[:3])
+        for tile in self.tiles_under(area):
+            rect = self.tile_rect(tile)
+            if tile not in self.tiles:
+                color = self.tile_color(tile)
+                offset = [a - b for a, b in zip(color[:3], target[:3])]
+                if sum(d * d for d in offset) > max(tolerance, 0) ** 2 or color[3:] != target[3:]:
+                    yield 0, None
+                    continue
+                if area.contains(rect):
+                    if before_change is not None:
+                        before_change(rect)
+                    self.set_uniform(tile, replacement)
+                    self.invalidate(rect)
+                    yield rect.width * rect.height, rect
+                    continue
+            local_change = None
+            if before_change is not None:
+                def local_change(local_rect, origin=rect.topleft):
+                    before_change(local_rect.move(origin))
+            tile_count, tile_changed = replace_color(self.surface(tile), target, replacement, tolerance,
+                                                     area.move(-rect.left, -rect.top), local_change)
+            if not tile_count:
+                yield 0, None
+                continue
+            self.invalidate(rect)
+            yield tile_count, tile_changed.move(rect.topleft)
+
+
+class Viewport:
+    """The part of a canvas shown in a rectangle of the window, which can be scrolled and zoomed.
+    Only the tiles visible in the part of the window being redrawn are composited."""
+
+    ZOOM_LEVELS = (0.25, 0.5, 1, 2, 4, 8)  # Window pixels per canvas pixel
+    OUTSIDE_COLOR = (128, 128, 128)  # Color of the parts of the viewport beyond the edges of the canvas
+
+    def __init__(self, canvas, rect):
+        """Initializes a viewport showing the top-left corner of the canvas at its actual size.
+        :param self: The calling object/object being initialized
+        :type self: Viewport
+        :param canvas: The canvas to show.
+        :type canvas: Canvas
+        :param rect: The rectangle of the window to show the canvas in.
+        :type rect: pygame.Rect
+        """
+        self.canvas = canvas
+        self.rect = pygame.Rect(rect)
+        self.zoom = 1
+        self.x = 0  # Canvas coordinates of the top-left corner of the viewport
+        self.y = 0
+
+    def to_canvas(self, pos):
+        """
+        :param self: The calling object
+        :type self: Viewport
+        :param pos: A position in the window.
+        :type pos: tuple
+        :returns: The position on the canvas shown there.
+        :rtype: tuple
+        """
+        return (math.floor(self.x + (pos[0] - self.rect.left) / self.zoom),
+                math.floor(self.y + (pos[1] - self.rect.top) / self.zoom))
+
+    def to_window_pos(self, pos):
+        """
+        :param self: The calling object
+        :type self: Viewport
+        :param pos: A position on the canvas.
+        :type pos: tuple
+        :returns: The position in the window showing the middle of the canvas pixel there.
+        :rtype: tuple
+        """
+        return (self.rect.left + math.floor((pos[0] + 0.5 - self.x) * self.zoom),
+                self.rect.top + math.floor((pos[1] + 0.5 - self.y) * self.zoom))
+
+    def to_window(self, rect):
+        """
+        :param self: The calling object
+        :type self: Viewport
+        :param rect: A rectangle of the canvas, or None.
+        :type rect: pygame.Rect
+        :returns: The rectangle of the viewport showing it, or None if it isn't visible.
+        :rtype: pygame.Rect
+        """
+        if rect is None:
+            return None
+        shown = self.rect.clip(self.window_rect(rect))
+        return shown if shown.width and shown.height else None
+
+    def window_rect(self, rect):
+        """
+        :param self: The calling object
+        :type self: Viewport
+        :param rect: A rectangle of the canvas.
+        :type rect: pygame.Rect
+        :returns: The rectangle of the window that would show it, which may lie partly or wholly outside the viewport.
+        :rtype: pygame.Rect
+        """
+        left = self.rect.left + math.floor((rect.left - self.x) * self.zoom)
+        top = self.rect.top + math.floor((rect.top - self.y) * self.zoom)
+        right = self.rect.left + math.ceil((rect.right - self.x) * self.zoom)
+        bottom = self.rect.top + math.ceil((rect.bottom - self.y) * self.zoom)
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def scaled_rect(self, source):
+        """
+        :param self: The calling object
+        :type self: Viewport
+        :param source: A rectangle of the canvas.
+        :type source: pygame.Rect
+        :returns: The rectangle of the window its pixels are scaled to, such that the rectangles of neighbouring parts
+            of the canvas don't overlap.
+        :rtype: pygame.Rect
+        """
+        left = self.rect.left + math.floor((source.left - self.x) * self.zoom)
+        top = self.rect.top + math.floor((source.top - self.y) * self.zoom)
+        return pygame.Rect(left, top, self.rect.left + math.floor((source.right - self.x) * self.zoom) - left,
+                           self.rect.top + math.floor((source.bottom - self.y) * self.zoom) - top)
+
+    def visible_region(self, area):
+        """
+        :param self: The calling object
+        :type self: Viewport
+        :param area: A rectangle of the viewport.
+        :type area: pygame.Rect
+        :returns: The rectangle of the canvas shown in it, which may extend beyond the edges of the canvas.
+        :rtype: pygame.Rect
+        """
+        left, top = self.to_canvas(area.topleft)
+        right, bottom = self.to_canvas((area.right - 1, area.bottom - 1))
+        return pygame.Rect(left, top, right + 1 - left, bottom + 1 - top)
+
+    def scroll(self, dx, dy):
+        """
+        Moves the viewport over the canvas, keeping it over the canvas where possible.
+        :param self: The calling object
+        :type self: Viewport
+        :param dx: Canvas pixels to move right by.
+        :type dx: float
+        :param dy: Canvas pixels to move down by.
+        :type dy: float
+        """
+        self.x = max(0, min(self.x + dx, self.canvas.width - self.rect.width / self.zoom))
+        self.y = max(0, min(self.y + dy, self.canvas.height - self.rect.height / self.zoom))
+
+    def zoom_at(self, pos, steps):
+        """
+        Zooms in or out, keeping the canvas pixel under pos in place.
+        :param self: The calling object
+        :type self: Viewport
+        :param pos: A position in the viewport.
+        :type pos: tuple
+        :param steps: Zoom levels to zoom in by, or out by if negative.
+        :type steps: int
+        """
+        level = self.ZOOM_LEVELS.index(self.zoom) + steps
+        level = max(0, min(level, len(self.ZOOM_LEVELS) - 1))
+        anchor_x = self.x + (pos[0] - self.rect.left) / self.zoom
+        anchor_y = self.y + (pos[1] - self.rect.top) / self.zoom
+        self.zoom = self.ZOOM_LEVELS[level]
+        self.x = anchor_x - (pos[0] - self.rect.left) / self.zoom
+        self.y = anchor_y - (pos[1] - self.rect.top) / self.zoom
+        self.scroll(0, 0)
+
+    def draw(self, win, area=None):
+        """
+        Composites the tiles of the canvas visible in a part of the viewport onto the window.
+        :param self: The calling object
+        :type self: Viewport
+        :param win: The window to draw on.
+        :type win: pygame.Surface
+        :param area: The rectangle of the window to redraw, or None for the whole viewport.
+        :type area: pygame.Rect
+        :returns: The rectangle of the window that was redrawn.
+        :rtype: pygame.Rect
+        """
+        area = self.rect if area is None else self.rect.clip(area)
+        if area.width == 0 or area.height == 0:
+            return area
+        region = self.visible_region(area)
+        visible = self.canvas.get_rect().clip(region)
+        win.set_clip(area)
+        if visible != region:
+            win.fill(self.OUTSIDE_COLOR, area)
+        for tile in self.canvas.tiles_under(visible):
+            tile_rect = self.canvas.tile_rect(tile)
+            source = tile_rect.clip(visible)
+            dest = self.scaled_rect(source)
+            if dest.width == 0 or dest.height == 0:
+                continue
+            surface = self.canvas.tiles.get(tile)
+            if surface is None:
+                win.fill(self.canvas.tile_color(tile), dest)
+                continue
+            part = surface.subsurface(source.move(-tile_rect.left, -tile_rect.top))
+            if self.zoom != 1:
+                part = pygame.transform.scale(part, dest.size)
+            win.blit(part, dest)
+        win.set_clip(None)
+        return area
+
+    def draw_surface(self, win, surface, pos, area=None):
+        """
+        Draws a surface over the viewport as if it were part of the canvas, e.g. pixels being moved over the painting.
+        Only the part of the surface visible in the part of the viewport being redrawn is scaled and drawn.
+        :param self: The calling object
+        :type self: Viewport
+        :param win: The window to draw on.
+        :type win: pygame.Surface
+        :param surface: The surface to draw.
+        :type surface: pygame.Surface
+        :param pos: The position on the canvas of the top-left corner of surface.
+        :type pos: tuple
+        :param area: The rectangle of the window to draw in, or None for the whole viewport.
+        :type area: pygame.Rect
+        :returns: The rectangle of the window that was drawn on, or None if surface isn't visible there.
+        :rtype: pygame.Rect
+        """
+        area = self.rect if area is None else self.rect.clip(area)
+        if area.width == 0 or area.height == 0:
+            return None
+        rect = surface.get_rect(topleft=pos)
+        source = rect.clip(self.visible_region(area))
+        dest = self.scaled_rect(source)
+        if dest.width == 0 or dest.height == 0:
+            return None
+        part = surface.subsurface(source.move(-rect.left, -rect.top))
+        if self.zoom != 1:
+            part = pygame.transform.scale(part, dest.size)
+        win.set_clip(area)
+        win.blit(part, dest)
+        win.set_clip(None)
+        return dest.clip(area)
@@ -0,0 +1,73 @@
+"""Dirty-rectangle tracking so each frame only pushes the changed parts of the window to the display."""
+import pygame
+
+
+class DirtyRegion:
+    """Collects the rectangles of the window changed during a frame and pushes them to the display at once.
+    Counts the pixels pushed so the cost of display updates can be measured."""
+
+    def __init__(self, bounds):
+        """Initializes an empty dirty region.
+        :param self: The calling object/object being initialized
+        :type self: DirtyRegion
+        :param bounds: The rectangle of the window; reported rectangles are clipped to it.
+        :type bounds: pygame.Rect
+        """
+        self.bounds = pygame.Rect(bounds)
+        self.rects = []  # Rectangles changed since the last flush
+        self.pixels_pushed = 0  # Number of pixels pushed to the display by the last flush
+        self.total_pixels_pushed = 0  # Number of pixels pushed to the display by all flushes
+        self.frames_flushed = 0  # Number of flushes that pushed at least one pixel
+
+    def add(self, rect):
+        """Reports a rectangle of the window as changed.
+        :param self: The calling object
+        :type self: DirtyRegion
+        :param rect: The changed rectangle, or None if nothing changed.
+        :type rect: pygame.Rect
+        """
+        if rect is None:
+            return
+        rect = self.bounds.clip(rect)
+        if rect.width and rect.height:
+            self.rects.append(rect)
+
+    def merged(self):
+        """
+        Merges overlapping changed rectangles so no pixel is pushed twice.
+        If the bounding rectangle of all the changes isn't larger than the changes themselves it is used instead.
+        :param self: The calling object
+        :type self: DirtyRegion
+        :returns: Non-overlapping rectangles covering every change.
+        :rtype: list
+        """
+        merged = []
+        for rect in self.rects:
+            rect = rect.copy()
+            # Absorb every rectangle the growing rectangle overlaps until none is left
+            overlapping = rect.collidelist(merged)
+            while overlapping != -1:
+                rect.union_ip(merged.pop(overlapping))
+                overlapping = rect.collidelist(merged)
+            merged.append(rect)
+        if len(merged) > 1:
+            union = merged[0].unionall(merged[1:])
+            if union.width * union.height <= sum(r.width * r.height for r in merged):
+                return [union]
+        return merged
+
+    def flush(self):
+        """Pushes the changed rectangles to the display and starts a new frame.
+        :param self: The calling object
+        :type self: DirtyRegion
+        :returns: The number of pixels pushed.
+        :rtype: int
+        """
+        rects = self.merged()
+        self.rects = []
+        self.pixels_pushed = sum(r.width * r.height for r in rects)
+        if rects:
+            pygame.display.update(rects)
+            self.total_pixels_pushed += self.pixels_pushed
+            self.frames_flushed += 1
+        return self.pixels_pushed
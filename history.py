@@ -0,0 +1,196 @@
+"""Undo and redo history of the canvas, kept as compressed snapshots of only the tiles each operation changed."""
+import collections
+import zlib
+
+import numpy as np
+import pygame
+
+
+class History:
+    """Undo and redo history of a canvas.
+    Before an operation changes a tile of the canvas for the first time, the tile is saved (copy-on-write), so
+    each step of the history costs memory and undo time in proportion to the area it changed.
+    The oldest steps are forgotten once the compressed tiles take more memory than the budget."""
+
+    UNIFORM_TILE_BYTES = 64  # Approximate memory taken by the color saved for an unallocated tile
+
+    def __init__(self, canvas, memory_budget=64 * 1024 * 1024):
+        """Initializes an empty history.
+        :param self: The calling object/object being initialized
+        :type self: History
+        :param canvas: The canvas whose changes are recorded.
+        :type canvas: Canvas
+        :param memory_budget: The most bytes of compressed tiles to keep.
+        :type memory_budget: int
+        """
+        self.canvas = canvas
+        self.memory_budget = memory_budget
+        self.memory_used = 0  # Bytes of compressed tiles in the undo and redo steps
+        self.undo_steps = collections.deque()  # Steps as (tiles, size), the oldest first
+        self.redo_steps = []  # Steps undone as (tiles, size), the most recently undone last
+        self.pending = {}  # Tiles saved by the operation in progress
+
+    def save(self, tile):
+        """
+        :param self: The calling object
+        :type self: History
+        :param tile: The (column, row) of a tile.
+        :type tile: tuple
+        :returns: The compressed pixels of the tile, or the color of every pixel of an unallocated tile (None for the
+            background color).
+        :rtype: bytes
+        """
+        surface = self.canvas.tiles.get(tile)
+        if surface is None:
+            return self.canvas.uniform.get(tile)
+        return zlib.compress(np.ascontiguousarray(pygame.surfarray.pixels2d(surface)).tobytes(), 1)
+
+    def restore(self, tile, data):
+        """
+        Replaces the pixels of a tile with saved ones.
+        :param self: The calling object
+        :type self: History
+        :param tile: The (column, row) of a tile.
+        :type tile: tuple
+        :param data: The saved tile.
+        :type data: bytes
+        """
+        if isinstance(data, bytes):
+            pixels = pygame.surfarray.pixels2d(self.canvas.surface(tile))
+            pixels[:] = np.frombuffer(zlib.decompress(data), dtype=pixels.dtype).reshape(pixels.shape)
+        else:
+            self.canvas.set_uniform(tile, data)
+        self.canvas.invalidate(self.canvas.tile_rect(tile))
+
+    def size(self, tiles):
+        """
+        :param self: The calling object
+        :type self: History
+        :param tiles: Saved tiles by (column, row).
+        :type tiles: dict
+        :returns: The approximate number of bytes taken by the saved tiles.
+        :rtype: int
+        """
+        return sum(len(data) if isinstance(data, bytes) else self.UNIFORM_TILE_BYTES for data in tiles.values())
+
+    def touch(self, rect):
+        """
+        Saves the tiles under rect that the operation in progress hasn't changed yet. Must be called before the
+        pixels of rect are changed.
+        :param self: The calling object
+        :type self: History
+        :param rect: The rectangle of the canvas about to be changed.
+        :type rect: pygame.Rect
+        """
+        self.touch_tiles(self.canvas.tiles_under(rect))
+
+    def touch_tiles(self, tiles):
+        """
+        Saves the given tiles that the operation in progress hasn't changed yet. Must be called before they are
+        changed.
+        :param self: The calling object
+        :type self: History
+        :param tiles: The (column, row) of each tile about to be changed.
+        :type tiles: iterable
+        """
+        for tile in tiles:
+            if tile not in self.pending:
+                self.pending[tile] = self.save(tile)
+
+    def commit(self):
+        """
+        Ends the operation in progress, making it the most recent step that can be undone.
+        :param self: The calling object
+        :type self: History
+        """
+        if not self.pending:
+            return
+        size = self.size(self.pending)
+        self.undo_steps.append((self.pending, size))
+        self.memory_used += size
+        self.pending = {}
+        # A new change makes the undone steps unreachable
+        for _, size in self.redo_steps:
+            self.memory_used -= size
+        self.redo_steps = []
+        self.evict()
+
+    def revert(self):
+        """
+        Abandons the operation in progress, restoring the tiles it changed.
+        :param self: The calling object
+        :type self: History
+        :returns: The rectangle of the canvas that changed, or None if the operation hadn't changed anything.
+        :rtype: pygame.Rect
+        """
+        if not self.pending:
+            return None
+        for tile, data in self.pending.items():
+            self.restore(tile, data)
+        rects = [self.canvas.tile_rect(tile) for tile in self.pending]
+        self.pending = {}
+        return rects[0].unionall(rects[1:])
+
+    def evict(self):
+        """
+        Forgets the oldest steps until the history fits in its memory budget.
+        :param self: The calling object
+        :type self: History
+        """
+        while self.memory_used > self.memory_budget and self.undo_steps:
+            _, size = self.undo_steps.popleft()
+            self.memory_used -= size
+        while self.memory_used > self.memory_budget and self.redo_steps:
+            _, size = self.redo_steps.pop(0)
+            self.memory_used -= size
+
+    def swap(self, step):
+        """
+        Restores the tiles of a step, saving their current pixels as the step that reverses it.
+        :param self: The calling object
+        :type self: History
+        :param step: The (tiles, size) of the step to restore.
+        :type step: tuple
+        :returns: The reversing step and the rectangle of the canvas that changed.
+        :rtype: tuple
+        """
+        tiles, size = step
+        reverse = {tile: self.save(tile) for tile in tiles}
+        for tile, data in tiles.items():
+            self.restore(tile, data)
+        rects = [self.canvas.tile_rect(tile) for tile in tiles]
+        reverse_size = self.size(reverse)
+        self.memory_used += reverse_size - size
+        return (reverse, reverse_size), rects[0].unionall(rects[1:])
+
+    def undo(self):
+        """
+        Reverts the most recent step.
+        :param self: The calling object
+        :type self: History
+        :returns: The rectangle of the canvas that changed, or None if there was nothing to undo.
+        :rtype: pygame.Rect
+        """
+        self.commit()
+        if not self.undo_steps:
+            return None
+        reverse, changed = self.swap(self.undo_steps.pop())
+        self.redo_steps.append(reverse)
+        self.evict()
+        return changed
+
+    def redo(self):
+        """
+        Reapplies the most recently undone step.
+        :param self: The calling object
+        :type self: History
+        :returns: The rectangle of the canvas that changed, or None if there was nothing to redo.
+        :rtype: pygame.Rect
+        """
+        self.commit()
+        if not self.redo_steps:
+            return None
+        reverse, changed = self.swap(self.redo_steps.pop())
+        self.undo_steps.append(reverse)
+        self.evict()
+        return changed
@@ -0,0 +1,158 @@
+"""Importing images onto the painting: decoding, downscaling by area averaging, and quantizing to a palette with
+optional ordered dithering, all as NumPy array operations over the whole image."""
+import numpy as np
+import pygame
+
+# Thresholds of the 8x8 ordered dithering matrix, from 0 to 1, indexed [x % 8, y % 8]
+BAYER = np.array([[0, 32, 8, 40, 2, 34, 10, 42], [48, 16, 56, 24, 50, 18, 58, 26],
+                  [12, 44, 4, 36, 14, 46, 6, 38], [60, 28, 52, 20, 62, 30, 54, 22],
+                  [3, 35, 11, 43, 1, 33, 9, 41], [51, 19, 59, 27, 49, 17, 57, 25],
+                  [15, 47, 7, 39, 13, 45, 5, 37], [63, 31, 55, 23, 61, 29, 53, 21]], dtype=np.float32).T / 64 + 1 / 128
+DITHER_SPREAD = 96  # RGB distance the dithering thresholds spread a pixel over, about that between palette colors
+
+
+def decode(path):
+    """
+    :param path: The path of an image in any format pygame can read.
+    :type path: str
+    :returns: The RGB of every pixel, and its alpha or None for an opaque image, as uint8 arrays indexed [x, y].
+    :rtype: tuple
+    :raises ValueError: If the file isn't an image.
+    """
+    try:
+        image = pygame.image.load(path)
+    except pygame.error as error:
+        raise ValueError("%s: %s" % (path, error)) from None
+    if image.get_bitsize() not in (24, 32):
+        # Indexed and 16-bit images have no view of their pixels as RGB
+        converted = pygame.Surface(image.get_size(), image.get_flags() & pygame.SRCALPHA, 32)
+        converted.blit(image, (0, 0), special_flags=pygame.BLEND_RGBA_MAX if converted.get_flags() else 0)
+        image = converted
+    alpha = pygame.surfarray.pixels_alpha(image) if image.get_flags() & pygame.SRCALPHA else None
+    return pygame.surfarray.pixels3d(image), alpha
+
+
+def fit_size(size, bounds):
+    """
+    :param size: The (width, height) of an image.
+    :type size: tuple
+    :param bounds: The largest (width, height) to fit it in.
+    :type bounds: tuple
+    :returns: The size of the image scaled down to fit, keeping its aspect ratio, or its own size if it fits.
+    :rtype: tuple
+    """
+    scale = min(bounds[0] / size[0], bounds[1] / size[1], 1)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def resample_axis(pixels, length, axis):
+    """
+    :param pixels: An array of pixels.
+    :type pixels: numpy.ndarray
+    :param length: The number of pixels to resample the axis to.
+    :type length: int
+    :param axis: The axis to resample.
+    :type axis: int
+    :returns: The pixels resampled along the axis as float32, each the average of the input pixels its area covers,
+        in proportion to how much of each it covers. Upscaling repeats the nearest pixel instead.
+    :rtype: numpy.ndarray
+    """
+    count = pixels.shape[axis]
+    if length >= count:
+        return np.take(pixels, np.arange(length) * count // length, axis=axis).astype(np.float32)
+    # Output pixel i covers the input from edges[i] to edges[i + 1], which overlaps at most span input pixels. Add up
+    # the first input pixel each output pixel overlaps, then the second and so on, each weighted by how much of it is
+    # covered: every step takes whole slices of the array, rather than a pixel at a time
+    edges = np.arange(length + 1) * count / length
+    starts = np.floor(edges[:-1]).astype(np.intp)
+    span = int(np.max(np.ceil(edges[1:]) - starts))
+    # Taking along the first axis copies whole slices at a time, however the array is laid out in memory
+    pixels = np.moveaxis(pixels, axis, 0)
+    shape = (length,) + (1,) * (pixels.ndim - 1)
+    result = None
+    for step in range(span):
+        indexes = starts + step
+        weights = np.clip(np.minimum(indexes + 1, edges[1:]) - np.maximum(indexes, edges[:-1]), 0, 1)
+        part = pixels[np.minimum(indexes, count - 1)].astype(np.float32)
+        part *= weights.astype(np.float32).reshape(shape)
+        if result is None:
+            result = part
+        else:
+            result += part
+    result *= length / count
+    return np.moveaxis(result, 0, axis)
+
+
+def area_average(pixels, size):
+    """
+    :param pixels: The pixels of an image, indexed [x, y] or [x, y, channel].
+    :type pixels: numpy.ndarray
+    :param size: The (width, height) to resample the image to.
+    :type size: tuple
+    :returns: The resampled pixels as float32, each the average of the pixels of the image its area covers.
+    :rtype: numpy.ndarray
+    """
+    # Resample the columns first: the rows of a surface are contiguous in memory, so taking whole rows copies memory
+    # in long runs, and the second pass only has the shrunk image to go through
+    return resample_axis(resample_axis(pixels, size[1], 1), size[0], 0)
+
+
+def quantize(pixels, palette, dither=False):
+    """
+    :param pixels: RGB pixels, indexed [x, y, channel].
+    :type pixels: numpy.ndarray
+    :param palette: The colors to map them to.
+    :type palette: list
+    :param dither: Whether to offset the pixels by an 8x8 ordered dithering matrix before mapping them, so that
+        areas of a color between palette colors become patterns of them.
+    :type dither: bool
+    :returns: The index in palette of the color nearest each pixel, indexed [x, y].
+    :rtype: numpy.ndarray
+    """
+    pixels = np.asarray(pixels, dtype=np.float32)
+    if dither:
+        width, height = pixels.shape[:2]
+        thresholds = np.tile(BAYER, ((width + 7) // 8, (height + 7) // 8))[:width, :height]
+        pixels = pixels + (DITHER_SPREAD * (thresholds - 0.5))[:, :, None]
+    # The nearest color c to a pixel p has the least |p - c|^2 = |p|^2 - 2 p.c + |c|^2, and |p|^2 is the same for every
+    # color, so the distances to compare come out of a single matrix product of the pixels and the palette
+    colors = np.array([color[:3] for color in palette], dtype=np.float32)
+    distances = pixels @ (-2 * colors.T)
+    distances += np.square(colors).sum(axis=1)
+    return np.argmin(distances, axis=2).astype(np.uint8)
+
+
+def load_image(path, bounds, background_color=(255, 255, 255), palette=None, dither=False):
+    """
+    Decodes an image and scales it down to fit in bounds by area averaging, compositing any transparent pixels over
+    the background color.
+    :param path: The path of an image in any format pygame can read.
+    :type path: str
+    :param bounds: The largest (width, height) of the result.
+    :type bounds: tuple
+    :param background_color: The color to show under transparent pixels.
+    :type background_color: tuple
+    :param palette: The colors to quantize the image to, or None to keep its colors.
+    :type palette: list
+    :param dither: Whether to quantize with ordered dithering.
+    :type dither: bool
+    :returns: The image as a new RGB surface, or as a new 8-bit surface indexing the palette if one is given.
+    :rtype: pygame.Surface
+    :raises ValueError: If the file isn't an image.
+    """
+    rgb, alpha = decode(path)
+    size = fit_size(rgb.shape[:2], bounds)
+    if alpha is None:
+        pixels = area_average(rgb, size)
+    else:
+        # Average the colors weighted by their alpha, so transparent pixels don't bleed their color into the others,
+        # then blend the result over the background
+        weights = area_average(alpha, size) / 255
+        pixels = area_average(rgb * (alpha[:, :, None] / np.float32(255)), size)
+        pixels += np.multiply.outer(1 - weights, np.array(background_color[:3], dtype=np.float32))
+    if palette is None:
+        return pygame.surfarray.make_surface(np.clip(np.rint(pixels), 0, 255).astype(np.uint8))
+    surface = pygame.Surface(size, 0, 8)
+    surface.set_palette([color[:3] for color in palette])
+    pygame.surfarray.blit_array(surface, quantize(pixels, palette, dither))
+    return surface
@@ -0,0 +1,293 @@
+"""Layers of a painting, composited through cached images of the layers below and above the one being edited, so that
+an edit only composites the area it changed against two caches, however many layers there are."""
+import pygame
+
+from canvas import Canvas
+from history import History
+
+
+class Layer:
+    """A layer of a painting: its canvas, the undo history of its canvas, and how it is composited."""
+
+    def __init__(self, canvas, name, memory_budget=64 * 1024 * 1024):
+        """Initializes a visible, opaque layer.
+        :param self: The calling object/object being initialized
+        :type self: Layer
+        :param canvas: The pixels of the layer.
+        :type canvas: Canvas
+        :param name: The name of the layer.
+        :type name: str
+        :param memory_budget: The most bytes of compressed tiles the history of the layer keeps.
+        :type memory_budget: int
+        """
+        self.canvas = canvas
+        self.name = name
+        self.visible = True
+        self.opacity = 1.0  # Alpha the layer is composited at, from 0 to 1
+        self.history = History(canvas, memory_budget)
+
+
+class LayerStack:
+    """The layers of a painting, the bottom one first, and the composite of them that is shown and saved.
+    The bottom layer is the opaque painting the stack was made with, and stays at the bottom; the layers added over
+    it are transparent. Tools edit the active layer.
+    The visible layers below the active one are kept composited into an opaque canvas, and the ones above it into a
+    transparent canvas whose colors are multiplied by their alpha, so compositing an area an edit changed takes three
+    blits per tile. The caches are rebuilt when another layer becomes active or the layers are reordered, hidden or
+    made more or less opaque.
+    Until a layer is added, hidden or made translucent, the bottom layer is shown as it is."""
+
+    def __init__(self, canvas, memory_budget=64 * 1024 * 1024):
+        """Initializes a stack of a single layer.
+        :param self: The calling object/object being initialized
+        :type self: LayerStack
+        :param canvas: The painting of the bottom layer.
+        :type canvas: Canvas
+        :param memory_budget: The most bytes of compressed tiles the history of each layer keeps.
+        :type memory_budget: int
+        """
+        self.memory_budget = memory_budget
+        self.layers = [Layer(canvas, "Layer 1", memory_budget)]
+        self.active = 0  # Index of the layer the tools edit
+        self.below = None  # Composite of the visible layers below the active one, None if it is the bottom layer
+        self.above = None  # Composite of the visible layers above the active one, None if there are none
+        self.composite = None  # Composite of every visible layer, None while the bottom layer is shown as it is
+        self.shown = canvas  # The canvas to show and save: the composite, or the bottom layer while there is none
+        # Tile of one color to composite the unallocated tiles of a layer with
+        self.uniform = pygame.Surface((canvas.TILE_SIZE, canvas.TILE_SIZE), pygame.SRCALPHA, 32)
+
+    def active_layer(self):
+        """
+        :param self: The calling object
+        :type self: LayerStack
+        :returns: The layer the tools edit.
+        :rtype: Layer
+        """
+        return self.layers[self.active]
+
+    def add(self):
+        """
+        Adds a transparent layer over the active one and makes it active.
+        :param self: The calling object
+        :type self: LayerStack
+        :raises ValueError: If the painting is indexed, as an indexed canvas has no alpha to make layers over it
+            transparent with.
+        """
+        bottom = self.layers[0].canvas
+        if bottom.palette is not None:
+            raise ValueError("an indexed painting has a single layer")
+        canvas = Canvas(bottom.width, bottom.height, transparent=True)
+        self.active += 1
+        self.layers.insert(self.active, Layer(canvas, "Layer %d" % (len(self.layers) + 1), self.memory_budget))
+        self.rebuild()
+
+    def select(self, index):
+        """
+        Makes another layer active.
+        :param self: The calling object
+        :type self: LayerStack
+        :param index: The index of the layer, which is clamped to the stack.
+        :type index: int
+        """
+        index = max(0, min(index, len(self.layers) - 1))
+        if index != self.active:
+            self.active = index
+            self.rebuild()
+
+    def move(self, offset):
+        """
+        Moves the active layer up or down the stack, above the bottom layer.
+        :param self: The calling object
+        :type self: LayerStack
+        :param offset: The number of layers to move the active layer up by, or down by if negative.
+        :type offset: int
+        """
+        if self.active == 0:
+            return
+        index = max(1, min(self.active + offset, len(self.layers) - 1))
+        if index != self.active:
+            self.layers.insert(index, self.layers.pop(self.active))
+            self.active = index
+            self.rebuild()
+
+    def set_visible(self, visible):
+        """
+        Shows or hides the active layer.
+        :param self: The calling object
+        :type self: LayerStack
+        :param visible: Whether the layer is composited.
+        :type visible: bool
+        """
+        if visible != self.active_layer().visible:
+            self.active_layer().visible = visible
+            self.rebuild()
+
+    def set_opacity(self, opacity):
+        """
+        Changes the alpha the active layer is composited at.
+        :param self: The calling object
+        :type self: LayerStack
+        :param opacity: The alpha of the layer, which is clamped between 0 and 1.
+        :type opacity: float
+        """
+        opacity = min(max(opacity, 0.0), 1.0)
+        if opacity != self.active_layer().opacity:
+            self.active_layer().opacity = opacity
+            self.rebuild()
+
+    def tile_source(self, layer, tile):
+        """
+        :param self: The calling object
+        :type self: LayerStack
+        :param layer: A layer.
+        :type layer: Layer
+        :param tile: The (column, row) of a tile.
+        :type tile: tuple
+        :returns: The surface holding the pixels of the layer's tile, a tile of its color if it isn't allocated, or
+            None if it is hidden or transparent there.
+        :rtype: pygame.Surface
+        """
+        if not layer.visible or layer.opacity <= 0:
+            return None
+        surface = layer.canvas.tiles.get(tile)
+        if surface is not None:
+            return surface
+        color = layer.canvas.tile_color(tile)
+        if len(color) > 3 and color[3] == 0:
+            return None
+        self.uniform.fill(color)
+        return self.uniform
+
+    def blend(self, destination, layer, tile, area):
+        """
+        Composites part of a tile of a layer over the same part of a tile.
+        :param self: The calling object
+        :type self: LayerStack
+        :param destination: The tile to composite the layer over.
+        :type destination: pygame.Surface
+        :param layer: The layer to composite.
+        :type layer: Layer
+        :param tile: The (column, row) of the tile.
+        :type tile: tuple
+        :param area: The rectangle of the tile to composite.
+        :type area: pygame.Rect
+        """
+        source = self.tile_source(layer, tile)
+        if source is None:
+            return
+        if layer.opacity < 1:
+            # Restoring an alpha of 255 keeps the alpha of each pixel of a transparent tile, while None would drop it
+            restored = 255 if source.get_flags() & pygame.SRCALPHA else None
+            source.set_alpha(round(255 * layer.opacity))
+        destination.blit(source, area.topleft, area)
+        if layer.opacity < 1:
+            source.set_alpha(restored)
+
+    def blend_premultiplied(self, destination, layer, tile):
+        """
+        Composites a tile of a transparent layer over a tile of the transparent cache, multiplying its colors by
+        their alpha.
+        :param self: The calling object
+        :type self: LayerStack
+        :param destination: The tile of the cache.
+        :type destination: pygame.Surface
+        :param layer: The layer to composite.
+        :type layer: Layer
+        :param tile: The (column, row) of the tile.
+        :type tile: tuple
+        """
+        source = self.tile_source(layer, tile)
+        if source is None:
+            return
+        source = source.subsurface(((0, 0), destination.get_size())).premul_alpha()
+        if layer.opacity < 1:
+            alpha = round(255 * layer.opacity)
+            source.fill((alpha, alpha, alpha, alpha), special_flags=pygame.BLEND_RGBA_MULT)
+        destination.blit(source, (0, 0), special_flags=pygame.BLEND_PREMULTIPLIED)
+
+    def rebuild(self):
+        """
+        Composites the caches of the layers below and above the active one, and the whole painting, again.
+        :param self: The calling object
+        :type self: LayerStack
+        """
+        bottom = self.layers[0]
+        if self.composite is None and len(self.layers) == 1 and bottom.visible and bottom.opacity == 1:
+            self.shown = bottom.canvas
+            return
+        canvas = bottom.canvas
+        below = self.layers[:self.active]
+        above = self.layers[self.active + 1:]
+        self.below = None
+        if below:
+            self.below = Canvas(canvas.width, canvas.height, canvas.background_color)
+            for tile in set().union(*(layer.canvas.used_tiles() for layer in below if layer.visible)):
+                surface = self.below.surface(tile)
+                for layer in below:
+                    self.blend(surface, layer, tile, surface.get_rect())
+        self.above = None
+        if above:
+            self.above = Canvas(canvas.width, canvas.height, transparent=True)
+            for tile in set().union(*(layer.canvas.used_tiles() for layer in above if layer.visible)):
+                surface = self.above.surface(tile)
+                for layer in above:
+                    self.blend_premultiplied(surface, layer, tile)
+        if self.composite is None:
+            self.composite = Canvas(canvas.width, canvas.height, canvas.background_color)
+            self.shown = self.composite
+        # Every tile that isn't of the background color in some layer has to be composited
+        tiles = set().union(*(layer.canvas.used_tiles() for layer in self.layers if layer.visible))
+        self.composite.clear()
+        for tile in tiles:
+            self.composite_tile(tile, self.composite.surface(tile).get_rect())
+        self.composite.changed |= tiles
+
+    def composite_tile(self, tile, area):
+        """
+        Composites part of a tile of the painting from the caches and the active layer.
+        :param self: The calling object
+        :type self: LayerStack
+        :param tile: The (column, row) of the tile.
+        :type tile: tuple
+        :param area: The rectangle of the tile to composite.
+        :type area: pygame.Rect
+        """
+        active = self.active_layer()
+        if (area.size == self.composite.tile_rect(tile).size and tile not in active.canvas.tiles
+                and (self.below is None or tile not in self.below.tiles)
+                and (self.above is None or tile not in self.above.tiles)):
+            # Nothing but the active layer may be painted over the tile, and only with one color: leave it
+            # unallocated if that color is opaque or doesn't show
+            base = self.composite.background_color if self.below is None else self.below.tile_color(tile)
+            color = active.canvas.tile_color(tile)
+            if not active.visible or active.opacity <= 0 or (len(color) > 3 and color[3] == 0):
+                self.composite.set_uniform(tile, base)
+                return
+            if active.opacity == 1 and (len(color) == 3 or color[3] == 255):
+                self.composite.set_uniform(tile, color)
+                return
+        surface = self.composite.surface(tile)
+        if self.below is None:
+            surface.fill(self.composite.background_color, area)
+        elif tile in self.below.tiles:
+            surface.blit(self.below.tiles[tile], area.topleft, area)
+        else:
+            surface.fill(self.below.tile_color(tile), area)
+        self.blend(surface, active, tile, area)
+        if self.above is not None and tile in self.above.tiles:
+            surface.blit(self.above.tiles[tile], area.topleft, area, pygame.BLEND_PREMULTIPLIED)
+        self.composite.changed.add(tile)
+
+    def update(self, rect):
+        """
+        Composites the part of the painting an edit of the active layer changed.
+        :param self: The calling object
+        :type self: LayerStack
+        :param rect: The rectangle of the canvas that changed, or None if nothing changed.
+        :type rect: pygame.Rect
+        """
+        if self.composite is None or rect is None:
+            return
+        for tile in self.composite.tiles_under(rect):
+            tile_rect = self.composite.tile_rect(tile)
+            self.composite_tile(tile, tile_rect.clip(rect).move(-tile_rect.left, -tile_rect.top))
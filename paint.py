@@ -1,41 +1,270 @@
+import collections
+import math
 import pygame
 import sys
-import collections
+import time
+
+import assets
+from canvas import Canvas, Viewport
+from dirty import DirtyRegion
+from layers import LayerStack
+from selection import Clipboard, border_rects, rect_difference
+# The storage, brush, profiler, recording and shared modules are imported when first used, so that the app starts
+# sooner
 
 
 class PaintApp:
     """Class representing the paint app.
-    Supports draw, erase, fill, replace and clear operations.
+    Supports select, draw, erase, line, rectangle, ellipse, fill, replace and clear operations.
     Supports 4 thicknesses of paintbrushes in 8 colors.
     """
 
     WINDOW_WIDTH = 450
     WINDOW_HEIGHT = 580
+    SCROLL_STEP = 64  # Window pixels the arrow keys scroll the viewport by
+    JOB_TIME_SLICE = 0.008  # Seconds of each frame that a fill or replace in progress may take
+    AUTOSAVE_INTERVAL = 2000  # Milliseconds between autosave checkpoints
+    AUTOSAVE_EVENT = pygame.USEREVENT  # Event posted when an autosave checkpoint is due
+    LAYER_OPACITY_STEP = 0.1  # Opacity the [ and ] keys change the active layer's by
+    SHARED_EVENT = pygame.USEREVENT + 1  # Event posted when operations on a shared painting arrive
+    SHAPE_TOOLS = ("Line", "Rectangle", "Ellipse")  # Tools that draw a shape from where the mouse is pressed
+    ELLIPSE_STEP = 4  # Canvas pixels between the points an ellipse is drawn through, roughly
+    SELECTION_COLORS = ((0, 0, 0), (255, 255, 255))  # Colors of the outer and inner lines of the selection's outline
 
-    def __init__(self):
+    def __init__(self, target_fps=60, canvas_size=None, profiler=None, indexed=False, open_path=None,
+                 save_path=None, autosave_dir=None, server_address=None):
         """Initializes app with window, paintbrush, and panel for color, brush thickness and tools
         (draw, erase, fill, replace and clear).
         :param self: The calling object/object being initialized
         :type self: PaintApp
+        :param target_fps: The most frames per second to handle input and update the screen at.
+        :type target_fps: int
+        :param canvas_size: The (width, height) of the painting, or None to fit the painting area of the window.
+        :type canvas_size: tuple
+        :param profiler: The profiler to time each frame and tool operation with, or None to not time them.
+        :type profiler: FrameProfiler
+        :param indexed: Whether to store the painting as a byte per pixel, indexing the panel's colors and the
+            background color.
+        :type indexed: bool
+        :param open_path: The PNG image or native file to load the painting from, or None.
+        :type open_path: str
+        :param save_path: The file Ctrl+S saves the painting to, as a PNG image if it ends in .png and in the native
+            format otherwise. Defaults to open_path, or painting.png.
+        :type save_path: str
+        :param autosave_dir: The directory to autosave the painting to, or None to not autosave. Unless open_path is
+            given, the painting autosaved there by the last session is recovered.
+        :type autosave_dir: str
+        :param server_address: The (host, port) or Unix socket path of the server of a shared painting to paint on
+            instead, or None.
+        :type server_address: tuple or str
+        :raises OSError: If the server of the shared painting can't be reached.
+        :raises ValueError: If the file at open_path isn't a painting, or the server doesn't send one.
         """
-        pygame.init()
+        # The app only uses the display and fonts, so don't start audio, joysticks and the other subsystems
+        pygame.display.init()
+        pygame.font.init()
         self.background_color = (255, 255, 255)  # Screen has a white background
-        self.current_tool = "Draw"  # current_tool can be Draw, Erase, Fill, Replace or Clear
+        # current_tool can be Select, Draw, Erase, Line, Rectangle, Ellipse, Fill, Replace or Clear
+        self.current_tool = "Draw"
+        self.target_fps = target_fps
+        self.prev_pos = None  # Canvas position at the end of the current stroke, None if not drawing
+        # Time from handling a frame's input to pushing its pixels to the display, in seconds
+        self.input_latencies = collections.deque(maxlen=10000)
+        self.stroke_points = []  # Canvas positions to draw the current stroke through at the end of the frame
+        self.stroke_samples = 0  # Number of cursor positions received while drawing or erasing
+        self.stroke_segments = 0  # Number of line segments drawn for them
+        self.stroke_batches = 0  # Number of draw calls the segments were drawn with
+        self.shape_start = None  # Canvas position the shape being drawn starts at, None if not drawing one
+        self.shape_end = None  # Canvas position the shape being drawn ends at, where the cursor is
+        self.preview_rect = None  # Rectangle of the window the preview of the shape covers, None if not shown
+        self.preview_key = None  # Window positions of the ends, width and color of the shape the preview shows
+        self.backing = None  # Copy of the window under the preview, made when the first shape is previewed
+        self.selection = None  # Rectangle of the canvas selected, None if nothing is selected
+        self.floating = None  # Pixels lifted off the painting or pasted, shown at the selection until dropped, or None
+        self.select_start = None  # Canvas position the selection being dragged out starts at, None if not selecting
+        self.move_from = None  # Canvas position the selection is being moved from, None if not moving it
+        self.selection_shown = None  # (window rectangle, floating pixels) of the selection as last shown, or None
+        self.clip_to_selection = True  # Whether the other tools only change the pixels inside the selection
+        self.clipboard = Clipboard()
+        self.fill_connectivity = 8  # Fill spreads to diagonal neighbours (8) or only to edge neighbours (4)
+        self.replace_tolerance = 0  # Largest RGB distance from the clicked color that Replace still recolors
+        self.replaces = 0  # Number of replaces finished
+        self.replaced_pixels = 0  # Number of pixels they recolored
+        self.last_import = None  # (path, width, height, seconds) of the last image imported, or None
+        self.profiler = profiler
+        self.overlay_rect = None  # Rectangle of the window showing the profiler overlay, None if it isn't shown
+        self.job = None  # Steps of the fill or replace in progress, run a slice per frame, None if there is none
+        self.job_tool = None  # The tool that started the job
+        self.job_time = 0.0  # Seconds spent running the job so far
+        self.job_calls = 0  # Number of times the job was resumed in the last frame, which a replay repeats
         self.pb = PaintBrush()
         self.win = pygame.display.set_mode((self.WINDOW_WIDTH, self.WINDOW_HEIGHT))  # Draws window
         pygame.display.set_caption("Paint")
         self.win.fill(self.background_color)
         self.panel = Panel()  # Displays paintbrush thickness, paintbrush color and current_tool
+        if canvas_size is None:
+            canvas_size = (self.WINDOW_WIDTH, self.WINDOW_WIDTH)
+        # Colors of the panel and the background, that an indexed painting stores and imported images are quantized to
+        self.palette = [self.background_color] + list(self.panel.colors.values())
+        palette = self.palette if indexed else None
+        self.canvas = None  # The painting
+        self.client = None  # Connection to the server of the shared painting, None if the painting isn't shared
+        if server_address is not None:
+            import shared
+            self.client = shared.Client(server_address, self.SHARED_EVENT)
+            self.canvas = self.client.replica.canvas
+        if open_path is not None or autosave_dir is not None:
+            import storage
+        if open_path is not None:
+            self.canvas = storage.load(open_path, self.background_color, palette)
+        elif autosave_dir is not None:
+            try:
+                self.canvas = storage.recover(autosave_dir)
+            except (OSError, ValueError) as error:
+                print("could not recover the last session from %s: %s" % (autosave_dir, error), file=sys.stderr)
+        if self.canvas is None:
+            self.canvas = Canvas(canvas_size[0], canvas_size[1], self.background_color, palette)
+        self.save_path = save_path or open_path or "painting.png"
+        self.autosaver = None  # Writes the tiles changed since the last checkpoint in the background, if autosaving
+        if autosave_dir is not None:
+            self.autosaver = storage.Autosaver(self.canvas, autosave_dir)
+            pygame.time.set_timer(self.AUTOSAVE_EVENT, self.AUTOSAVE_INTERVAL)
+        self.layers = LayerStack(self.canvas)  # Layers of the painting; self.canvas is the active one
+        # Tiles of the active layer changed by each operation, to undo and redo them
+        self.history = self.layers.active_layer().history
+        # The part of the window above the panel shows the painting
+        self.viewport = Viewport(self.layers.shown, pygame.Rect(0, 0, self.WINDOW_WIDTH, self.WINDOW_WIDTH))
+        self.viewport.draw(self.win)
+        self.dirty = DirtyRegion(self.win.get_rect())  # Parts of the window to push to the display this frame
         self.color_dict = self.panel.get_color_buttons()
         self.display_panel()
-        pygame.display.update()
+        self.dirty.add(self.win.get_rect())  # Show the whole window on the first frame
+        self.dirty.flush()
 
     def display_panel(self):
         """Displays the panel for color, brush thickness and tools (draw, erase, fill, replace and clear).
         :param self: The calling object
         :type self: PaintApp
         """
-        self.panel.display(self.win)
+        self.panel.display(self.win, self.dirty)
+
+    def display_overlay(self):
+        """Shows the profiler overlay over the top-left corner of the painting while it is toggled on, and removes it
+        once it is toggled off.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        if not self.profiler.visible:
+            if self.overlay_rect is not None:
+                self.dirty.add(self.viewport.draw(self.win, self.overlay_rect))
+                self.overlay_rect = None
+            return
+        image, rendered = self.profiler.overlay()
+        rect = image.get_rect(topleft=self.viewport.rect.topleft)
+        # Only draw the overlay again if it changed or the painting under it was redrawn
+        if rendered or rect != self.overlay_rect or rect.collidelist(self.dirty.rects) != -1:
+            area = rect if self.overlay_rect is None else rect.union(self.overlay_rect)
+            self.viewport.draw(self.win, area)
+            self.win.blit(image, rect)
+            self.dirty.add(area)
+            self.overlay_rect = rect
+
+    def show(self, rect):
+        """
+        Redraws the part of the viewport showing a changed rectangle of the painting.
+        :param self: The calling object
+        :type self: PaintApp
+        :param rect: The rectangle of the canvas that changed, or None if nothing changed.
+        :type rect: pygame.Rect
+        """
+        self.layers.update(rect)
+        area = self.viewport.to_window(rect)
+        if area is not None:
+            if self.preview_rect is not None and area.colliderect(self.preview_rect):
+                self.erase_preview()  # The backing store no longer holds the painting under the preview
+            self.dirty.add(self.viewport.draw(self.win, area))
+
+    def show_all(self):
+        """
+        Redraws the whole viewport, e.g. after it was scrolled or zoomed.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        self.erase_preview()
+        self.dirty.add(self.viewport.draw(self.win))
+
+    def set_canvas(self, canvas):
+        """
+        Replaces the painting, e.g. with one that was loaded, forgetting the history and the layers of the old one.
+        :param self: The calling object
+        :type self: PaintApp
+        :param canvas: The new painting.
+        :type canvas: Canvas
+        """
+        self.cancel_job()
+        self.floating = None
+        self.selection = None
+        self.layers = LayerStack(canvas, self.history.memory_budget)
+        self.set_active_layer()
+        self.viewport.scroll(0, 0)  # Keep the viewport on the new painting
+
+    def set_active_layer(self):
+        """
+        Makes the tools edit the active layer, and shows the painting as the layers are now composited.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        layer = self.layers.active_layer()
+        self.canvas = layer.canvas
+        self.history = layer.history
+        self.viewport.canvas = self.layers.shown
+        if self.autosaver is not None and self.layers.composite is not None:
+            # Once the layers are composited, the composite is what is saved; it starts with all its tiles changed
+            self.autosaver.canvas = self.layers.composite
+        caption = "Paint - %s (%d of %d)" % (layer.name, self.layers.active + 1, len(self.layers.layers))
+        if not layer.visible:
+            caption += ", hidden"
+        elif layer.opacity < 1:
+            caption += ", %d%%" % round(100 * layer.opacity)
+        pygame.display.set_caption(caption if len(self.layers.layers) > 1 else "Paint")
+        self.show_all()
+
+    def edit_layers(self, key, mod):
+        """
+        Handles a key that adds, selects, reorders, hides or changes the opacity of a layer.
+        Like a new click, it cancels the fill or replace in progress.
+        :param self: The calling object
+        :type self: PaintApp
+        :param key: The key pressed.
+        :type key: int
+        :param mod: The modifier keys held.
+        :type mod: int
+        """
+        if self.client is not None:
+            print("a shared painting has a single layer", file=sys.stderr)
+            return
+        self.cancel_job()
+        self.drop_selection()
+        self.history.commit()
+        layer = self.layers.active_layer()
+        if key == pygame.K_l:
+            try:
+                self.layers.add()
+            except ValueError as error:
+                print("could not add a layer: %s" % error, file=sys.stderr)
+                return
+        elif key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+            step = 1 if key == pygame.K_PAGEUP else -1
+            if mod & pygame.KMOD_CTRL:
+                self.layers.move(step)
+            else:
+                self.layers.select(self.layers.active + step)
+        elif key == pygame.K_h:
+            self.layers.set_visible(not layer.visible)
+        elif key in (pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET):
+            step = self.LAYER_OPACITY_STEP if key == pygame.K_RIGHTBRACKET else -self.LAYER_OPACITY_STEP
+            self.layers.set_opacity(round(layer.opacity + step, 2))
+        self.set_active_layer()
 
     def det_brush_color(self, pos, color):
         """Determines the color of the paintbrush.
@@ -52,7 +281,7 @@ class PaintApp:
         if pos is None:
             return color
         # The cursor isn't hovering over the panel so the color hasn't changed
-        if 0 <= pos[1] < self.WINDOW_WIDTH:
+        if self.viewport.rect.collidepoint(pos):
             return color
         color_buttons = self.panel.get_color_buttons()
         for x in color_buttons:
@@ -77,7 +306,7 @@ class PaintApp:
         if pos is None:
             return th
         # The cursor isn't hovering over the panel so the thickness hasn't changed
-        if 0 <= pos[1] < self.WINDOW_WIDTH:
+        if self.viewport.rect.collidepoint(pos):
             return th
         brush_buttons = self.panel.get_brush_buttons()
         for x in brush_buttons:
@@ -112,101 +341,373 @@ class PaintApp:
         if pos is None:
             return current_tool
         # The cursor isn't hovering over the panel so the current_tool hasn't changed
-        if 0 <= pos[1] < self.WINDOW_WIDTH:
+        if self.viewport.rect.collidepoint(pos):
             return current_tool
         tool_buttons = self.panel.get_tool_buttons()
         for x in tool_buttons:
             # If the user is pressing on a button for a new current_tool
-            if tool_buttons[x][1].collidepoint(pos) and pygame.mouse.get_pressed()[0]:
+            if tool_buttons[x][1].collidepoint(pos):
                 return x
         return current_tool
 
-    def get_click(self, pos):
+    def fill(self, start_pos, tar, repl, connectivity=None):
         """
-        Determines the position of the cursor.
+        Fills a region of the painting with the color tar.
         :param self: The calling object
         :type self: PaintApp
-        :param pos: The position of the cursor when the method was called
-        :type pos: tuple
-        :returns: The position of the cursor.
+        :param start_pos: The starting position on the canvas from which to fill the contiguous region.
+        :type start_pos: tuple
+        :param tar: The color of the region the user wants to fill.
+        :type tar: tuple
+        :param repl: The color the user wants to fill the region with/replace the current color with.
+        :type repl: tuple
+        :param connectivity: 8 to fill across diagonal neighbours, 4 to only fill across edge neighbours.
+            Defaults to fill_connectivity.
+        :type connectivity: int
+        """
+        if connectivity is None:
+            connectivity = self.fill_connectivity
+        self.show(self.canvas.fill(start_pos, tar, repl, connectivity, self.history.touch, self.clip_rect()))
+
+    def draw(self, prev_pos, cur_pos):
+        """
+        Draws a line of a stroke on the painting.
+        :param self: The calling object
+        :type self: PaintApp
+        :param prev_pos: The canvas position of the cursor before the method was called, or None to start a new stroke.
+        :type prev_pos: tuple
+        :param cur_pos: The canvas position of the cursor when the method is called.
+        :type cur_pos: tuple
+        :return: The position of the cursor when the method is called.
         :rtype: tuple
         """
-        pygame.event.pump()
-        if pygame.mouse.get_pressed()[0]:
-            return pygame.mouse.get_pos()
-        return pos
+        self.flush_stroke()
+        if prev_pos is None:
+            self.prev_pos = None
+        self.stroke_points = [cur_pos if prev_pos is None else prev_pos, cur_pos]
+        self.flush_stroke()
+        return cur_pos
 
-    def user_wants_to_paint(self):
+    def flush_stroke(self):
         """
+        Draws the part of the stroke collected since the last flush as one polyline.
         :param self: The calling object
         :type self: PaintApp
-        :returns: Whether the user wants to paint.
-        :rtype: bool
         """
-        pygame.event.pump()
-        events = pygame.event.get()
-        for ev in events:
-            if ev.type == pygame.QUIT:
-                return False
-        return True
+        if self.stroke_points:
+            if self.client is not None:
+                # The stroke is painted once the server has ordered it among the other users' operations
+                self.client.send_stroke(self.stroke_points, self.prev_pos is None, self.pb)
+            else:
+                if self.prev_pos is None:
+                    self.pb.end_stroke()  # The points start a new stroke
+                xs = [point[0] for point in self.stroke_points]
+                ys = [point[1] for point in self.stroke_points]
+                reach = self.pb.thickness + 2  # How far the stroke may spread from the points
+                clip = self.clip_rect()
+                bounds = pygame.Rect(min(xs) - reach, min(ys) - reach, max(xs) - min(xs) + 2 * reach,
+                                     max(ys) - min(ys) + 2 * reach)
+                self.history.touch(bounds if clip is None else bounds.clip(clip))
+                self.show(self.pb.draw_stroke(self.canvas, self.stroke_points, self.canvas.background_color, clip))
+            self.prev_pos = self.stroke_points[-1]
+            self.stroke_segments += max(len(self.stroke_points) - 1, 1)  # A single point is drawn as a dot
+            self.stroke_batches += 1
+            self.stroke_points = []
 
-    def fill(self, start_pos, tar, repl):
+    def shape_points(self):
         """
-        Fills a region of the painting with the color tar.
         :param self: The calling object
         :type self: PaintApp
-        :param start_pos: The starting position from which to fill the contiguous region.
-        :type start_pos: tuple
-        :param tar: The color of the region the user wants to fill.
-        :type tar: tuple
-        :param repl: The color the user wants to fill the region with/replace the current color with.
-        :type repl: tuple
+        :returns: The canvas positions to draw the shape being drawn through with the paintbrush, in order: the ends of
+            a line, the corners of a rectangle, or points around an ellipse, which ends where it starts.
+        :rtype: list
         """
-        # Directions to search for pixels of color tar (target)
-        dx = [-1, 0, 1, -1, 1, -1, 0, 1]
-        dy = [-1, -1, -1, 0, 0, 1, 1, 1]
-        # No pixels have been visited yet; visited pixels shouldn't be revisited
-        visited = [[False for _ in range(self.WINDOW_WIDTH + 1)] for _ in range(self.WINDOW_WIDTH + 1)]
-        pygame.event.pump()
+        (x0, y0), (x1, y1) = self.shape_start, self.shape_end
+        if self.current_tool == "Line":
+            points = [(x0, y0), (x1, y1)]
+        elif self.current_tool == "Rectangle":
+            points = [(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)]
+        else:
+            # The ellipse fits in the rectangle between the two positions
+            center_x, center_y = (x0 + x1) / 2, (y0 + y1) / 2
+            radius_x, radius_y = abs(x1 - x0) / 2, abs(y1 - y0) / 2
+            count = max(8, math.ceil(math.pi * (radius_x + radius_y) / self.ELLIPSE_STEP))
+            points = [(round(center_x + radius_x * math.cos(2 * math.pi * i / count)),
+                       round(center_y + radius_y * math.sin(2 * math.pi * i / count))) for i in range(count + 1)]
+        # Drop repeated points, so that a shape with no size is drawn as a dot
+        return [point for i, point in enumerate(points) if i == 0 or point != points[i - 1]]
 
-        if 0 <= start_pos[0] < self.WINDOW_WIDTH and 0 <= start_pos[1] < self.WINDOW_WIDTH:
-            # Target color is already the color to replace so do nothing
-            if tar == repl:
-                return
-            # BFS algorithm
-            bfs_queue = collections.deque()  # Queue storing pixels to visit
-            bfs_queue.append((start_pos[0], start_pos[1]))
-            while len(bfs_queue) > 0:
-                top_point = bfs_queue.popleft()
-                pygame.draw.rect(self.win, repl, (top_point[0], top_point[1], 1, 1))  # Change color of the pixel
-                # Traverse neighboring pixels
-                for i in range(8):
-                    new_x = top_point[0] + dx[i]
-                    new_y = top_point[1] + dy[i]
-                    # Add neighboring pixel to the queue if it isn't in the queue and needs to be colored
-                    if 0 <= new_x < self.WINDOW_WIDTH and 0 <= new_y < self.WINDOW_WIDTH and self.win.get_at(
-                            (new_x, new_y)) == tar and not \
-                            visited[new_x][new_y]:
-                        bfs_queue.append((new_x, new_y))
-                        visited[new_x][new_y] = True
-
-            pygame.display.update()  # Update the screen once the region has been filled
+    def draw_preview(self):
+        """
+        Shows the shape being drawn as it is now, if it changed since it was last shown.
+        The part of the window under the last preview is restored from the backing store, and the part under the new
+        one saved to it before the shape is drawn over it, so a preview takes time in proportion to the size of the
+        shape rather than the size of the viewport or the painting.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        if self.shape_start is None:
+            return
+        width = max(1, round(self.pb.thickness * self.viewport.zoom))
+        ends = (self.viewport.to_window_pos(self.shape_start), self.viewport.to_window_pos(self.shape_end))
+        if self.preview_rect is not None and (ends, width, self.pb.color) == self.preview_key:
+            return
+        (x0, y0), (x1, y1) = ends
+        rect = pygame.Rect(min(x0, x1), min(y0, y1), abs(x1 - x0) + 1, abs(y1 - y0) + 1)
+        if self.backing is None:
+            self.backing = pygame.Surface(self.win.get_size(), 0, self.win)
+        old_rect = self.restore_preview()
+        covered = rect.inflate(width + 2, width + 2).clip(self.viewport.rect)
+        self.backing.blit(self.win, covered, covered)
+        clip = self.clip_rect()
+        self.win.set_clip(covered if clip is None else covered.clip(self.viewport.window_rect(clip)))
+        if self.current_tool == "Ellipse":
+            # The outline is centered on the ellipse the shape is drawn through; a small one is drawn filled
+            outline = rect.inflate(width, width)
+            pygame.draw.ellipse(self.win, self.pb.color, outline, width if 2 * width < min(outline.size) else 0)
+        else:
+            points = [(x0, y0), (x1, y1)] if self.current_tool == "Line" else [(x0, y0), (x1, y0), (x1, y1),
+                                                                                   (x0, y1), (x0, y0)]
+            pygame.draw.lines(self.win, self.pb.color, False, points, width)
+            if width > 2:
+                # Round the ends and corners like the strokes of the paintbrush
+                for point in points:
+                    pygame.draw.circle(self.win, self.pb.color, point, width / 2)
+        self.win.set_clip(None)
+        self.preview_rect = covered
+        self.preview_key = (ends, width, self.pb.color)
+        self.dirty.add(covered if old_rect is None else covered.union(old_rect))
 
-    def draw(self, prev_pos, cur_pos):
+    def restore_preview(self):
         """
-        Draws on the screen.
+        Restores the part of the window under the preview of the shape from the backing store.
+        :param self: The calling object
+        :type self: PaintApp
+        :returns: The rectangle of the window restored, or None if no preview was shown.
+        :rtype: pygame.Rect
+        """
+        rect = self.preview_rect
+        if rect is not None:
+            self.win.blit(self.backing, rect, rect)
+            self.preview_rect = None
+        return rect
+
+    def erase_preview(self):
+        """
+        Removes the preview of the shape from the window. It is shown again at the end of the frame if the shape is
+        still being drawn.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        self.dirty.add(self.restore_preview())
+
+    def finish_shape(self):
+        """
+        Draws the shape being drawn on the painting with the paintbrush, as a stroke through its points.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        self.erase_preview()
+        points = self.shape_points()
+        self.shape_start = None
+        self.pb.is_painting = True
+        self.prev_pos = None  # The shape is a stroke of its own
+        self.stroke_points = points
+        self.flush_stroke()
+
+    def cancel_shape(self):
+        """
+        Stops drawing the shape being drawn, leaving the painting as it was.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        self.erase_preview()
+        self.shape_start = None
+
+    def clip_rect(self):
+        """
+        :param self: The calling object
+        :type self: PaintApp
+        :returns: The rectangle of the canvas the tools change pixels within: the selection if there is one and
+            clip_to_selection is set, else None.
+        :rtype: pygame.Rect
+        """
+        return self.selection if self.clip_to_selection else None
+
+    def select(self, start, end):
+        """
+        Selects the rectangle between two canvas positions, both included, within the canvas.
+        :param self: The calling object
+        :type self: PaintApp
+        :param start: A corner of the rectangle.
+        :type start: tuple
+        :param end: The opposite corner.
+        :type end: tuple
+        """
+        rect = pygame.Rect(min(start[0], end[0]), min(start[1], end[1]), abs(end[0] - start[0]) + 1,
+                           abs(end[1] - start[1]) + 1).clip(self.canvas.get_rect())
+        self.selection = rect if rect.width and rect.height else None
+
+    def lift_selection(self):
+        """
+        Lifts the pixels of the selection off the painting so that they can be moved, leaving the background color
+        behind. They float over the painting until they are dropped.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        if self.floating is not None or self.selection is None:
+            return
+        self.history.touch(self.selection)
+        self.floating = self.canvas.to_surface(self.selection, native=True)
+        self.show(self.canvas.fill_rect(self.selection, self.canvas.background_color))
+
+    def drop_selection(self):
+        """
+        Paints the floating pixels, if any, on the painting where the selection is now, as one operation with lifting
+        them.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        if self.floating is None:
+            return
+        floating = self.floating
+        self.floating = None
+        self.history.touch(self.selection)
+        self.show(self.canvas.blit(floating, self.selection.topleft))
+        self.selection = self.selection.clip(self.canvas.get_rect())
+        if self.selection.width == 0 or self.selection.height == 0:
+            self.selection = None
+        self.history.commit()
+
+    def cancel_selection(self):
+        """
+        Throws the floating pixels away, putting the pixels they were lifted from back, or unselects if nothing is
+        floating.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        self.select_start = self.move_from = None
+        floating = self.floating
+        self.floating = None
+        self.selection = None
+        if floating is not None:
+            self.show(self.history.revert())
+
+    def copy_selection(self, cut=False):
+        """
+        Copies the pixels of the selection, floating or not, to the clipboard.
+        :param self: The calling object
+        :type self: PaintApp
+        :param cut: Whether to also remove them, leaving the background color on the painting.
+        :type cut: bool
+        """
+        if self.selection is None:
+            return
+        if self.floating is not None:
+            self.clipboard.copy_surface(self.floating)
+            if cut:
+                self.floating = None
+                self.selection = None
+                self.history.commit()  # The pixels were lifted, leaving the background color behind
+            return
+        self.clipboard.copy(self.canvas, self.selection)
+        if cut:
+            self.history.touch(self.selection)
+            self.show(self.canvas.fill_rect(self.selection, self.canvas.background_color))
+            self.history.commit()
+
+    def paste(self):
+        """
+        Floats the pixels of the clipboard over the painting, over the selection if there is one and in the top-left
+        corner of the viewport otherwise, to be moved and dropped like lifted ones.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        floating = self.clipboard.paste()
+        if floating is None or self.client is not None:
+            return
+        self.drop_selection()
+        self.set_current_tool("Select")
+        if self.selection is not None:
+            pos = self.selection.topleft
+        else:
+            pos = self.viewport.to_canvas(self.viewport.rect.topleft)
+        self.floating = floating
+        self.selection = floating.get_rect(topleft=pos)
+
+    def import_image(self, path, quantize=False, dither=False):
+        """
+        Floats an image over the middle of the viewport, scaled down to fit in the painting, to be moved and dropped
+        like pasted pixels. An image imported onto an indexed painting is always quantized to its colors.
+        :param self: The calling object
+        :type self: PaintApp
+        :param path: The path of the image, in any format pygame can read.
+        :type path: str
+        :param quantize: Whether to map the colors of the image to the colors of the panel and the background.
+        :type quantize: bool
+        :param dither: Whether to quantize with ordered dithering, so that areas of other colors become patterns of
+            the palette colors.
+        :type dither: bool
+        :raises ValueError: If the file isn't an image.
+        """
+        if self.client is not None:
+            print("a shared painting can't have a selection", file=sys.stderr)
+            return
+        import imaging
+        started = time.perf_counter()
+        quantize = quantize or dither or self.canvas.format.get_bitsize() == 8
+        floating = imaging.load_image(path, self.canvas.get_rect().size, self.background_color,
+                                      self.palette if quantize else None, dither)
+        elapsed = time.perf_counter() - started
+        self.last_import = (path, floating.get_width(), floating.get_height(), elapsed)
+        if self.profiler is not None:
+            self.profiler.record("tool Import", elapsed)
+        self.drop_selection()
+        self.set_current_tool("Select")
+        center = self.viewport.to_canvas(self.viewport.rect.center)
+        rect = floating.get_rect(center=center).clamp(self.canvas.get_rect())
+        self.floating = floating
+        self.selection = rect
+
+    def display_selection(self):
+        """
+        Shows the outline of the selection and the floating pixels where they moved or the painting under them was
+        redrawn. Only the part of the window the selection left and the part it covers now are redrawn, so moving
+        floating pixels takes time in proportion to their size rather than the size of the viewport or the painting.
         :param self: The calling object
         :type self: PaintApp
-        :param prev_pos: The position of the cursor before the method was called.
-        :type prev_pos: tuple
-        :param cur_pos: The position of the cursor when the method is called.
-        :type cur_pos: tuple
-        :return: The position of the cursor when the method is called.
-        :rtype: tuple
         """
-        return self.pb.draw(self.win, prev_pos, cur_pos, self.background_color)
+        rect = None if self.selection is None else self.viewport.window_rect(self.selection)
+        shown = self.selection_shown
+        if shown is not None and shown[0] == rect and shown[1] is self.floating:
+            if rect.clip(self.viewport.rect).collidelist(self.dirty.rects) == -1:
+                return
+        if shown is not None:
+            shown_rect, shown_floating = shown
+            if shown_floating is None:
+                vacated = border_rects(shown_rect, len(self.SELECTION_COLORS))
+            else:
+                vacated = rect_difference(shown_rect, rect if self.floating is not None else None)
+            for area in vacated:
+                if area.colliderect(self.viewport.rect):
+                    self.dirty.add(self.viewport.draw(self.win, area))
+        self.selection_shown = None if rect is None else (rect, self.floating)
+        if rect is None:
+            return
+        visible = rect.clip(self.viewport.rect)
+        if self.floating is not None:
+            if self.floating.get_flags() & pygame.SRCALPHA:
+                self.viewport.draw(self.win, visible)  # Pixels with an alpha are blended over the painting
+            self.viewport.draw_surface(self.win, self.floating, self.selection.topleft, visible)
+            self.dirty.add(visible)
+        self.win.set_clip(self.viewport.rect)
+        for inset, color in enumerate(self.SELECTION_COLORS):
+            pygame.draw.rect(self.win, color, rect.inflate(-2 * inset, -2 * inset), 1)
+        self.win.set_clip(None)
+        for area in border_rects(rect, len(self.SELECTION_COLORS)):
+            self.dirty.add(area.clip(self.viewport.rect))
 
-    def replace(self, targetColor: tuple, replaceWith: tuple):
+    def replace(self, targetColor: tuple, replaceWith: tuple, tolerance=None, clip=None):
         """
         Changes all pixels of one color to another color.
         :param self: The calling object
@@ -215,82 +716,499 @@ class PaintApp:
         :type targetColor: tuple
         :param replaceWith: The color to replace targetColor with.
         :type replaceWith: tuple
+        :param tolerance: The largest RGB distance from targetColor that is still replaced, 0 to only replace
+            targetColor exactly. Defaults to replace_tolerance.
+        :type tolerance: float
+        :param clip: The rectangle of the canvas to limit the replacement to, or None for the whole painting.
+        :type clip: pygame.Rect
+        :returns: The number of pixels replaced.
+        :rtype: int
+        """
+        if tolerance is None:
+            tolerance = self.replace_tolerance
+        count, changed = self.canvas.replace(targetColor, replaceWith, tolerance, clip, self.history.touch)
+        self.show(changed)
+        return count
+
+    def clear(self):
+        """
+        Resets the painting.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        if self.client is not None:
+            import shared
+            self.client.send(shared.CLEAR)
+            return
+        clip = self.clip_rect()
+        if clip is not None:
+            self.history.touch(clip)
+            self.show(self.canvas.fill_rect(clip, self.canvas.background_color))
+            return
+        self.history.touch_tiles(self.canvas.used_tiles())
+        self.canvas.clear()
+        self.show(self.canvas.get_rect())
+
+    def save(self):
+        """
+        Saves the painting, with its visible layers composited, to save_path.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        import storage
+
+        self.drop_selection()
+        started = time.perf_counter()
+        try:
+            storage.save(self.layers.shown, self.save_path)
+        except (OSError, pygame.error) as error:
+            print("could not save %s: %s" % (self.save_path, error), file=sys.stderr)
+            return
+        print("saved %s in %.1f ms" % (self.save_path, 1000 * (time.perf_counter() - started)))
+
+    def autosave(self):
+        """
+        Takes an autosave checkpoint, unless a fill or replace is in progress or pixels are floating, whose tiles are
+        saved once they are done or dropped.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        if self.job is not None or self.floating is not None:
+            return
+        started = time.perf_counter()
+        self.autosaver.checkpoint()
+        if self.profiler is not None:
+            self.profiler.record("autosave", time.perf_counter() - started)
+
+    def apply_shared(self):
+        """
+        Applies the operations on the shared painting received since the last call, and goes on painting locally if
+        the connection to the server was lost.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        for changed in self.client.apply_received():
+            self.show(changed)
+        if self.client.closed:
+            print("lost the connection to the server; the painting is no longer shared", file=sys.stderr)
+            self.client.close()
+            self.client = None
+
+    def undo(self):
+        """
+        Reverts the most recent operation on the painting, or cancels the fill or replace in progress or the floating
+        pixels.
+        A shared painting has no history, as other users' operations are painted over the user's own.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        if self.job is not None:
+            self.cancel_job()
+            return
+        if self.floating is not None:
+            self.cancel_selection()
+            return
+        if self.client is None:
+            self.show(self.history.undo())
+
+    def redo(self):
+        """
+        Reapplies the most recently undone operation on the painting.
+        :param self: The calling object
+        :type self: PaintApp
+        """
+        self.cancel_job()
+        self.drop_selection()
+        if self.client is None:
+            self.show(self.history.redo())
+
+    def start_job(self, steps):
+        """
+        Starts a fill or replace that runs for a slice of each frame until it is done, so that the app keeps
+        responding to input during a large one.
+        :param self: The calling object
+        :type self: PaintApp
+        :param steps: Generator of the rectangle of the canvas changed by each step, or None for no change.
+        :type steps: generator
+        """
+        self.cancel_job()
+        self.job = steps
+        self.job_tool = self.current_tool
+        self.job_time = 0.0
+
+    def count_replaced(self, steps):
+        """
+        Adds up the pixels a replace recolors, once it is done, so that a cancelled replace isn't counted.
+        :param self: The calling object
+        :type self: PaintApp
+        :param steps: Generator of the number of pixels replaced by each step of the replace and the rectangle of the
+            canvas it changed.
+        :type steps: generator
+        :returns: Generator of the rectangle of the canvas changed by each step, or None for no change.
+        :rtype: generator
+        """
+        replaced = 0
+        for count, changed in steps:
+            replaced += count
+            yield changed
+        self.replaces += 1
+        self.replaced_pixels += replaced
+
+    def run_job(self, steps=None):
+        """
+        Runs the fill or replace in progress for up to JOB_TIME_SLICE, showing what it changed so far.
+        :param self: The calling object
+        :type self: PaintApp
+        :param steps: The number of times to resume the job instead, finishing it included, or None.
+        :type steps: int
+        :returns: The number of times the job was resumed.
+        :rtype: int
+        """
+        started = time.perf_counter()
+        deadline = started + self.JOB_TIME_SLICE
+        calls = 0
+        while True:
+            calls += 1
+            try:
+                changed = next(self.job)
+            except StopIteration:
+                break
+            self.show(changed)
+            if (time.perf_counter() >= deadline) if steps is None else (calls >= steps):
+                self.job_time += time.perf_counter() - started
+                return calls
+        self.job_time += time.perf_counter() - started
+        self.job = None
+        self.history.commit()
+        if self.profiler is not None:
+            self.profiler.record("tool " + self.job_tool, self.job_time)
+        return calls
+
+    def cancel_job(self):
+        """
+        Stops the fill or replace in progress, if any, restoring the parts of the painting it already changed.
+        :param self: The calling object
+        :type self: PaintApp
         """
-        # Loop through all pixels
-        for i in range(1, self.WINDOW_WIDTH):
-            for j in range(1, self.WINDOW_WIDTH):
-                # Replace pixel of targetColor
-                if self.win.get_at((i, j)) == targetColor:
-                    pygame.draw.rect(self.win, replaceWith, (i, j, 1, 1))
-        pygame.display.update()
+        if self.job is not None:
+            self.job.close()
+            self.job = None
+            self.show(self.history.revert())
 
-    def run(self):
+    def press(self, pos):
+        """
+        Handles a click, either on the panel to select the brush or tool or on the painting to use the current tool.
+        :param self: The calling object
+        :type self: PaintApp
+        :param pos: The position of the cursor.
+        :type pos: tuple
+        """
+        started = time.perf_counter()
+        if not self.viewport.rect.collidepoint(pos):
+            self.pb.set_thickness(self.det_brush_th(pos, self.pb.thickness))
+            self.pb.set_color(self.det_brush_color(pos, self.pb.color))
+            tool = self.get_current_tool(pos, self.current_tool)
+            if tool != self.current_tool:
+                self.drop_selection()
+            if tool == "Clear" and self.current_tool != "Clear":
+                self.clear()
+                self.history.commit()
+            self.set_current_tool(tool)
+        elif self.current_tool == "Select":
+            pos = self.viewport.to_canvas(pos)
+            if self.client is not None:
+                print("a shared painting can't have a selection", file=sys.stderr)
+            elif self.selection is not None and self.selection.collidepoint(pos):
+                self.lift_selection()
+                self.move_from = pos
+            else:
+                # A click without dragging out a rectangle unselects
+                self.drop_selection()
+                self.select_start = pos
+                self.selection = None
+        elif self.current_tool == "Draw" or self.current_tool == "Erase":
+            self.prev_pos = None  # Start a new stroke
+            self.drag(pos)
+        elif self.current_tool == "Fill":
+            pos = self.viewport.to_canvas(pos)
+            if self.client is not None:
+                import shared
+                self.client.send(shared.fill_op(pos, self.pb.color, self.fill_connectivity))
+            elif self.canvas.get_rect().collidepoint(pos):
+                target_color = self.canvas.get_at(pos)
+                self.start_job(self.canvas.fill_steps(pos, target_color, self.pb.color, self.fill_connectivity,
+                                                      self.history.touch, self.clip_rect()))
+        elif self.current_tool == "Replace":
+            pos = self.viewport.to_canvas(pos)
+            if self.client is not None:
+                import shared
+                self.client.send(shared.replace_op(pos, self.pb.color, self.replace_tolerance))
+            elif self.canvas.get_rect().collidepoint(pos):
+                color_to_replace = self.canvas.get_at(pos)
+                self.start_job(self.count_replaced(self.canvas.replace_steps(
+                    color_to_replace, self.pb.color, self.replace_tolerance, self.clip_rect(), self.history.touch)))
+        elif self.current_tool in self.SHAPE_TOOLS:
+            self.shape_start = self.shape_end = self.viewport.to_canvas(pos)
+        else:
+            self.clear()
+            self.history.commit()
+        # Strokes are timed by the frames that draw them, and fills and replaces once they are done
+        if self.profiler is not None and self.current_tool == "Clear":
+            self.profiler.record("tool " + self.current_tool, time.perf_counter() - started)
+
+    def drag(self, pos):
+        """
+        Handles the cursor moving with the mouse pressed, continuing the stroke if drawing or erasing, moving the end
+        of the shape being drawn, or dragging out or moving the selection.
+        The stroke is only drawn by flush_stroke, and the shape previewed by draw_preview, so that all the movement of
+        a frame is drawn at once.
+        :param self: The calling object
+        :type self: PaintApp
+        :param pos: The position of the cursor.
+        :type pos: tuple
+        """
+        if self.current_tool == "Draw" or self.current_tool == "Erase":
+            self.pb.is_painting = self.current_tool == "Draw"  # The paintbrush isn't painting when erasing
+            self.stroke_samples += 1
+            if self.viewport.rect.collidepoint(pos):
+                pos = self.viewport.to_canvas(pos)
+                # Continue from where the stroke was last drawn to, or start a new stroke with a dot
+                if not self.stroke_points:
+                    self.stroke_points.append(pos if self.prev_pos is None else self.prev_pos)
+                if pos != self.stroke_points[-1]:
+                    self.stroke_points.append(pos)
+            else:
+                # Leaving the painting ends the stroke
+                self.flush_stroke()
+                self.prev_pos = None
+        elif self.current_tool in self.SHAPE_TOOLS and self.shape_start is not None:
+            self.shape_end = self.viewport.to_canvas(pos)
+        elif self.move_from is not None:
+            pos = self.viewport.to_canvas(pos)
+            self.selection = self.selection.move(pos[0] - self.move_from[0], pos[1] - self.move_from[1])
+            self.move_from = pos
+        elif self.select_start is not None:
+            self.select(self.select_start, self.viewport.to_canvas(pos))
+
+    def handle_event(self, ev):
+        """
+        Handles one input event.
+        :param self: The calling object
+        :type self: PaintApp
+        :param ev: The event to handle.
+        :type ev: pygame.event.Event
+        :returns: Whether the user wants to paint.
+        :rtype: bool
+        """
+        if ev.type == pygame.MOUSEMOTION:
+            if ev.buttons[0]:
+                self.drag(ev.pos)
+            elif ev.buttons[2]:
+                # Dragging with the right mouse button pans the painting
+                self.viewport.scroll(-ev.rel[0] / self.viewport.zoom, -ev.rel[1] / self.viewport.zoom)
+                self.show_all()
+            return True
+        self.flush_stroke()  # Draw the movement before anything that happened after it
+        if ev.type == pygame.QUIT:
+            return False
+        if ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1:
+            self.cancel_job()  # A new click stops the fill or replace in progress
+            self.press(ev.pos)
+        elif ev.type == pygame.MOUSEBUTTONUP and ev.button == 1:
+            if self.shape_start is not None:
+                self.finish_shape()
+            self.select_start = self.move_from = None
+            if self.client is not None and self.prev_pos is not None:
+                import shared
+                self.client.send(shared.END)
+            self.prev_pos = None  # The stroke has ended
+            if self.job is None and self.floating is None:
+                self.history.commit()
+        elif ev.type == pygame.KEYDOWN and ev.key == pygame.K_ESCAPE:
+            self.cancel_job()
+            self.cancel_shape()
+            self.cancel_selection()
+        elif ev.type == pygame.KEYDOWN and ev.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
+            self.drop_selection()
+        elif ev.type == pygame.KEYDOWN and ev.mod & pygame.KMOD_CTRL:
+            if ev.key == pygame.K_y or (ev.key == pygame.K_z and ev.mod & pygame.KMOD_SHIFT):
+                self.redo()
+            elif ev.key == pygame.K_z:
+                self.undo()
+            elif ev.key == pygame.K_s:
+                self.save()
+            elif ev.key in (pygame.K_c, pygame.K_x):
+                self.copy_selection(cut=ev.key == pygame.K_x)
+            elif ev.key == pygame.K_v:
+                self.paste()
+            elif ev.key == pygame.K_a and self.client is None:
+                self.drop_selection()
+                self.set_current_tool("Select")
+                self.selection = self.canvas.get_rect()
+            elif ev.key in (pygame.K_l, pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                self.edit_layers(ev.key, ev.mod)
+        elif ev.type == pygame.KEYDOWN and ev.key in (pygame.K_h, pygame.K_PAGEUP, pygame.K_PAGEDOWN,
+                                                       pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET):
+            self.edit_layers(ev.key, ev.mod)
+        elif ev.type == pygame.KEYDOWN and ev.key == pygame.K_m:
+            self.clip_to_selection = not self.clip_to_selection
+            print("the tools change %s" % ("only the selection, while there is one" if self.clip_to_selection
+                                           else "the whole painting"))
+        elif ev.type == self.AUTOSAVE_EVENT and self.autosaver is not None:
+            self.autosave()
+        elif ev.type == self.SHARED_EVENT and self.client is not None:
+            self.apply_shared()
+        elif ev.type == pygame.KEYDOWN and ev.key == pygame.K_F3 and self.profiler is not None:
+            self.profiler.visible = not self.profiler.visible
+        elif ev.type == pygame.KEYDOWN and ev.key in (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN):
+            step = self.SCROLL_STEP / self.viewport.zoom
+            self.viewport.scroll(step * ((ev.key == pygame.K_RIGHT) - (ev.key == pygame.K_LEFT)),
+                                 step * ((ev.key == pygame.K_DOWN) - (ev.key == pygame.K_UP)))
+            self.show_all()
+        elif ev.type == pygame.MOUSEWHEEL:
+            # The wheel zooms in and out around the cursor, whose position a replayed event carries
+            pos = ev.pos if "pos" in ev.dict else pygame.mouse.get_pos()
+            if self.viewport.rect.collidepoint(pos):
+                self.viewport.zoom_at(pos, 1 if ev.y > 0 else -1)
+                self.show_all()
+        elif ev.type == pygame.WINDOWEXPOSED:
+            self.dirty.add(self.win.get_rect())  # The window has to be shown again
+        return True
+
+    def handle_frame(self, events, job_steps=None):
+        """
+        Handles the events of one frame and pushes everything they changed to the screen at once.
+        :param self: The calling object
+        :type self: PaintApp
+        :param events: The events queued since the last frame.
+        :type events: list
+        :param job_steps: The number of times to resume the fill or replace in progress, e.g. as many as in a
+            recording, or None to run it for JOB_TIME_SLICE.
+        :type job_steps: int
+        :returns: Whether the user wants to paint.
+        :rtype: bool
+        """
+        started = time.perf_counter()
+        profiler = self.profiler
+        wants_to_paint = True
+        for ev in events:
+            wants_to_paint = self.handle_event(ev) and wants_to_paint
+        self.job_calls = 0
+        if self.job is not None and job_steps != 0:
+            self.job_calls = self.run_job(job_steps)
+        if profiler is not None:
+            handled = time.perf_counter()
+        self.flush_stroke()
+        self.draw_preview()
+        self.display_selection()
+        if profiler is not None:
+            stroked = time.perf_counter()
+        # Show the current state of the app - paintbrush color and thickness and the current tool.
+        self.panel.set_to_indicate_as_current_color(self.pb.color)
+        self.panel.set_to_indicate_as_current_brush_thickness(self.pb.thickness)
+        self.panel.set_to_indicate_as_current_tool(self.current_tool)
+        self.display_panel()
+        if profiler is not None:
+            self.display_overlay()
+            displayed = time.perf_counter()
+        flushed = self.dirty.flush()
+        finished = time.perf_counter()
+        if flushed:
+            self.input_latencies.append(finished - started)
+        if profiler is not None:
+            profiler.record("input", handled - started)
+            profiler.record("stroke", stroked - handled)
+            profiler.record("panel", displayed - stroked)
+            profiler.record("flush", finished - displayed)
+            profiler.record("frame", finished - started)
+            if flushed:
+                profiler.record("latency", finished - started)
+        return wants_to_paint
+
+    def report_stats(self, wall_time, cpu_time, wait_time):
+        """
+        Prints how busy the app kept the CPU, how long input took to reach the screen, and what the tools did.
+        :param self: The calling object
+        :type self: PaintApp
+        :param wall_time: Seconds the app ran for.
+        :type wall_time: float
+        :param cpu_time: CPU seconds the app used while running.
+        :type cpu_time: float
+        :param wait_time: Seconds the app spent blocked waiting for input.
+        :type wait_time: float
+        """
+        print("cpu: %.1f%% of a core over %.1f s, %.1f%% of the time idle waiting for input"
+              % (100 * cpu_time / wall_time, wall_time, 100 * wait_time / wall_time))
+        if self.input_latencies:
+            latencies = sorted(self.input_latencies)
+            print("input-to-pixel latency: median %.2f ms, p95 %.2f ms, max %.2f ms over %d frames"
+                  % (1000 * latencies[len(latencies) // 2], 1000 * latencies[int(len(latencies) * 0.95)],
+                     1000 * latencies[-1], len(latencies)))
+        if self.dirty.frames_flushed:
+            pushed = self.dirty.total_pixels_pushed / self.dirty.frames_flushed
+            print("display: %.0f pixels pushed per updated frame on average, %.1f%% of the window, over %d frames"
+                  % (pushed, 100 * pushed / (self.WINDOW_WIDTH * self.WINDOW_HEIGHT), self.dirty.frames_flushed))
+        if self.stroke_samples:
+            print("strokes: %d cursor samples received, %d segments drawn in %d draw calls"
+                  % (self.stroke_samples, self.stroke_segments, self.stroke_batches))
+        if self.replaces:
+            print("replace: %d pixels recolored by %d replaces" % (self.replaced_pixels, self.replaces))
+        if self.last_import is not None:
+            path, width, height, seconds = self.last_import
+            print("import: %s at %dx%d in %.1f ms" % (path, width, height, 1000 * seconds))
+
+    def run(self, show_stats=False, profile_output=None, recorder=None):
         """
         Handles the runtime for the app.
         :param self: The calling object
         :type self: PaintApp
+        :param show_stats: Whether to report CPU use, input-to-pixel latency and pixels pushed to the display on exit.
+        :type show_stats: bool
+        :param profile_output: The file to export the profiler's timings to on exit (CSV if it ends in .csv, else
+            JSON), or None.
+        :type profile_output: str
+        :param recorder: The recorder to log the input of every frame to, or None.
+        :type recorder: Recorder
         """
-        # Set initial conditions for the app to run.
-        prev_pos = pygame.mouse.get_pos()
-        pygame.event.pump()
-        cur_pos = self.get_click(prev_pos)
-        self.current_tool = self.get_current_tool(cur_pos, "Draw")
-        self.pb.set_thickness(self.det_brush_th(cur_pos, self.pb.thickness))
-        self.pb.set_color(self.det_brush_color(cur_pos, self.pb.color))
+        clock = pygame.time.Clock()
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        wait_time = 0.0
         # Game loop.
-        while self.user_wants_to_paint():
-            # Determine the current state of the app - paintbrush color and thickness and the current tool.
-            cur_pos = self.get_click(prev_pos)
-            self.pb.set_thickness(self.det_brush_th(cur_pos, self.pb.thickness))
-            self.pb.set_color(self.det_brush_color(cur_pos, self.pb.color))
-            self.pb.is_painting = True
-            self.panel.set_to_indicate_as_current_color(self.pb.color)
-            self.panel.set_to_indicate_as_current_brush_thickness(self.pb.thickness)
-            self.current_tool = self.get_current_tool(cur_pos, self.current_tool)
-            # Do something based on the current tool.
-            if self.current_tool == "Draw":
-                self.panel.set_to_indicate_as_current_tool("Draw")
-                self.display_panel()
-                prev_pos = self.draw(prev_pos, cur_pos)  # Changes the stored position of the cursor.
-            if self.current_tool == "Erase":
-                self.panel.set_to_indicate_as_current_tool("Erase")
-                self.display_panel()
-                self.pb.is_painting = False  # The paintbrush isn't painting as the eraser is being used.
-                prev_pos = self.draw(prev_pos, cur_pos)
-            if self.current_tool == "Clear":
-                self.panel.set_to_indicate_as_current_tool("Clear")
-                self.display_panel()
-                self.win.fill(self.background_color)  # Resets the painting window.
-                self.display_panel()
-                pygame.display.update()
-            if self.current_tool == "Replace":
-                self.panel.set_to_indicate_as_current_tool("Replace")
-                self.display_panel()
-                while self.user_wants_to_paint():
-                    # User is clicking to replace a color
-                    if pygame.mouse.get_pressed()[0]:
-                        cur_pos = pygame.mouse.get_pos()
-                        color_to_replace = self.win.get_at(cur_pos)[:3]  # Trim RGBA to RGB value.
-                        self.replace(color_to_replace, self.pb.color)
-                        break
-            if self.current_tool == "Fill":
-                self.panel.set_to_indicate_as_current_tool("Fill")
-                self.display_panel()
-                while self.user_wants_to_paint():
-                    # User is clicking to fill a region
-                    if pygame.mouse.get_pressed()[0]:
-                        cur_pos = pygame.mouse.get_pos()
-                        target_color = self.win.get_at(cur_pos)[:3]  # Trim RGBA to RGB value.
-                        self.fill(cur_pos, target_color, self.pb.color)
-                        break
+        wants_to_paint = True
+        while wants_to_paint:
+            # Sleep until there is input, then take every event queued since the last frame. Don't wait while a
+            # fill or replace is in progress, as every frame runs part of it.
+            events = []
+            if self.job is None:
+                wait_started = time.perf_counter()
+                events.append(pygame.event.wait())
+                wait_time += time.perf_counter() - wait_started
+            events.extend(pygame.event.get())
+            wants_to_paint = self.handle_frame(events)
+            if recorder is not None:
+                recorder.record_frame(events)
+            clock.tick(self.target_fps)  # Don't handle frames faster than target_fps
 
+        if show_stats:
+            self.report_stats(time.perf_counter() - started, time.process_time() - cpu_started, wait_time)
+        if self.profiler is not None and profile_output is not None:
+            self.profiler.export(profile_output)
+        if recorder is not None:
+            recorder.close()
+        if self.client is not None:
+            self.client.close()
+        if self.autosaver is not None:
+            self.cancel_job()
+            self.autosaver.close()
         pygame.quit()
         sys.exit(0)
 
 
 class PaintBrush:
     """Class representing a paintbrush.
-    Supports painting in many colors with many thicknesses."""
+    Supports painting in many colors with many thicknesses, as hard-edged lines or as anti-aliased strokes of round
+    stamps."""
 
     def __init__(self):
         """Initializes a paintbrush with default values for color and thickness.
@@ -299,7 +1217,11 @@ class PaintBrush:
         """
         self.color = (0, 0, 0)  # By default, the brush is black
         self.thickness = 10  # Number of pixels wide that each brushstroke is
+        self.opacity = 1.0  # Alpha of the middle of a brushstroke, from 0 to 1
+        self.antialias = False  # Whether opaque strokes are stamped with blended edges, rather than drawn as lines
         self.is_painting = True
+        self.stamps = None  # Stamps of the brush for each thickness, made when the first stroke is painted
+        self.stroke = None  # The stroke being painted, None between strokes
 
     def set_color(self, col):
         """Manipulates the color of the paintbrush.
@@ -319,44 +1241,47 @@ class PaintBrush:
         """
         self.thickness = thickness
 
-    def draw(self, win, prev_pos, cur_pos, background_color):
-        """Draws on the given window.
+    def end_stroke(self):
+        """Ends the stroke being painted, so that the next points painted start a new one.
         :param self: The calling object
         :type self: PaintBrush
-        :param win: The Pygame window to draw on.
-        :type win: pygame.Surface
-        :param prev_pos: The previous position of the cursor.
-        :type prev_pos: tuple
-        :param cur_pos: The current position of the cursor.
-        :type cur_pos: tuple
-        :param background_color: The color of the window.
+        """
+        self.stroke = None
+
+    def draw_stroke(self, canvas, points, background_color, clip=None):
+        """Continues the stroke being painted through the given points on the canvas, drawing or stamping the brush
+        along them.
+        :param self: The calling object
+        :type self: PaintBrush
+        :param canvas: The canvas to draw on.
+        :type canvas: Canvas
+        :param points: The positions on the canvas to draw through, in order. A single position draws a dot.
+        :type points: list
+        :param background_color: The color of the canvas.
         :type background_color: tuple
-        :returns: The position of the cursor if the mouse is pressed, else None.
-        :rtype: tuple
+        :param clip: The rectangle of the canvas to paint within, or None to paint anywhere on it.
+        :type clip: pygame.Rect
+        :returns: The rectangle of the canvas that changed, or None if nothing changed.
+        :rtype: pygame.Rect
         """
-        pygame.event.pump()
-        if pygame.mouse.get_pressed()[0]:
-            # Check if the cursor has moved
-            if prev_pos is None:
-                prev_pos = pygame.mouse.get_pos()
-                cur_pos = prev_pos
-            # If the cursor is on the screen, draw a line from its previous to its current position
-            # To make a continuous stroke
-            if 0 <= cur_pos[1] < win.get_width():
-                if self.is_painting:
-                    pygame.draw.line(win, self.color, (prev_pos[0], prev_pos[1]),
-                                     (cur_pos[0], cur_pos[1]), self.thickness)
-                else:
-                    pygame.draw.line(win, background_color, (prev_pos[0], prev_pos[1]),
-                                     (cur_pos[0], cur_pos[1]), self.thickness)
-                pygame.display.update()
-                return cur_pos
-        else:
-            return None
+        from brush import BrushStroke, StampCache
+
+        if self.stamps is None:
+            self.stamps = StampCache()
+        color = canvas.snap(self.color if self.is_painting else background_color)
+        stroke = self.stroke
+        if stroke is None or stroke.canvas is not canvas or (
+                stroke.color, stroke.diameter, stroke.opacity, stroke.clip, stroke.antialias) != (
+                color, self.thickness, self.opacity, clip, self.antialias):
+            stroke = self.stroke = BrushStroke(canvas, color, self.thickness, self.opacity, self.stamps, clip,
+                                               self.antialias)
+        return stroke.add(points)
 
 
 class Panel:
-    """Class that represents the selection panel for color, brush thickness and painting tools."""
+    """Class that represents the selection panel for color, brush thickness and painting tools.
+    Every button is rendered once per process in both its selected and unselected state, and only the buttons whose
+    state changed since they were last displayed are redrawn."""
     
     COLOR_STRIP_WIDTH = 112  # The width of the strip of colors to select from
     COLOR_STRIP_HEIGHT = 16  # The height of the strip of colors to select from
@@ -369,35 +1294,40 @@ class Panel:
         :type self: Panel
         """
         blue = (0, 255, 255)
-        self.font = pygame.font.Font('freesansbold.ttf', 16)
-        # Create rectangles/buttons for all the possible tools
-        self.fill = self.font.render(" F ", True, (0, 0, 0), blue)
-        self.F = self.fill.get_rect()
-        self.draw = self.font.render(" D ", True, (0, 0, 0), blue)
-        self.D = self.draw.get_rect()
-        self.er = self.font.render(" E ", True, (0, 0, 0), blue)
-        self.E = self.er.get_rect()
-        self.replace = self.font.render(" R ", True, (0, 0, 0), blue)
-        self.R = self.replace.get_rect()
-        self.clear = self.font.render(" C ", True, (0, 0, 0), blue)
-        self.C = self.clear.get_rect()
-        # Create rectangles/buttons for all the possible brush thicknesses
-        self.brush1 = self.font.render(" 1 ", True, (0, 0, 0), blue)
-        self.B1 = self.brush1.get_rect()
-        self.brush2 = self.font.render(" 2 ", True, (0, 0, 0), blue)
-        self.B2 = self.brush2.get_rect()
-        self.brush3 = self.font.render(" 3 ", True, (0, 0, 0), blue)
-        self.B3 = self.brush3.get_rect()
-        self.brush4 = self.font.render(" 4 ", True, (0, 0, 0), blue)
-        self.B4 = self.brush4.get_rect()
-        # Create rectangles/buttons for each brush color to form a strip
-        self.red = pygame.rect.RectType((64, 496, 16, 16))
-        self.blue = pygame.rect.RectType((80, 496, 16, 16))
-        self.yellow = pygame.rect.RectType((96, 496, 16, 16))
-        self.mag = pygame.rect.RectType((112, 496, 16, 16))
-        self.green = pygame.rect.RectType((128, 496, 16, 16))
-        self.turq = pygame.rect.RectType((144, 496, 16, 16))
-        self.black = pygame.rect.RectType((161, 497, 14, 14))  # The selected color (black by default) appears smaller
+        red = (255, 0, 0)
+        black = (0, 0, 0)
+        # Render the buttons for all the possible tools as (unselected, selected) and place them in a row
+        self.tool_images = {}
+        self.tool_rects = {}
+        x_coord = 224
+        for tool, label in (("Select", " S "), ("Line", " L "), ("Rectangle", " B "), ("Ellipse", " O "), ("Fill", " F "),
+                            ("Draw", " D "), ("Erase", " E "), ("Replace", " R "), ("Clear", " C ")):
+            self.tool_images[tool] = (assets.label(label, 16, black, blue), assets.label(label, 16, black, red))
+            # Place center of the rectangle displaying a possible tool
+            self.tool_rects[tool] = self.tool_images[tool][0].get_rect(center=(x_coord, 544))
+            x_coord += 24  # Spacing between rectangles displaying the tools
+        # Render the buttons for all the possible brush thicknesses in the same way
+        self.brush_images = {}
+        self.brush_rects = {}
+        x_coord = 332
+        for thickness, label in ((10, " 1 "), (20, " 2 "), (30, " 3 "), (40, " 4 ")):
+            self.brush_images[thickness] = (assets.label(label, 16, black, blue), assets.label(label, 16, black, red))
+            self.brush_rects[thickness] = self.brush_images[thickness][0].get_rect(center=(x_coord, 512))
+            x_coord += 24  # Spacing between two rectangles
+        # Create the cells of the strip of colors; a selected color appears smaller than its cell
+        self.colors = {"red": (255, 0, 0), "blue": (0, 0, 255), "yellow": (255, 255, 0), "green": (0, 255, 0),
+                       "turq": (0, 255, 255), "magenta": (255, 0, 255), "black": (0, 0, 0)}
+        self.color_cells = {}
+        x_coord = self.COLOR_STRIP_X
+        for name in ("red", "blue", "yellow", "magenta", "green", "turq", "black"):
+            self.color_cells[name] = pygame.rect.RectType((x_coord, self.COLOR_STRIP_Y, self.COLOR_STRIP_HEIGHT,
+                                                           self.COLOR_STRIP_HEIGHT))
+            x_coord += self.COLOR_STRIP_HEIGHT
+        # The selected tool, brush thickness and color (black by default)
+        self.tool = None
+        self.thickness = None
+        self.color = (0, 0, 0)
+        self.shown = {}  # Whether each button was selected when it was last displayed
 
     def get_tool_buttons(self):
         """
@@ -406,8 +1336,8 @@ class Panel:
         :returns: The tool buttons with text and a rectangle on which the text is placed.
         :rtype: dict
         """
-        return {"Fill": [self.fill, self.F], "Draw": [self.draw, self.D], "Erase": [self.er, self.E],
-                "Replace": [self.replace, self.R], "Clear": [self.clear, self.C]}
+        return {tool: [self.tool_images[tool][tool == self.tool], self.tool_rects[tool]]
+                for tool in self.tool_images}
 
     def get_brush_buttons(self):
         """
@@ -416,8 +1346,8 @@ class Panel:
         :returns: The brush buttons with text and a rectangle on which the text is placed.
         :rtype: dict
         """
-        return {10: [self.brush1, self.B1], 20: [self.brush2, self.B2], 30: [self.brush3, self.B3],
-                40: [self.brush4, self.B4]}
+        return {thickness: [self.brush_images[thickness][thickness == self.thickness], self.brush_rects[thickness]]
+                for thickness in self.brush_images}
 
     def get_color_buttons(self):
         """
@@ -426,10 +1356,8 @@ class Panel:
         :returns: The color buttons with text and a rectangle on which the text is placed.
         :rtype: dict
         """
-        return {"red": [(255, 0, 0), self.red], "blue": [(0, 0, 255), self.blue],
-                "yellow": [(255, 255, 0), self.yellow],
-                "green": [(0, 255, 0), self.green], "turq": [(0, 255, 255), self.turq],
-                "magenta": [(255, 0, 255), self.mag], "black": [(0, 0, 0), self.black]}
+        return {name: [color, self.color_cells[name].inflate(-2, -2) if color == self.color else self.color_cells[name]]
+                for name, color in self.colors.items()}
 
     def set_to_indicate_as_current_tool(self, tool):
         """
@@ -439,37 +1367,7 @@ class Panel:
         :param tool: The current tool to be used
         :type tool: str
         """
-        blue = (0, 255, 255)
-        # Reset each button to its unselected state
-        self.font = pygame.font.Font('freesansbold.ttf', 16)
-        self.fill = self.font.render(" F ", True, (0, 0, 0), blue)
-        self.F = self.fill.get_rect()
-        self.draw = self.font.render(" D ", True, (0, 0, 0), blue)
-        self.D = self.draw.get_rect()
-        self.er = self.font.render(" E ", True, (0, 0, 0), blue)
-        self.E = self.er.get_rect()
-        self.replace = self.font.render(" R ", True, (0, 0, 0), blue)
-        self.R = self.replace.get_rect()
-        self.clear = self.font.render(" C ", True, (0, 0, 0), blue)
-        self.C = self.clear.get_rect()
-
-        red = (255, 0, 0)
-        # Make the selected button red to indicate the current tool
-        if tool == "Fill":
-            self.fill = self.font.render(" F ", True, (0, 0, 0), red)
-            self.F = self.fill.get_rect()
-        elif tool == "Draw":
-            self.draw = self.font.render(" D ", True, (0, 0, 0), red)
-            self.D = self.draw.get_rect()
-        elif tool == "Erase":
-            self.er = self.font.render(" E ", True, (0, 0, 0), red)
-            self.E = self.er.get_rect()
-        elif tool == "Replace":
-            self.replace = self.font.render(" R ", True, (0, 0, 0), red)
-            self.R = self.replace.get_rect()
-        else:
-            self.clear = self.font.render(" C ", True, (0, 0, 0), red)
-            self.C = self.clear.get_rect()
+        self.tool = tool
 
     def set_to_indicate_as_current_brush_thickness(self, thickness):
         """
@@ -479,31 +1377,7 @@ class Panel:
         :param thickness: The current brush thickness to be used
         :type thickness: int
         """
-        blue = (0, 255, 255)
-        # Reset each button to its unselected state
-        self.brush1 = self.font.render(" 1 ", True, (0, 0, 0), blue)
-        self.B1 = self.brush1.get_rect()
-        self.brush2 = self.font.render(" 2 ", True, (0, 0, 0), blue)
-        self.B2 = self.brush2.get_rect()
-        self.brush3 = self.font.render(" 3 ", True, (0, 0, 0), blue)
-        self.B3 = self.brush3.get_rect()
-        self.brush4 = self.font.render(" 4 ", True, (0, 0, 0), blue)
-        self.B4 = self.brush4.get_rect()
-
-        red = (255, 0, 0)
-        # Make the selected button red to indicate the current brush thickness
-        if thickness == 10:
-            self.brush1 = self.font.render(" 1 ", True, (0, 0, 0), red)
-            self.B1 = self.brush1.get_rect()
-        elif thickness == 20:
-            self.brush2 = self.font.render(" 2 ", True, (0, 0, 0), red)
-            self.B2 = self.brush2.get_rect()
-        elif thickness == 30:
-            self.brush3 = self.font.render(" 3 ", True, (0, 0, 0), red)
-            self.B3 = self.brush3.get_rect()
-        else:
-            self.brush4 = self.font.render(" 4 ", True, (0, 0, 0), red)
-            self.B4 = self.brush4.get_rect()
+        self.thickness = thickness
 
     def set_to_indicate_as_current_color(self, color):
         """
@@ -513,68 +1387,136 @@ class Panel:
         :param color: The current color to be used
         :type color: tuple
         """
-        # Reset all colors to default size
-        self.red = pygame.rect.RectType((64, 496, 16, 16))
-        self.blue = pygame.rect.RectType((80, 496, 16, 16))
-        self.yellow = pygame.rect.RectType((96, 496, 16, 16))
-        self.mag = pygame.rect.RectType((112, 496, 16, 16))
-        self.green = pygame.rect.RectType((128, 496, 16, 16))
-        self.turq = pygame.rect.RectType((144, 496, 16, 16))
-        self.black = pygame.rect.RectType((160, 496, 16, 16))
-        # Show current color with a smaller rectangle
-        if color == (255, 0, 0):
-            self.red = pygame.rect.RectType((65, 497, 14, 14))
-        elif color == (0, 0, 255):
-            self.blue = pygame.rect.RectType((81, 497, 14, 14))
-        elif color == (255, 255, 0):
-            self.yellow = pygame.rect.RectType((97, 497, 14, 14))
-        elif color == (255, 0, 255):
-            self.mag = pygame.rect.RectType((113, 497, 14, 14))
-        elif color == (0, 255, 0):
-            self.green = pygame.rect.RectType((129, 497, 14, 14))
-        elif color == (0, 255, 255):
-            self.turq = pygame.rect.RectType((145, 497, 14, 14))
-        else:
-            self.black = pygame.rect.RectType((161, 497, 14, 14))
+        self.color = color
 
-    def display(self, win):
+    def display(self, win, dirty=None):
         """
-        Displays the Panel on the window win with the buttons.
+        Displays the buttons of the Panel whose state changed since they were last displayed on the window win.
         :param self: The calling object
         :type self: Panel
         :param win: The window to display the Panel on
         :type win: pygame.Surface
+        :param dirty: The region to report the changed part of the window to, or None to update the display now.
+        :type dirty: DirtyRegion
         """
-        tool_dict = self.get_tool_buttons()
-        brush_dict = self.get_brush_buttons()
-        color_dict = self.get_color_buttons()
+        changed = []  # Rectangles of the window drawn on
 
-        # Display the buttons for each tool
-        x_coord = 320
-        for x in tool_dict:
-            tool_dict[x][1].center = (x_coord, 544)  # Place center of the rectangle displaying a possible tool
-            win.blit(tool_dict[x][0], tool_dict[x][1])
-            x_coord += 24  # Spacing between rectangles displaying the tools
+        # Display the buttons for each tool and brush thickness
+        for tool, images in self.tool_images.items():
+            selected = tool == self.tool
+            if self.shown.get(("tool", tool)) != selected:
+                changed.append(win.blit(images[selected], self.tool_rects[tool]))
+                self.shown[("tool", tool)] = selected
+        for thickness, images in self.brush_images.items():
+            selected = thickness == self.thickness
+            if self.shown.get(("brush", thickness)) != selected:
+                changed.append(win.blit(images[selected], self.brush_rects[thickness]))
+                self.shown[("brush", thickness)] = selected
 
-        # Display buttons for brush thicknesses
-        x_coord = 332
-        for x in brush_dict:
-            brush_dict[x][1].center = (x_coord, 512)  # Place center of the rectangle displaying a brush thickness
-            win.blit(brush_dict[x][0], brush_dict[x][1])
-            x_coord += 24  # Spacing between two rectangles
+        # Display brush colors, each on an empty cell of the strip
+        for name, color in self.colors.items():
+            selected = color == self.color
+            if self.shown.get(("color", name)) != selected:
+                cell = self.color_cells[name]
+                changed.append(pygame.draw.rect(win, (255, 255, 255), cell))
+                pygame.draw.rect(win, color, cell.inflate(-2, -2) if selected else cell)
+                self.shown[("color", name)] = selected
 
-        # Create an empty strip to display the color buttons
-        pygame.draw.rect(win, (255, 255, 255),
-                         pygame.rect.RectType(self.COLOR_STRIP_X, self.COLOR_STRIP_Y, self.COLOR_STRIP_WIDTH,
-                                              self.COLOR_STRIP_HEIGHT))  # Empty rectangle before displaying the colors
-        # Display brush colors
-        for x in color_dict:
-            pygame.draw.rect(win, color_dict[x][0], color_dict[x][1])
-
-        pygame.display.update()
+        if dirty is None:
+            pygame.display.update(changed)
+        else:
+            for area in changed:
+                dirty.add(area)
 
 
 if __name__ == '__main__':
+    started = time.perf_counter()  # When the app started running, to measure the time to its first frame from
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Paint with a paintbrush.")
+    parser.add_argument("--fps", type=int, default=60, help="most frames per second to update the screen at")
+    parser.add_argument("--stats", action="store_true",
+                        help="report CPU use, input-to-pixel latency and pixels pushed to the display on exit")
+    parser.add_argument("--canvas-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"),
+                        help="size of the painting in pixels, which may be larger than the window")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every frame and tool operation; F3 toggles an overlay of the timings")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="export the timings to FILE on exit, as CSV if it ends in .csv and as JSON otherwise")
+    parser.add_argument("--indexed", action="store_true",
+                        help="store the painting as a byte per pixel indexing the panel's colors, using 4x less memory")
+    parser.add_argument("--fill-connectivity", type=int, choices=(4, 8), default=8,
+                        help="spread fills to pixels sharing an edge (4) or touching diagonally too (8, the default)")
+    parser.add_argument("--antialias", action="store_true",
+                        help="stamp opaque strokes with blended edges instead of drawing them as hard-edged lines")
+    parser.add_argument("--replace-tolerance", type=float, default=0, metavar="DISTANCE",
+                        help="also replace colors within this RGB distance of the clicked color (0 by default)")
+    parser.add_argument("--open", metavar="FILE", help="load the painting from a PNG image or a native file")
+    parser.add_argument("--save", metavar="FILE",
+                        help="file Ctrl+S saves to, as PNG if it ends in .png and in the native format otherwise "
+                             "(the opened file, or painting.png, by default)")
+    parser.add_argument("--autosave", metavar="DIR",
+                        help="autosave the painting to DIR every few seconds, recovering the painting left there by "
+                             "the last session unless --open is given")
+    parser.add_argument("--record", metavar="FILE",
+                        help="record every input and tool change to FILE, to replay it with replay.py")
+    parser.add_argument("--startup-time", action="store_true",
+                        help="report the time from starting to run to showing the first frame, then exit")
+    parser.add_argument("--connect", metavar="ADDRESS",
+                        help="paint on the shared painting of the server.py at HOST:PORT or at a Unix socket path")
+    parser.add_argument("--import", dest="import_path", metavar="FILE",
+                        help="float an image over the painting, scaled down to fit, to move and drop with Enter")
+    parser.add_argument("--quantize", action="store_true",
+                        help="map the colors of the imported image to the colors of the panel")
+    parser.add_argument("--dither", action="store_true",
+                        help="map the colors of the imported image to the colors of the panel with ordered dithering")
+    args = parser.parse_args()
+    if (args.quantize or args.dither) and not args.import_path:
+        parser.error("--quantize and --dither apply to the image of --import")
+    server_address = None
+    if args.connect:
+        if args.open or args.autosave or args.record or args.indexed or args.import_path:
+            parser.error("--connect paints on the server's painting, which can't be opened, autosaved, recorded, "
+                         "indexed or imported onto")
+        from shared import parse_address
+        try:
+            server_address = parse_address(args.connect)
+        except ValueError as error:
+            parser.error(str(error))
     # Run the app.
-    app = PaintApp()
-    app.run()
+    profiler = None
+    if args.profile or args.profile_output:
+        from profiler import FrameProfiler
+        profiler = FrameProfiler()
+    initializing = time.perf_counter()
+    try:
+        app = PaintApp(target_fps=args.fps, canvas_size=args.canvas_size, profiler=profiler, indexed=args.indexed,
+                       open_path=args.open, save_path=args.save, autosave_dir=args.autosave,
+                       server_address=server_address)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    app.fill_connectivity = args.fill_connectivity
+    app.replace_tolerance = args.replace_tolerance
+    app.pb.antialias = args.antialias
+    if args.import_path:
+        try:
+            app.import_image(args.import_path, args.quantize, args.dither)
+        except ValueError as error:
+            parser.error(str(error))
+        if args.record:
+            # A keyframe can't hold floating pixels, so the recording starts with the image dropped where it floats
+            app.drop_selection()
+    if args.startup_time:
+        # The first frame is shown once the app is initialized
+        shown = time.perf_counter()
+        print("time to first frame: %.1f ms (%.1f ms parsing arguments, %.1f ms starting the app)"
+              % (1000 * (shown - started), 1000 * (initializing - started), 1000 * (shown - initializing)))
+        if app.client is not None:
+            app.client.close()
+        pygame.quit()
+        sys.exit(0)
+    recorder = None
+    if args.record:
+        from recording import Recorder
+        recorder = Recorder(app, args.record)
+    app.run(show_stats=args.stats, profile_output=args.profile_output, recorder=recorder)
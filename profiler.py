@@ -0,0 +1,146 @@
+"""Opt-in timing of the phases of each frame and of each tool operation of the paint app."""
+import bisect
+import collections
+import csv
+import json
+import time
+
+import pygame
+
+import assets
+
+
+class FrameProfiler:
+    """Rolling samples of how long each phase of a frame and each tool operation took.
+    Samples are kept per metric for the most recent frames only, and summarised as percentiles and a histogram over
+    fixed buckets, which can be shown in an overlay or exported as JSON or CSV."""
+
+    # Upper edges of the histogram buckets in milliseconds; the last bucket holds every longer sample
+    BUCKET_EDGES = (0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+    OVERLAY_INTERVAL = 0.25  # Seconds between re-renders of the overlay
+    OVERLAY_BACKGROUND = (32, 32, 32)
+    OVERLAY_COLOR = (255, 255, 255)
+    BAR_COLOR = (255, 255, 0)
+
+    def __init__(self, window=1000):
+        """Initializes a profiler without samples, with its overlay hidden.
+        :param self: The calling object/object being initialized
+        :type self: FrameProfiler
+        :param window: The number of most recent samples of each metric to keep.
+        :type window: int
+        """
+        self.window = window
+        self.samples = {}  # Durations in seconds by metric name, the oldest first
+        self.visible = False  # Whether the overlay is shown
+        self.font = None  # Font of the overlay, loaded when it is first shown
+        self.image = None  # The overlay as last rendered
+        self.rendered_at = 0.0  # perf_counter() when the overlay was last rendered
+
+    def record(self, name, seconds):
+        """
+        Adds a sample of a metric.
+        :param self: The calling object
+        :type self: FrameProfiler
+        :param name: The name of the metric, e.g. the phase of the frame or the tool.
+        :type name: str
+        :param seconds: How long it took.
+        :type seconds: float
+        """
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = collections.deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def histogram(self, name):
+        """
+        :param self: The calling object
+        :type self: FrameProfiler
+        :param name: The name of a metric.
+        :type name: str
+        :returns: The number of samples of the metric in each bucket of BUCKET_EDGES, and one more for the longer
+            samples.
+        :rtype: list
+        """
+        counts = [0] * (len(self.BUCKET_EDGES) + 1)
+        for seconds in self.samples[name]:
+            counts[bisect.bisect_left(self.BUCKET_EDGES, 1000 * seconds)] += 1
+        return counts
+
+    def summary(self, name):
+        """
+        :param self: The calling object
+        :type self: FrameProfiler
+        :param name: The name of a metric.
+        :type name: str
+        :returns: The number of samples of the metric, their mean, median, 95th and 99th percentile and longest
+            duration in milliseconds, and their histogram.
+        :rtype: dict
+        """
+        samples = sorted(self.samples[name])
+        count = len(samples)
+        return {"count": count, "mean_ms": 1000 * sum(samples) / count, "p50_ms": 1000 * samples[count // 2],
+                "p95_ms": 1000 * samples[int(count * 0.95)], "p99_ms": 1000 * samples[int(count * 0.99)],
+                "max_ms": 1000 * samples[-1], "histogram": self.histogram(name)}
+
+    def export(self, path):
+        """
+        Writes the summary of every metric to a file, as CSV if its name ends in .csv and as JSON otherwise.
+        :param self: The calling object
+        :type self: FrameProfiler
+        :param path: The path of the file.
+        :type path: str
+        """
+        summaries = {name: self.summary(name) for name in sorted(self.samples)}
+        with open(path, "w", newline="") as output:
+            if not path.lower().endswith(".csv"):
+                json.dump({"bucket_edges_ms": list(self.BUCKET_EDGES), "metrics": summaries}, output, indent=2)
+                return
+            writer = csv.writer(output)
+            buckets = ["le_%g_ms" % edge for edge in self.BUCKET_EDGES] + ["gt_%g_ms" % self.BUCKET_EDGES[-1]]
+            writer.writerow(["metric", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"] + buckets)
+            for name, summary in summaries.items():
+                writer.writerow([name] + ["%.4f" % summary[key] if key != "count" else summary[key]
+                                          for key in ("count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")]
+                                + summary["histogram"])
+
+    def overlay(self):
+        """
+        Renders the median, 95th percentile and histogram of every metric, unless they were rendered less than
+        OVERLAY_INTERVAL ago.
+        :param self: The calling object
+        :type self: FrameProfiler
+        :returns: The overlay, and whether it was rendered again since the last call.
+        :rtype: tuple
+        """
+        now = time.perf_counter()
+        if self.image is not None and now - self.rendered_at < self.OVERLAY_INTERVAL:
+            return self.image, False
+        if self.font is None:
+            self.font = assets.font(11)
+        line_height = self.font.get_linesize()
+        bar_width = 3
+        rows = []
+        for name in sorted(self.samples):
+            summary = self.summary(name)
+            rows.append((self.font.render(name, True, self.OVERLAY_COLOR),
+                         self.font.render("p50 %.2f  p95 %.2f  max %.2f ms" % (
+                             summary["p50_ms"], summary["p95_ms"], summary["max_ms"]), True, self.OVERLAY_COLOR),
+                         summary["histogram"], summary["count"]))
+        # The names, timings and histograms are in three columns
+        name_width = max([name.get_width() for name, _, _, _ in rows] + [0]) + 8
+        text_width = name_width + max([text.get_width() for _, text, _, _ in rows] + [0])
+        buckets = len(self.BUCKET_EDGES) + 1
+        self.image = pygame.Surface((text_width + 8 + buckets * bar_width + 4, max(len(rows), 1) * line_height + 4))
+        self.image.fill(self.OVERLAY_BACKGROUND)
+        for i, (name, text, histogram, count) in enumerate(rows):
+            top = 2 + i * line_height
+            self.image.blit(name, (2, top))
+            self.image.blit(text, (2 + name_width, top))
+            # A bar per bucket, as tall as the share of the samples in it
+            for bucket, bucket_count in enumerate(histogram):
+                height = round((line_height - 2) * bucket_count / count)
+                if height:
+                    self.image.fill(self.BAR_COLOR, (text_width + 6 + bucket * bar_width,
+                                                     top + line_height - 1 - height, bar_width - 1, height))
+        self.rendered_at = now
+        return self.image, True
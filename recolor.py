@@ -0,0 +1,66 @@
+"""Vectorized color replacement used by the Replace tool of the paint app."""
+import numpy as np
+import pygame
+
+
+def replace_color(surface, target, replacement, tolerance=0, area=None, before_change=None):
+    """
+    Replaces every pixel of the surface that matches the target color in one pass over its pixel buffer.
+    :param surface: The surface to recolor.
+    :type surface: pygame.Surface
+    :param target: The RGB color to replace, or RGBA on a surface with an alpha per pixel.
+    :type target: tuple
+    :param replacement: The RGB color to replace target with.
+    :type replacement: tuple
+    :param tolerance: The largest Euclidean distance in RGB space from target that still matches, 0 to only match
+        target exactly.
+    :type tolerance: float
+    :param area: The rectangle of the surface to recolor, or None for the whole surface.
+    :type area: pygame.Rect
+    :param before_change: Function called with the bounding rectangle of the matching pixels before they are
+        replaced, or None.
+    :type before_change: function
+    :returns: The number of pixels replaced and the bounding rectangle of the replaced pixels, or None if no
+        pixel was replaced.
+    :rtype: tuple
+    """
+    area = surface.get_rect() if area is None else surface.get_rect().clip(area)
+    if area.width == 0 or area.height == 0:
+        return 0, None
+    columns = slice(area.left, area.right)
+    rows = slice(area.top, area.bottom)
+    pixels = pygame.surfarray.pixels2d(surface)[columns, rows]  # Locks the surface until deleted
+    if surface.get_bitsize() == 8:
+        # Find the matching palette entries, then look up the entry of every pixel, which is a byte
+        offset = np.array(surface.get_palette(), dtype=np.int32)[:, :3] - np.asarray(target[:3], dtype=np.int32)
+        entries = np.einsum("...i,...i", offset, offset) <= max(tolerance, 0) ** 2
+        if np.count_nonzero(entries) == 1:
+            matches = pixels == np.flatnonzero(entries)[0]
+        else:
+            matches = entries[pixels]
+    elif tolerance <= 0:
+        # Pixels are unsigned, while the value of an opaque color with an alpha in the top byte comes back negative
+        matches = pixels == surface.map_rgb(target) & 0xFFFFFFFF
+    else:
+        rgb = pygame.surfarray.pixels3d(surface)[columns, rows]
+        offset = rgb.astype(np.int32) - np.asarray(target[:3], dtype=np.int32)
+        matches = np.einsum("...i,...i", offset, offset) <= tolerance * tolerance
+        del rgb
+        if surface.get_flags() & pygame.SRCALPHA:
+            # Only pixels as opaque as the target match, so that transparent pixels aren't taken for black ones
+            alpha = pygame.surfarray.pixels_alpha(surface)[columns, rows]
+            matches &= alpha == (target[3] if len(target) > 3 else 255)
+            del alpha
+    count = int(np.count_nonzero(matches))
+    if count == 0:
+        return 0, None
+    changed_columns = np.flatnonzero(matches.any(axis=1))
+    changed_rows = np.flatnonzero(matches.any(axis=0))
+    changed = pygame.Rect(area.left + int(changed_columns[0]), area.top + int(changed_rows[0]),
+                          int(changed_columns[-1] - changed_columns[0]) + 1,
+                          int(changed_rows[-1] - changed_rows[0]) + 1)
+    if before_change is not None:
+        before_change(changed)
+    pixels[matches] = surface.map_rgb(replacement) & 0xFFFFFFFF
+    del pixels
+    return count, changed
@@ -0,0 +1,460 @@
+"""Recording of what the user did in the paint app, and deterministic replay of recordings.
+
+A recording is a compact binary log of every frame of PaintApp.run: the time of the frame, its input events, and how
+many steps of the fill or replace in progress it ran, so that a replay runs jobs exactly as far as they got. The tool,
+color and thickness are logged whenever they change, and a replay checks that it reaches the same ones.
+Every KEYFRAME_INTERVAL seconds the recording also holds a keyframe: the painting, its undo history, the view and the
+paintbrush, from which a replay can seek to any later frame without running the frames before it.
+"""
+import collections
+import io
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import pygame
+
+import storage
+from canvas import Viewport
+
+MAGIC = b"PREC"
+VERSION = 2
+HEADER = struct.Struct("<4sBBfB")  # Magic, version, fill connectivity, replace tolerance and brush anti-aliasing
+KEYFRAME_INTERVAL = 5.0  # Fewest seconds of recording between two keyframes
+TOOLS = ("Draw", "Erase", "Fill", "Replace", "Clear", "Line", "Rectangle", "Ellipse", "Select")
+
+# Records, each starting with its tag
+FRAME = struct.Struct("<cIIH")  # Milliseconds since the start, times the job was resumed, number of events
+STATE = struct.Struct("<cB3BB")  # Tool, color and thickness
+KEYFRAME = struct.Struct("<cIII")  # Index of the next frame, milliseconds since the start, length of the data
+# Events of a frame, each starting with a byte for its type
+EVENTS = {pygame.MOUSEMOTION: (1, struct.Struct("<hhhhB")),  # Position, relative motion and buttons held
+          pygame.MOUSEBUTTONDOWN: (2, struct.Struct("<hhB")),  # Position and button
+          pygame.MOUSEBUTTONUP: (3, struct.Struct("<hhB")),
+          pygame.KEYDOWN: (4, struct.Struct("<iH")),  # Key and modifiers
+          pygame.MOUSEWHEEL: (5, struct.Struct("<hhh")),  # Vertical scroll and the position of the cursor
+          pygame.QUIT: (6, struct.Struct("<")),
+          pygame.WINDOWEXPOSED: (7, struct.Struct("<"))}
+EVENT_TYPES = {code: (event_type, layout) for event_type, (code, layout) in EVENTS.items()}
+
+# Keyframe data: tool, color, thickness, whether painting, whether a stroke is in progress and its last position,
+# view position and zoom level, followed by the history and the painting
+VIEW = struct.Struct("<B3BBBBiiddB")
+STEPS = struct.Struct("<QII")  # Memory used by the history, and the number of undo and redo steps
+STEP = struct.Struct("<QI")  # Size of a step and its number of tiles
+TILE = struct.Struct("<iiBI")  # Column, row, kind of saved tile and length of its data
+SAVED_BACKGROUND, SAVED_COLOR, SAVED_PIXELS = 0, 1, 2  # Kinds of saved tile in the history
+
+
+def encode_event(ev):
+    """
+    :param ev: An input event.
+    :type ev: pygame.event.Event
+    :returns: The event as recorded, or None for an event that isn't recorded.
+    :rtype: bytes
+    """
+    if ev.type not in EVENTS:
+        return None
+    code, layout = EVENTS[ev.type]
+    if ev.type == pygame.MOUSEMOTION:
+        buttons = sum(1 << i for i, held in enumerate(ev.buttons[:3]) if held)
+        fields = ev.pos + ev.rel + (buttons,)
+    elif ev.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        fields = ev.pos + (ev.button,)
+    elif ev.type == pygame.KEYDOWN:
+        fields = (ev.key, ev.mod & 0xFFFF)
+    elif ev.type == pygame.MOUSEWHEEL:
+        fields = (ev.y,) + tuple(ev.pos if "pos" in ev.dict else pygame.mouse.get_pos())  # The app zooms around it
+    else:
+        fields = ()
+    return bytes((code,)) + layout.pack(*fields)
+
+
+def decode_event(data, offset):
+    """
+    :param data: The contents of a recording.
+    :type data: bytes
+    :param offset: The offset of a recorded event.
+    :type offset: int
+    :returns: The event, and the offset of the data after it.
+    :rtype: tuple
+    :raises ValueError: If there is no valid event at offset.
+    """
+    if offset >= len(data) or data[offset] not in EVENT_TYPES:
+        raise ValueError("invalid event at offset %d" % offset)
+    event_type, layout = EVENT_TYPES[data[offset]]
+    fields = layout.unpack_from(data, offset + 1)
+    offset += 1 + layout.size
+    if event_type == pygame.MOUSEMOTION:
+        attributes = {"pos": fields[0:2], "rel": fields[2:4], "buttons": tuple(bool(fields[4] & 1 << i)
+                                                                              for i in range(3))}
+    elif event_type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        attributes = {"pos": fields[0:2], "button": fields[2]}
+    elif event_type == pygame.KEYDOWN:
+        attributes = {"key": fields[0], "mod": fields[1]}
+    elif event_type == pygame.MOUSEWHEEL:
+        attributes = {"x": 0, "y": fields[0], "pos": fields[1:3]}
+    else:
+        attributes = {}
+    return pygame.event.Event(event_type, attributes), offset
+
+
+def app_state(app):
+    """
+    :param app: A paint app.
+    :type app: PaintApp
+    :returns: The tool, color and thickness of the app.
+    :rtype: tuple
+    """
+    return TOOLS.index(app.current_tool), tuple(app.pb.color[:3]), app.pb.thickness
+
+
+def capture(app):
+    """
+    Copies everything a keyframe holds. Only the allocated tiles of the painting are copied; the tiles saved in the
+    history never change, so they are shared.
+    :param app: A paint app without a fill or replace in progress.
+    :type app: PaintApp
+    :returns: The state of the app, to pass to encode_keyframe.
+    :rtype: tuple
+    """
+    history = app.history
+    return (app_state(app), app.pb.is_painting, app.prev_pos,
+            (app.viewport.x, app.viewport.y, Viewport.ZOOM_LEVELS.index(app.viewport.zoom)),
+            (history.memory_used, list(history.undo_steps), list(history.redo_steps), dict(history.pending)),
+            app.canvas, storage.copy_tiles(app.canvas, app.canvas.used_tiles()))
+
+
+def encode_tiles(output, tiles):
+    """
+    Writes the tiles saved by a step of the history.
+    :param output: The file to write to.
+    :type output: file
+    :param tiles: Saved tiles by (column, row), as kept by History.
+    :type tiles: dict
+    """
+    for (column, row), data in tiles.items():
+        if data is None:
+            output.write(TILE.pack(column, row, SAVED_BACKGROUND, 0))
+        elif isinstance(data, bytes):
+            output.write(TILE.pack(column, row, SAVED_PIXELS, len(data)))
+            output.write(data)
+        else:
+            output.write(TILE.pack(column, row, SAVED_COLOR, 3))
+            output.write(bytes(data[:3]))
+
+
+def decode_tiles(data, offset, count):
+    """
+    :param data: The data of a keyframe.
+    :type data: bytes
+    :param offset: The offset of the first tile of a step.
+    :type offset: int
+    :param count: The number of tiles of the step.
+    :type count: int
+    :returns: The saved tiles by (column, row), as kept by History, and the offset of the data after them.
+    :rtype: tuple
+    """
+    tiles = {}
+    for _ in range(count):
+        column, row, kind, length = TILE.unpack_from(data, offset)
+        offset += TILE.size
+        saved = data[offset:offset + length]
+        offset += length
+        tiles[(column, row)] = None if kind == SAVED_BACKGROUND else saved if kind == SAVED_PIXELS else tuple(saved)
+    return tiles, offset
+
+
+def encode_keyframe(state):
+    """
+    :param state: The state of an app, as returned by capture.
+    :type state: tuple
+    :returns: The compressed data of a keyframe of that state.
+    :rtype: bytes
+    """
+    (tool, color, thickness), is_painting, prev_pos, (x, y, zoom_level), history, canvas, tiles = state
+    memory_used, undo_steps, redo_steps, pending = history
+    output = io.BytesIO()
+    output.write(VIEW.pack(tool, *color, thickness, is_painting, prev_pos is not None, *(prev_pos or (0, 0)), x, y,
+                           zoom_level))
+    output.write(STEPS.pack(memory_used, len(undo_steps), len(redo_steps)))
+    for steps_tiles, size in [(pending, 0)] + undo_steps + redo_steps:
+        output.write(STEP.pack(size, len(steps_tiles)))
+        encode_tiles(output, steps_tiles)
+    storage.write_native(output, canvas, tiles)
+    return zlib.compress(output.getvalue(), 1)
+
+
+def restore_keyframe(app, data):
+    """
+    Puts an app in the state held by a keyframe.
+    :param app: The paint app.
+    :type app: PaintApp
+    :param data: The compressed data of the keyframe.
+    :type data: bytes
+    """
+    data = zlib.decompress(data)
+    tool, red, green, blue, thickness, is_painting, stroking, prev_x, prev_y, x, y, zoom_level = VIEW.unpack_from(data)
+    offset = VIEW.size
+    memory_used, undo_count, redo_count = STEPS.unpack_from(data, offset)
+    offset += STEPS.size
+    steps = []
+    for _ in range(1 + undo_count + redo_count):
+        size, count = STEP.unpack_from(data, offset)
+        tiles, offset = decode_tiles(data, offset + STEP.size, count)
+        steps.append((tiles, size))
+    app.set_canvas(storage.read_native(data[offset:]))
+    app.history.pending = steps[0][0]
+    app.history.undo_steps = collections.deque(steps[1:1 + undo_count])
+    app.history.redo_steps = steps[1 + undo_count:]
+    app.history.memory_used = memory_used
+    app.set_current_tool(TOOLS[tool])
+    app.pb.set_color((red, green, blue))
+    app.pb.set_thickness(thickness)
+    app.pb.is_painting = bool(is_painting)
+    app.prev_pos = (prev_x, prev_y) if stroking else None
+    app.stroke_points = []
+    app.viewport.zoom = Viewport.ZOOM_LEVELS[zoom_level]
+    app.viewport.x = x
+    app.viewport.y = y
+    app.show_all()
+
+
+class Recorder:
+    """Records the frames of a paint app to a file.
+    Records are handed to a background thread that writes them in order, and a keyframe only costs the frame it is
+    taken in a copy of the allocated tiles; it is compressed and written by the thread."""
+
+    def __init__(self, app, path):
+        """Starts a recording with a keyframe of the app as it is.
+        :param self: The calling object/object being initialized
+        :type self: Recorder
+        :param app: The app to record.
+        :type app: PaintApp
+        :param path: The path of the recording.
+        :type path: str
+        """
+        self.app = app
+        self.output = open(path, "wb")
+        self.output.write(HEADER.pack(MAGIC, VERSION, app.fill_connectivity, app.replace_tolerance, app.pb.antialias))
+        self.started = time.perf_counter()
+        self.frames = 0  # Number of frames recorded
+        self.state = None  # The tool, color and thickness last recorded
+        self.keyframe_time = None  # perf_counter() when the last keyframe was taken
+        self.error = None  # The last error writing the recording, or None
+        self.pending = queue.Queue()  # Records and keyframe states for the thread to write, None to stop it
+        self.thread = threading.Thread(target=self.write_records, name="recorder", daemon=True)
+        self.thread.start()
+        self.record_state()
+        self.keyframe()
+
+    def milliseconds(self):
+        """
+        :param self: The calling object
+        :type self: Recorder
+        :returns: The milliseconds since the recording started.
+        :rtype: int
+        """
+        return round(1000 * (time.perf_counter() - self.started))
+
+    def record_state(self):
+        """
+        Records the tool, color and thickness of the app if they changed since they were last recorded.
+        :param self: The calling object
+        :type self: Recorder
+        """
+        state = app_state(self.app)
+        if state != self.state:
+            self.pending.put(STATE.pack(b"S", state[0], *state[1], state[2]))
+            self.state = state
+
+    def keyframe(self):
+        """
+        Records a keyframe of the app.
+        :param self: The calling object
+        :type self: Recorder
+        """
+        self.pending.put((self.frames, self.milliseconds(), capture(self.app)))
+        self.keyframe_time = time.perf_counter()
+
+    def record_frame(self, events):
+        """
+        Records a frame the app handled, and a keyframe after it if one is due.
+        :param self: The calling object
+        :type self: Recorder
+        :param events: The events of the frame.
+        :type events: list
+        """
+        encoded = [data for data in map(encode_event, events) if data is not None]
+        self.pending.put(FRAME.pack(b"F", self.milliseconds(), self.app.job_calls, len(encoded)) + b"".join(encoded))
+        self.frames += 1
+        self.record_state()
+        # A fill or replace in progress can't be captured, nor can the stroke or shape being painted or the selection,
+        # so wait for them to end.
+        # A keyframe holds a single layer, so once there are more, seeking replays them from the last one before; nor
+        # does it hold the clipboard, so once something is copied, seeking replays from the last one before the copy
+        if (self.app.job is None and self.app.prev_pos is None and self.app.shape_start is None
+                and self.app.selection is None and self.app.clipboard.size is None
+                and self.app.layers.composite is None
+                and time.perf_counter() - self.keyframe_time >= KEYFRAME_INTERVAL):
+            self.keyframe()
+
+    def write_records(self):
+        """
+        Writes the records to the file until close is called. Runs in the background thread.
+        :param self: The calling object
+        :type self: Recorder
+        """
+        while True:
+            record = self.pending.get()
+            if record is None:
+                return
+            try:
+                if isinstance(record, tuple):
+                    frame, milliseconds, state = record
+                    data = encode_keyframe(state)
+                    record = KEYFRAME.pack(b"K", frame, milliseconds, len(data)) + data
+                self.output.write(record)
+            except (OSError, ValueError) as error:
+                self.error = error
+
+    def close(self):
+        """
+        Finishes writing the recording.
+        :param self: The calling object
+        :type self: Recorder
+        """
+        self.pending.put(None)
+        self.thread.join()
+        self.output.close()
+
+
+class Replayer:
+    """Replays a recording on a paint app, frame by frame.
+    Keyframes are found when the recording is read, and only decoded when a seek needs one."""
+
+    def __init__(self, app, path):
+        """Reads a recording and puts the app in the state it starts from.
+        :param self: The calling object/object being initialized
+        :type self: Replayer
+        :param app: The app to replay on, normally with the SDL dummy video driver.
+        :type app: PaintApp
+        :param path: The path of the recording.
+        :type path: str
+        :raises ValueError: If the file isn't a valid recording.
+        """
+        with open(path, "rb") as source:
+            data = source.read()
+        if len(data) < HEADER.size:
+            raise ValueError("%s is too short to be a recording" % path)
+        magic, version, connectivity, tolerance, antialias = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s isn't a version %d recording" % (path, VERSION))
+        self.app = app
+        app.fill_connectivity = connectivity
+        app.replace_tolerance = tolerance
+        app.pb.antialias = bool(antialias)
+        self.frames = []  # (milliseconds, job steps, events, tool, color and thickness after it) of each frame
+        self.keyframes = []  # (index of the next frame, milliseconds, data) of each keyframe, in order
+        state = None
+        offset = HEADER.size
+        while offset < len(data):
+            tag = data[offset:offset + 1]
+            if tag == b"F":
+                milliseconds, job_steps, count = FRAME.unpack_from(data, offset)[1:]
+                offset += FRAME.size
+                events = []
+                for _ in range(count):
+                    ev, offset = decode_event(data, offset)
+                    events.append(ev)
+                self.frames.append([milliseconds, job_steps, events, state])
+            elif tag == b"S":
+                tool, red, green, blue, thickness = STATE.unpack_from(data, offset)[1:]
+                offset += STATE.size
+                state = (tool, (red, green, blue), thickness)
+                if self.frames:
+                    self.frames[-1][3] = state
+            elif tag == b"K":
+                frame, milliseconds, length = KEYFRAME.unpack_from(data, offset)[1:]
+                offset += KEYFRAME.size
+                self.keyframes.append((frame, milliseconds, data[offset:offset + length]))
+                offset += length
+            else:
+                raise ValueError("invalid record at offset %d of %s" % (offset, path))
+        if not self.keyframes or self.keyframes[0][0] != 0:
+            raise ValueError("%s doesn't start with a keyframe" % path)
+        self.position = None  # Index of the next frame to replay, None before the first keyframe is restored
+        self.diverged = []  # Indexes of the frames after which the app didn't reach the recorded state
+        self.replayed = 0  # Number of frames replayed
+        self.seek(0)
+
+    def step(self):
+        """
+        Replays the next frame.
+        :param self: The calling object
+        :type self: Replayer
+        :returns: Whether the recorded user still wanted to paint after the frame.
+        :rtype: bool
+        """
+        _, job_steps, events, state = self.frames[self.position]
+        wants_to_paint = self.app.handle_frame(events, job_steps)
+        if state is not None and app_state(self.app) != state:
+            self.diverged.append(self.position)
+        self.position += 1
+        self.replayed += 1
+        return wants_to_paint
+
+    def seek(self, frame):
+        """
+        Puts the app in its state before a frame, from the last keyframe before it unless the frames since the
+        current position are fewer.
+        :param self: The calling object
+        :type self: Replayer
+        :param frame: The index of the frame, at most the number of frames.
+        :type frame: int
+        """
+        keyframe = max((key for key in self.keyframes if key[0] <= frame), key=lambda key: key[0])
+        if self.position is None or not keyframe[0] <= self.position <= frame:
+            restore_keyframe(self.app, keyframe[2])
+            self.position = keyframe[0]
+        while self.position < frame:
+            self.step()
+
+    def frame_at(self, seconds):
+        """
+        :param self: The calling object
+        :type self: Replayer
+        :param seconds: Seconds since the start of the recording.
+        :type seconds: float
+        :returns: The index of the first frame recorded after that time.
+        :rtype: int
+        """
+        for index, (milliseconds, _, _, _) in enumerate(self.frames):
+            if milliseconds > 1000 * seconds:
+                return index
+        return len(self.frames)
+
+    def play(self, until=None, realtime=False):
+        """
+        Replays the frames from the current position.
+        :param self: The calling object
+        :type self: Replayer
+        :param until: The index of the frame to stop before, or None to replay to the end.
+        :type until: int
+        :param realtime: Whether to replay each frame as long after the first as it was recorded, instead of as
+            fast as possible.
+        :type realtime: bool
+        """
+        until = len(self.frames) if until is None else min(until, len(self.frames))
+        if self.position >= until:
+            return
+        started = time.perf_counter() - self.frames[self.position][0] / 1000
+        while self.position < until:
+            if realtime:
+                delay = started + self.frames[self.position][0] / 1000 - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.step()
+
@@ -0,0 +1,301 @@
+"""Index of the connected regions of one color of a canvas, so that a fill looks its region up instead of searching
+for it pixel by pixel."""
+import numpy as np
+import pygame
+
+
+def find_roots(count, sources, targets):
+    """
+    Union-find over a graph, run in bulk: every round hooks the root of each edge's higher end to the root of its
+    lower end, then points every node straight at its root.
+    :param count: The number of nodes.
+    :type count: int
+    :param sources: One end of each edge.
+    :type sources: numpy.ndarray
+    :param targets: The other end of each edge.
+    :type targets: numpy.ndarray
+    :returns: The smallest node connected to each node.
+    :rtype: numpy.ndarray
+    """
+    parent = np.arange(count)
+    while True:
+        source_roots, target_roots = parent[sources], parent[targets]
+        apart = source_roots != target_roots
+        if not apart.any():
+            return parent
+        # Edges whose ends were joined already are done with
+        sources, targets = sources[apart], targets[apart]
+        source_roots, target_roots = source_roots[apart], target_roots[apart]
+        np.minimum.at(parent, np.maximum(source_roots, target_roots), np.minimum(source_roots, target_roots))
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+
+
+def neighbour_slices(connectivity):
+    """
+    :param connectivity: 8 to connect pixels that touch diagonally, 4 to only connect pixels that share an edge.
+    :type connectivity: int
+    :returns: The pairs of slices of an array indexed [y, x] that select each pixel and its neighbour in the next row,
+        one pair per direction.
+    :rtype: list
+    """
+    slices = [((slice(None, -1), slice(None)), (slice(1, None), slice(None)))]
+    if connectivity == 8:
+        slices.append(((slice(None, -1), slice(None, -1)), (slice(1, None), slice(1, None))))
+        slices.append(((slice(None, -1), slice(1, None)), (slice(1, None), slice(None, -1))))
+    return slices
+
+
+class Regions:
+    """The connected regions of one color within a tile of a canvas.
+    Each region has a label, its pixels are labeled in an array like the tile, and its color is kept up to date as
+    fills recolor it. A fill may leave two regions of the same color touching, so the labels of the regions each
+    region touches are kept too."""
+
+    def __init__(self, values, connectivity):
+        """Labels the regions of a tile's pixels.
+        :param self: The calling object/object being initialized
+        :type self: Regions
+        :param values: The mapped colors of the tile's pixels, indexed [y, x].
+        :type values: numpy.ndarray
+        :param connectivity: 8 to connect pixels that touch diagonally, 4 to only connect pixels that share an edge.
+        :type connectivity: int
+        """
+        height, width = values.shape
+        if (values == values[0, 0]).all():
+            # The whole tile is one region
+            self.labels = np.zeros((height, width), dtype=np.int32)
+            self.values = [int(values[0, 0])]
+            self.touching = []
+            self.touching_starts = [0, 0]
+            self.on_border = {0}
+            return
+        # Label the runs of one color of each row, join the runs that touch one of the same color in the next row,
+        # and give every pixel the label of its run's region
+        run_starts = np.ones((height, width), dtype=bool)
+        run_starts[:, 1:] = values[:, 1:] != values[:, :-1]
+        runs = np.cumsum(run_starts, dtype=np.int32).reshape(height, width) - 1
+        sources, targets = [], []
+        for upper, lower in neighbour_slices(connectivity):
+            same = values[upper] == values[lower]
+            sources.append(runs[upper][same])
+            targets.append(runs[lower][same])
+        roots = find_roots(int(runs[-1, -1]) + 1, np.concatenate(sources), np.concatenate(targets))[runs]
+        _, first, labels = np.unique(roots, return_index=True, return_inverse=True)
+        self.labels = labels.reshape(height, width).astype(np.int32)
+        self.values = values.ravel()[first].tolist()  # Mapped color of each region
+        # Pairs of regions that touch, found like the runs above plus side by side within a row
+        pairs = [(self.labels[:, :-1], self.labels[:, 1:])]
+        pairs.extend((self.labels[upper], self.labels[lower]) for upper, lower in neighbour_slices(connectivity))
+        count = len(self.values)
+        keys = np.unique(np.concatenate([a[a != b].astype(np.int64) * count + b[a != b] for a, b in pairs]
+                                        + [b[a != b].astype(np.int64) * count + a[a != b] for a, b in pairs]))
+        self.touching = (keys % count).tolist()  # Labels touching each region, in order of the region's label
+        self.touching_starts = np.searchsorted(keys // count, np.arange(count + 1)).tolist()
+        border = np.concatenate((self.labels[0], self.labels[-1], self.labels[:, 0], self.labels[:, -1]))
+        self.on_border = set(np.unique(border).tolist())  # Regions that may continue in a neighbouring tile
+
+    @classmethod
+    def uniform(cls, value):
+        """
+        :param value: The mapped color of every pixel of a tile.
+        :type value: int
+        :returns: The regions of a tile of a single color, which is one region labeled 0 without a label array.
+        :rtype: Regions
+        """
+        regions = cls.__new__(cls)
+        regions.labels = None
+        regions.values = [value]
+        regions.touching = []
+        regions.touching_starts = [0, 0]
+        regions.on_border = {0}
+        return regions
+
+    def label_at(self, x, y):
+        """
+        :param self: The calling object
+        :type self: Regions
+        :param x: x-coordinate of a pixel of the tile.
+        :type x: int
+        :param y: y-coordinate of a pixel of the tile.
+        :type y: int
+        :returns: The label of the region containing the pixel.
+        :rtype: int
+        """
+        return 0 if self.labels is None else int(self.labels[y, x])
+
+    def edge(self, side, length):
+        """
+        :param self: The calling object
+        :type self: Regions
+        :param side: "top", "bottom", "left" or "right".
+        :type side: str
+        :param length: The number of pixels along that side of the tile.
+        :type length: int
+        :returns: The labels of the pixels along a side of the tile, top to bottom or left to right.
+        :rtype: numpy.ndarray
+        """
+        if self.labels is None:
+            return np.zeros(length, dtype=np.int32)
+        return {"top": self.labels[0], "bottom": self.labels[-1], "left": self.labels[:, 0],
+                "right": self.labels[:, -1]}[side]
+
+
+class RegionIndex:
+    """The regions of a canvas, labeled tile by tile when a fill first reaches each tile and kept until the pixels of
+    the tile change other than by a fill. A fill only recolors whole regions, so it keeps the labels valid.
+    An index of a rectangle of the canvas cuts the regions at the rectangle's edges. It only labels the parts of the
+    tiles the rectangle cuts, and shares the regions of the tiles within it with the index of the whole canvas."""
+
+    def __init__(self, canvas, connectivity, area=None):
+        """Initializes an index without any tile labeled.
+        :param self: The calling object/object being initialized
+        :type self: RegionIndex
+        :param canvas: The canvas to index.
+        :type canvas: Canvas
+        :param connectivity: 8 to connect pixels that touch diagonally, 4 to only connect pixels that share an edge.
+        :type connectivity: int
+        :param area: The rectangle of the canvas to index, within the canvas, or None for the whole canvas.
+        :type area: pygame.Rect
+        """
+        if connectivity not in (4, 8):
+            raise ValueError("connectivity must be 4 or 8, not %r" % (connectivity,))
+        self.canvas = canvas
+        self.connectivity = connectivity
+        self.area = canvas.get_rect() if area is None else area
+        self.whole = None if area is None else canvas.region_index(connectivity)  # Index of the whole canvas, or None
+        self.regions = {}  # Regions of the labeled tiles by (column, row)
+        self.links = {}  # Touching regions of neighbouring tiles as {tile: {neighbour: {label: [labels]}}}
+
+    def tile_rect(self, tile):
+        """
+        :param self: The calling object
+        :type self: RegionIndex
+        :param tile: The (column, row) of a tile.
+        :type tile: tuple
+        :returns: The rectangle of the canvas covered by the part of the tile within the index's area.
+        :rtype: pygame.Rect
+        """
+        return self.canvas.tile_rect(tile).clip(self.area)
+
+    def is_whole(self, tile):
+        """
+        :param self: The calling object
+        :type self: RegionIndex
+        :param tile: The (column, row) of a tile.
+        :type tile: tuple
+        :returns: Whether the index's area contains the whole tile, so the tile's regions are those of the index of
+            the whole canvas.
+        :rtype: bool
+        """
+        return self.whole is None or self.area.contains(self.canvas.tile_rect(tile))
+
+    def invalidate(self, tiles):
+        """
+        Forgets the regions of tiles whose pixels changed.
+        :param self: The calling object
+        :type self: RegionIndex
+        :param tiles: The (column, row) of each changed tile.
+        :type tiles: iterable
+        """
+        for tile in tiles:
+            self.regions.pop(tile, None)
+            for neighbour in self.links.pop(tile, {}):
+                self.links[neighbour].pop(tile, None)
+
+    def tile_regions(self, tile):
+        """
+        Labels the regions of a tile if it isn't labeled yet.
+        :param self: The calling object
+        :type self: RegionIndex
+        :param tile: The (column, row) of a tile.
+        :type tile: tuple
+        :returns: The regions of the tile.
+        :rtype: Regions
+        """
+        regions = self.regions.get(tile)
+        if regions is None:
+            surface = self.canvas.tiles.get(tile)
+            if self.whole is not None and self.is_whole(tile):
+                regions = self.whole.tile_regions(tile)
+            elif surface is None:
+                regions = Regions.uniform(self.canvas.map_color(self.canvas.tile_color(tile)))
+            else:
+                rect = self.tile_rect(tile).move(-tile[0] * self.canvas.TILE_SIZE, -tile[1] * self.canvas.TILE_SIZE)
+                regions = Regions(pygame.surfarray.pixels2d(surface).T[rect.top:rect.bottom, rect.left:rect.right],
+                                  self.connectivity)
+            self.regions[tile] = regions
+        return regions
+
+    def neighbours(self, tile):
+        """
+        :param self: The calling object
+        :type self: RegionIndex
+        :param tile: The (column, row) of a tile.
+        :type tile: tuple
+        :returns: The tiles of the canvas that pixels of the tile can be connected to.
+        :rtype: list
+        """
+        offsets = ((1, 0), (-1, 0), (0, 1), (0, -1))
+        if self.connectivity == 8:
+            offsets += ((1, 1), (-1, -1), (1, -1), (-1, 1))
+        size = self.canvas.TILE_SIZE
+        columns = range(self.area.left // size, (self.area.right - 1) // size + 1)
+        rows = range(self.area.top // size, (self.area.bottom - 1) // size + 1)
+        return [(tile[0] + dx, tile[1] + dy) for dx, dy in offsets if tile[0] + dx in columns and tile[1] + dy in rows]
+
+    def linked(self, tile, neighbour):
+        """
+        :param self: The calling object
+        :type self: RegionIndex
+        :param tile: The (column, row) of a tile.
+        :type tile: tuple
+        :param neighbour: The (column, row) of one of the tile's neighbours.
+        :type neighbour: tuple
+        :returns: The labels of the regions of neighbour that touch each region of tile, by the label in tile.
+        :rtype: dict
+        """
+        links = self.links.setdefault(tile, {})
+        if neighbour in links:
+            return links[neighbour]
+        regions, other = self.tile_regions(tile), self.tile_regions(neighbour)
+        if self.whole is not None and self.is_whole(tile) and self.is_whole(neighbour):
+            links[neighbour] = self.whole.linked(tile, neighbour)
+            self.links.setdefault(neighbour, {})[tile] = self.whole.links[neighbour][tile]
+            return links[neighbour]
+        if regions.labels is None and other.labels is None:
+            # The one region of each tile touches the other's
+            links[neighbour] = {0: [0]}
+            self.links.setdefault(neighbour, {})[tile] = {0: [0]}
+            return links[neighbour]
+        rect, other_rect = self.tile_rect(tile), self.tile_rect(neighbour)
+        dx, dy = neighbour[0] - tile[0], neighbour[1] - tile[1]
+        if dx and dy:
+            # Diagonal neighbours only touch at a corner
+            ours = regions.label_at(rect.width - 1 if dx > 0 else 0, rect.height - 1 if dy > 0 else 0)
+            theirs = other.label_at(0 if dx > 0 else other_rect.width - 1, 0 if dy > 0 else other_rect.height - 1)
+            sources, targets = np.array([ours]), np.array([theirs])
+        else:
+            if dx:
+                length = rect.height
+                ours = regions.edge("right" if dx > 0 else "left", length)
+                theirs = other.edge("left" if dx > 0 else "right", length)
+            else:
+                length = rect.width
+                ours = regions.edge("bottom" if dy > 0 else "top", length)
+                theirs = other.edge("top" if dy > 0 else "bottom", length)
+            sources, targets = [ours], [theirs]
+            if self.connectivity == 8:
+                sources.extend((ours[:-1], ours[1:]))
+                targets.extend((theirs[1:], theirs[:-1]))
+            sources, targets = np.concatenate(sources), np.concatenate(targets)
+        forward, backward = {}, {}
+        for source, target in set(zip(sources.tolist(), targets.tolist())):
+            forward.setdefault(source, []).append(target)
+            backward.setdefault(target, []).append(source)
+        links[neighbour] = forward
+        self.links.setdefault(neighbour, {})[tile] = backward
+        return forward
@@ -0,0 +1,71 @@
+"""Replays a recording of the paint app without opening a window.
+
+Record a session with
+    python3 paint.py --record session.rec
+and replay it as fast as possible, saving the painting it ends with, with
+    python3 replay.py session.rec --output final.png
+--realtime replays each frame when it was recorded, and --at SECONDS seeks to that point of the recording from the
+keyframe before it and saves the painting as it was then.
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame  # noqa: E402
+
+import storage  # noqa: E402
+from paint import PaintApp  # noqa: E402
+from profiler import FrameProfiler  # noqa: E402
+from recording import Replayer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recording of the paint app without opening a window.")
+    parser.add_argument("recording", help="recording made with paint.py --record")
+    parser.add_argument("--realtime", action="store_true",
+                        help="replay the frames at the pace they were recorded instead of as fast as possible")
+    parser.add_argument("--at", type=float, metavar="SECONDS",
+                        help="seek to this many seconds into the recording and stop there")
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="save the painting, with its visible layers composited, to FILE, as PNG if it ends in "
+                             ".png and in the native format otherwise")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="export the timings of the replayed frames to FILE, as CSV if it ends in .csv and as "
+                             "JSON otherwise")
+    args = parser.parse_args()
+
+    profiler = FrameProfiler() if args.profile_output else None
+    app = PaintApp(profiler=profiler)
+    started = time.perf_counter()
+    try:
+        replayer = Replayer(app, args.recording)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    loaded = time.perf_counter()
+    if args.at is None:
+        replayer.play(realtime=args.realtime)
+    else:
+        frame = replayer.frame_at(args.at)
+        keyframe = max(key[0] for key in replayer.keyframes if key[0] <= frame)
+        replayer.seek(frame)
+        print("seek to frame %d started from the keyframe at frame %d" % (frame, keyframe))
+    finished = time.perf_counter()
+    print("%d frames replayed in %.1f ms (%.1f ms reading the recording), stopped at frame %d of %d"
+          % (replayer.replayed, 1000 * (finished - started), 1000 * (loaded - started), replayer.position,
+             len(replayer.frames)))
+    if replayer.diverged:
+        print("replay diverged from the recording after frame %d" % replayer.diverged[0], file=sys.stderr)
+    if args.output:
+        storage.save(app.layers.shown, args.output)
+    if profiler is not None:
+        profiler.export(args.profile_output)
+    pygame.quit()
+    sys.exit(1 if replayer.diverged else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Rectangular selections: the clipboard that selected pixels are copied to, and the rectangles of the window to redraw
+as a selection moves."""
+import zlib
+
+import numpy as np
+import pygame
+
+
+def rect_difference(rect, other):
+    """
+    :param rect: A rectangle.
+    :type rect: pygame.Rect
+    :param other: Another rectangle, or None.
+    :type other: pygame.Rect
+    :returns: At most 4 rectangles that don't overlap, covering the part of rect outside other.
+    :rtype: list
+    """
+    overlap = rect.clip(other) if other is not None else pygame.Rect(rect.left, rect.top, 0, 0)
+    if overlap.width == 0 or overlap.height == 0:
+        return [rect]
+    parts = [pygame.Rect(rect.left, rect.top, rect.width, overlap.top - rect.top),
+             pygame.Rect(rect.left, overlap.bottom, rect.width, rect.bottom - overlap.bottom),
+             pygame.Rect(rect.left, overlap.top, overlap.left - rect.left, overlap.height),
+             pygame.Rect(overlap.right, overlap.top, rect.right - overlap.right, overlap.height)]
+    return [part for part in parts if part.width > 0 and part.height > 0]
+
+
+def border_rects(rect, width):
+    """
+    :param rect: A rectangle.
+    :type rect: pygame.Rect
+    :param width: The width of the border.
+    :type width: int
+    :returns: The rectangles of the border of rect, inside it.
+    :rtype: list
+    """
+    return [pygame.Rect(rect.left, rect.top, rect.width, width),
+            pygame.Rect(rect.left, rect.bottom - width, rect.width, width),
+            pygame.Rect(rect.left, rect.top, width, rect.height),
+            pygame.Rect(rect.right - width, rect.top, width, rect.height)]
+
+
+class Clipboard:
+    """Pixels copied from a painting.
+    They are kept compressed like the tiles of the undo history, in the pixel format of the canvas they were copied
+    from, so a copy of an indexed canvas takes a byte per pixel before compression. A copy of pixels that are all one
+    color only keeps the color."""
+
+    def __init__(self):
+        """Initializes an empty clipboard.
+        :param self: The calling object/object being initialized
+        :type self: Clipboard
+        """
+        self.size = None  # (width, height) of the pixels copied, None if nothing was copied
+        self.flags = 0  # Flags, bits per pixel and palette of the surface the pixels were copied from
+        self.bitsize = 32
+        self.palette = None
+        self.color = None  # The color of every pixel, if they are all one color
+        self.data = None  # The compressed pixels, unless they are all one color
+
+    def copy(self, canvas, rect):
+        """
+        Copies the pixels of a rectangle of a canvas, replacing what the clipboard held.
+        :param self: The calling object
+        :type self: Clipboard
+        :param canvas: The canvas to copy from.
+        :type canvas: Canvas
+        :param rect: The rectangle to copy, within the canvas.
+        :type rect: pygame.Rect
+        """
+        tiles = canvas.tiles_under(rect)
+        colors = {canvas.tile_color(tile) for tile in tiles if tile not in canvas.tiles}
+        if len(colors) == 1 and not any(tile in canvas.tiles for tile in tiles):
+            # The rectangle only covers unallocated tiles of one color, so don't copy its pixels
+            self.set_format(canvas.format)
+            self.size = rect.size
+            self.color = colors.pop()
+            self.data = None
+            return
+        self.copy_surface(canvas.to_surface(rect, native=True))
+
+    def copy_surface(self, surface):
+        """
+        Copies the pixels of a surface, replacing what the clipboard held.
+        :param self: The calling object
+        :type self: Clipboard
+        :param surface: The surface to copy.
+        :type surface: pygame.Surface
+        """
+        self.set_format(surface)
+        self.size = surface.get_size()
+        self.color = None
+        self.data = zlib.compress(np.ascontiguousarray(pygame.surfarray.pixels2d(surface)).tobytes(), 1)
+
+    def set_format(self, surface):
+        """
+        Makes the clipboard hold pixels in the pixel format of a surface.
+        :param self: The calling object
+        :type self: Clipboard
+        :param surface: The surface.
+        :type surface: pygame.Surface
+        """
+        self.flags = surface.get_flags() & pygame.SRCALPHA
+        self.bitsize = surface.get_bitsize()
+        self.palette = surface.get_palette() if self.bitsize == 8 else None
+
+    def paste(self):
+        """
+        :param self: The calling object
+        :type self: Clipboard
+        :returns: A new surface with the pixels copied, or None if nothing was copied.
+        :rtype: pygame.Surface
+        """
+        if self.size is None:
+            return None
+        surface = pygame.Surface(self.size, self.flags, self.bitsize)
+        if self.palette is not None:
+            surface.set_palette(self.palette)
+        if self.data is None:
+            surface.fill(self.color)
+        else:
+            pixels = pygame.surfarray.pixels2d(surface)
+            pixels[:] = np.frombuffer(zlib.decompress(self.data), dtype=pixels.dtype).reshape(pixels.shape)
+            del pixels
+        return surface
+
+    def stored_bytes(self):
+        """
+        :param self: The calling object
+        :type self: Clipboard
+        :returns: The number of bytes the copied pixels take in the clipboard.
+        :rtype: int
+        """
+        return 0 if self.data is None else len(self.data)
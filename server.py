@@ -0,0 +1,79 @@
+"""Serves a painting that several users paint on at once with paint.py --connect.
+
+Serve a painting on a port of this machine, or on a Unix socket, with
+    python3 server.py --port 8765
+    python3 server.py --unix /tmp/paint.sock --canvas-size 2048 2048
+and have each user connect to it with
+    python3 paint.py --connect 127.0.0.1:8765
+Ctrl+C stops the server, saving the painting first with --save FILE.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import storage  # noqa: E402
+from canvas import Canvas  # noqa: E402
+from shared import CanvasServer  # noqa: E402
+
+BACKGROUND_COLOR = (255, 255, 255)
+
+
+async def serve(server, address):
+    """
+    Serves the painting until cancelled.
+    :param server: The server of the painting.
+    :type server: CanvasServer
+    :param address: The (host, port) to listen on, or the path of a Unix socket.
+    :type address: tuple or str
+    """
+    listener = await server.serve(address)
+    name = listener.sockets[0].getsockname()
+    print("serving a %dx%d painting on %s" % (server.replica.canvas.width, server.replica.canvas.height,
+                                              name if isinstance(name, str) else "%s:%d" % name[:2]), flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a painting that several users paint on at once.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on, 0 for any free port")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket at PATH instead of a port")
+    parser.add_argument("--canvas-size", type=int, nargs=2, default=(450, 450), metavar=("WIDTH", "HEIGHT"),
+                        help="size of the painting in pixels")
+    parser.add_argument("--open", metavar="FILE", help="serve the painting of a PNG image or a native file")
+    parser.add_argument("--save", metavar="FILE",
+                        help="save the painting to FILE when the server stops, as PNG if it ends in .png and in the "
+                             "native format otherwise")
+    args = parser.parse_args()
+
+    try:
+        canvas = (storage.load(args.open, BACKGROUND_COLOR) if args.open
+                  else Canvas(args.canvas_size[0], args.canvas_size[1], BACKGROUND_COLOR))
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    server = CanvasServer(canvas)
+    try:
+        asyncio.run(serve(server, args.unix or (args.host, args.port)))
+    except KeyboardInterrupt:
+        pass
+    except OSError as error:
+        print("could not serve the painting: %s" % error, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+    apply_time = 1000 * server.apply_time / max(server.sequence, 1)
+    print("%d operations from %d clients, %.3f ms to apply each on average, %d snapshots for late joiners, %.1f s of CPU"
+          % (server.sequence, server.clients, apply_time, server.snapshots, time.process_time()))
+    if args.save:
+        storage.save(canvas, args.save)
+
+
+if __name__ == '__main__':
+    main()
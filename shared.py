@@ -0,0 +1,599 @@
+"""A painting shared by several users over the network: an asyncio server that orders their operations, and the client
+the paint app draws on a shared painting through.
+
+Clients send operations rather than pixels: the points a frame added to a stroke, the seed of a fill or replace, or a
+clear. The server numbers them in the order they arrive, applies them to its own copy of the painting and broadcasts
+them to every client, the sender included, and each copy applies them in that order, so they all paint the same
+pixels. The points of a stroke are sent as the first point followed by the step to each next one, a byte per
+coordinate when the steps are small.
+Every SNAPSHOT_INTERVAL operations the server takes a compressed snapshot of its painting and of the strokes being
+painted, so a client joining late receives the snapshot and only the operations since, rather than every operation
+since the server started.
+
+Every message is framed by its length and the id of the client that sent it, which the server fills in.
+"""
+import asyncio
+import collections
+import io
+import struct
+import threading
+import zlib
+
+import numpy as np
+import pygame
+
+import storage
+from brush import BrushStroke, StampCache
+
+VERSION = 2
+MESSAGE = struct.Struct("<IH")  # Length of the operation and id of the client that sent it, 0 for the server
+MAX_OPERATION = 1 << 16  # Most bytes of an operation a client may send
+MAX_BACKLOG = 16 * 1024 * 1024  # Most bytes waiting to be sent to a client before it is dropped as too slow
+SNAPSHOT_INTERVAL = 1000  # Operations between two snapshots of the painting for clients joining late
+CONNECT_TIMEOUT = 10.0  # Seconds to wait for the server to answer a new client
+MAX_CLIENTS = 0xFFFF  # Most clients connected at once, as client ids are 16-bit and 0 is the server's
+
+# Operations, each starting with its tag
+STROKE = struct.Struct("<cBB3BBHii")  # Flags, thickness, color, opacity, number of points and the first point
+FILL = struct.Struct("<cii3BB")  # Seed, color and connectivity
+REPLACE = struct.Struct("<cii3Bf")  # Seed, color and tolerance
+CLEAR = b"C"
+END = b"E"  # The stroke of the sender ended
+NEW_STROKE, ERASE, WIDE_STEPS, ANTIALIAS = 1, 2, 4, 8  # Flags of a stroke
+MAX_POINTS = (MAX_OPERATION - STROKE.size) // 4  # Most points of a stroke operation, so that it fits in MAX_OPERATION
+MAX_OUTSIDE = 1 << 16  # Farthest in pixels a point of a stroke may lie outside the painting
+
+# Messages of the server, each starting with its tag
+WELCOME = struct.Struct("<cBH")  # Version and id of the client, followed by a snapshot
+# Snapshot data, compressed: the strokes being painted, each followed by the alpha of the stroke over each tile it
+# crossed, then the painting in the native format
+STROKES = struct.Struct("<H")  # Number of strokes
+STROKE_STATE = struct.Struct("<H3BBBddBiiH")  # Sender, color, thickness, whether anti-aliased, opacity, offset of the
+# next stamp, whether the stroke was painted to a point and that point, and number of tiles
+TILE = struct.Struct("<iiHH")  # Column, row, width and height of the alpha of a stroke over a tile
+
+
+def parse_address(text):
+    """
+    :param text: HOST:PORT, or the path of a Unix socket.
+    :type text: str
+    :returns: The (host, port) to connect to, or the path of the socket.
+    :rtype: tuple or str
+    :raises ValueError: If the port isn't a number.
+    """
+    host, colon, port = text.rpartition(":")
+    if not colon or "/" in text:
+        return text
+    try:
+        return host or "127.0.0.1", int(port)
+    except ValueError:
+        raise ValueError("invalid port in %r" % text) from None
+
+
+def stroke_op(points, new_stroke, color, thickness, opacity, erase=False, antialias=True):
+    """
+    :param points: The canvas positions the stroke continues through, in order, at most MAX_POINTS.
+    :type points: list
+    :param new_stroke: Whether the points start a new stroke instead of continuing the sender's last one.
+    :type new_stroke: bool
+    :param color: The RGB color of the stroke.
+    :type color: tuple
+    :param thickness: The thickness of the brush in pixels, from 1 to 255.
+    :type thickness: int
+    :param opacity: The alpha of the middle of the stroke, from 0 to 1.
+    :type opacity: float
+    :param erase: Whether the stroke erases instead of painting color.
+    :type erase: bool
+    :param antialias: Whether to blend the edges of an opaque stroke.
+    :type antialias: bool
+    :returns: The operation.
+    :rtype: bytes
+    """
+    steps = np.diff(np.asarray(points, dtype=np.int32), axis=0).ravel()
+    wide = steps.size and (steps.min() < -128 or steps.max() > 127)
+    flags = ((NEW_STROKE if new_stroke else 0) | (ERASE if erase else 0) | (WIDE_STEPS if wide else 0)
+             | (ANTIALIAS if antialias else 0))
+    return (STROKE.pack(b"S", flags, thickness, *color[:3], round(255 * min(max(opacity, 0.0), 1.0)), len(points),
+                        *points[0]) + steps.astype(np.int16 if wide else np.int8).tobytes())
+
+
+def fill_op(pos, color, connectivity):
+    """
+    :param pos: The canvas position to fill from.
+    :type pos: tuple
+    :param color: The RGB color to fill with.
+    :type color: tuple
+    :param connectivity: 8 to fill across diagonal neighbours, 4 to only fill across edge neighbours.
+    :type connectivity: int
+    :returns: The operation.
+    :rtype: bytes
+    """
+    return FILL.pack(b"F", *pos, *color[:3], connectivity)
+
+
+def replace_op(pos, color, tolerance):
+    """
+    :param pos: The canvas position of a pixel of the color to replace.
+    :type pos: tuple
+    :param color: The RGB color to replace it with.
+    :type color: tuple
+    :param tolerance: The largest RGB distance from the color at pos that is still replaced.
+    :type tolerance: float
+    :returns: The operation.
+    :rtype: bytes
+    """
+    return REPLACE.pack(b"R", *pos, *color[:3], tolerance)
+
+
+def decode_points(op, count, first, wide):
+    """
+    :param op: A stroke operation.
+    :type op: bytes
+    :param count: The number of points of the stroke.
+    :type count: int
+    :param first: The first point.
+    :type first: tuple
+    :param wide: Whether the steps between points take 2 bytes per coordinate instead of 1.
+    :type wide: bool
+    :returns: The points of the stroke.
+    :rtype: list
+    :raises ValueError: If the operation is too short for its points.
+    """
+    dtype = np.int16 if wide else np.int8
+    steps = np.frombuffer(op, dtype, 2 * (count - 1), STROKE.size) if count > 1 else np.zeros(0, dtype)
+    if STROKE.size + steps.nbytes != len(op):
+        raise ValueError("stroke of %d points takes %d bytes, not %d" % (count, STROKE.size + steps.nbytes, len(op)))
+    points = np.empty((count, 2), dtype=np.int64)
+    points[0] = first
+    points[1:] = steps.reshape(-1, 2)
+    return [tuple(point) for point in np.cumsum(points, axis=0).tolist()]
+
+
+class Replica:
+    """A copy of the shared painting, which operations are applied to in the order the server gave them.
+    The stroke each client is painting is kept, so the points it sends next continue it as they would locally."""
+
+    def __init__(self, canvas):
+        """Initializes a replica with no stroke in progress.
+        :param self: The calling object/object being initialized
+        :type self: Replica
+        :param canvas: The painting.
+        :type canvas: Canvas
+        """
+        self.canvas = canvas
+        self.strokes = {}  # The stroke each client is painting by client id
+        self.stamps = StampCache()
+
+    def apply(self, sender, op):
+        """
+        Applies an operation to the painting.
+        :param self: The calling object
+        :type self: Replica
+        :param sender: The id of the client that sent the operation.
+        :type sender: int
+        :param op: The operation.
+        :type op: bytes
+        :returns: The rectangle of the canvas that changed, or None if nothing changed.
+        :rtype: pygame.Rect
+        :raises ValueError: If the operation isn't valid.
+        """
+        canvas = self.canvas
+        tag = op[:1]
+        try:
+            if tag == b"S":
+                flags, thickness, red, green, blue, opacity, count, x, y = STROKE.unpack_from(op)[1:]
+                if thickness == 0 or count == 0:
+                    raise ValueError("stroke without thickness or points")
+                points = decode_points(op, count, (x, y), flags & WIDE_STEPS)
+                xs, ys = zip(*points)
+                if min(xs) < -MAX_OUTSIDE or min(ys) < -MAX_OUTSIDE or max(xs) >= canvas.width + MAX_OUTSIDE or \
+                        max(ys) >= canvas.height + MAX_OUTSIDE:
+                    raise ValueError("stroke point more than %d pixels outside the painting" % MAX_OUTSIDE)
+                color = canvas.background_color if flags & ERASE else canvas.snap((red, green, blue))
+                opacity /= 255
+                antialias = bool(flags & ANTIALIAS)
+                stroke = self.strokes.get(sender)
+                if flags & NEW_STROKE or stroke is None or (
+                        stroke.color, stroke.diameter, stroke.opacity, stroke.antialias) != (
+                        color, thickness, opacity, antialias):
+                    stroke = self.strokes[sender] = BrushStroke(canvas, color, thickness, opacity, self.stamps,
+                                                                antialias=antialias)
+                return stroke.add(points)
+            # Any other operation ends the stroke of its sender
+            self.strokes.pop(sender, None)
+            if tag == END and len(op) == 1:
+                return None
+            if tag == CLEAR and len(op) == 1:
+                # Strokes in progress start afresh over the cleared painting
+                self.strokes.clear()
+                canvas.clear()
+                return canvas.get_rect()
+            if tag == b"F" and len(op) == FILL.size:
+                x, y, red, green, blue, connectivity = FILL.unpack(op)[1:]
+                if connectivity not in (4, 8):
+                    raise ValueError("fill connectivity must be 4 or 8, not %d" % connectivity)
+                if not canvas.get_rect().collidepoint(x, y):
+                    return None
+                return canvas.fill((x, y), canvas.get_at((x, y)), (red, green, blue), connectivity)
+            if tag == b"R" and len(op) == REPLACE.size:
+                x, y, red, green, blue, tolerance = REPLACE.unpack(op)[1:]
+                if not canvas.get_rect().collidepoint(x, y):
+                    return None
+                return canvas.replace(canvas.get_at((x, y)), (red, green, blue), tolerance)[1]
+        except struct.error as error:
+            raise ValueError("truncated operation: %s" % error) from None
+        raise ValueError("invalid operation %r" % op[:1])
+
+    def capture(self):
+        """
+        Copies everything a snapshot holds. Only the allocated tiles of the painting are copied.
+        :param self: The calling object
+        :type self: Replica
+        :returns: The state of the replica, to pass to encode_snapshot.
+        :rtype: tuple
+        """
+        strokes = [(sender, stroke.color, stroke.diameter, stroke.antialias, stroke.opacity, stroke.offset, stroke.last,
+                    {tile: alpha.copy() for tile, alpha in stroke.tile_alphas.items()})
+                   for sender, stroke in self.strokes.items()]
+        return strokes, self.canvas, storage.copy_tiles(self.canvas, self.canvas.used_tiles())
+
+
+def encode_snapshot(state):
+    """
+    Encodes a snapshot. Only the canvas's size and pixel format are read, so this may run on another thread while the
+    painting changes.
+    :param state: The state of a replica, as returned by Replica.capture.
+    :type state: tuple
+    :returns: The compressed data of a snapshot of that state.
+    :rtype: bytes
+    """
+    strokes, canvas, tiles = state
+    output = io.BytesIO()
+    output.write(STROKES.pack(len(strokes)))
+    for sender, color, thickness, antialias, opacity, offset, last, alphas in strokes:
+        output.write(STROKE_STATE.pack(sender, *color[:3], thickness, antialias, opacity, offset, last is not None,
+                                       *(last or (0, 0)), len(alphas)))
+        for (column, row), alpha in alphas.items():
+            output.write(TILE.pack(column, row, alpha.shape[1], alpha.shape[0]))
+            output.write(alpha.tobytes())
+    storage.write_native(output, canvas, tiles)
+    return zlib.compress(output.getvalue(), 1)
+
+
+def decode_snapshot(data):
+    """
+    :param data: The compressed data of a snapshot.
+    :type data: bytes
+    :returns: A replica in the state held by the snapshot.
+    :rtype: Replica
+    :raises ValueError: If the data isn't a valid snapshot.
+    """
+    try:
+        data = zlib.decompress(data)
+        (count,) = STROKES.unpack_from(data)
+        offset = STROKES.size
+        strokes = []
+        for _ in range(count):
+            sender, red, green, blue, thickness, antialias, opacity, stamp_offset, painted, x, y, tiles = (
+                STROKE_STATE.unpack_from(data, offset))
+            offset += STROKE_STATE.size
+            alphas = {}
+            for _ in range(tiles):
+                column, row, width, height = TILE.unpack_from(data, offset)
+                offset += TILE.size
+                alphas[(column, row)] = np.frombuffer(data, np.uint8, width * height, offset).reshape(
+                    height, width).copy()
+                offset += width * height
+            strokes.append((sender, (red, green, blue), thickness, bool(antialias), opacity, stamp_offset,
+                            (x, y) if painted else None, alphas))
+    except (struct.error, zlib.error) as error:
+        raise ValueError("invalid snapshot: %s" % error) from None
+    replica = Replica(storage.read_native(data[offset:]))
+    for sender, color, thickness, antialias, opacity, stamp_offset, last, alphas in strokes:
+        stroke = replica.strokes[sender] = BrushStroke(replica.canvas, color, thickness, opacity, replica.stamps,
+                                                       antialias=antialias)
+        stroke.offset = stamp_offset
+        stroke.last = last
+        stroke.tile_alphas = alphas
+    return replica
+
+
+class CanvasServer:
+    """Orders the operations of the clients of a shared painting and broadcasts them.
+    The operations that arrive while the event loop handles its ready connections are broadcast together, as one
+    write per client."""
+
+    def __init__(self, canvas):
+        """Initializes a server of a painting, with a snapshot of it for the first clients.
+        :param self: The calling object/object being initialized
+        :type self: CanvasServer
+        :param canvas: The painting to share.
+        :type canvas: Canvas
+        """
+        self.replica = Replica(canvas)
+        self.sequence = 0  # Number of operations ordered so far
+        self.snapshot = (0, encode_snapshot(self.replica.capture()))  # (operations before it, data) of the snapshot
+        self.snapshotting = False  # Whether a snapshot is being encoded
+        self.tail = collections.deque()  # (number, message) of each operation since the snapshot, in order
+        self.writers = {}  # Connection to each client by id
+        self.connected = set()  # Ids of the clients whose connection is still being handled
+        self.next_id = 1  # Id to give the next client, unless a connected client has it
+        self.outgoing = []  # Messages to broadcast at the end of the loop iteration
+        self.apply_time = 0.0  # Seconds spent applying operations to the server's painting
+        self.snapshots = 0  # Number of snapshots taken after the first one
+        self.clients = 0  # Number of clients that connected
+
+    async def serve(self, address):
+        """
+        Accepts clients until cancelled.
+        :param self: The calling object
+        :type self: CanvasServer
+        :param address: The (host, port) to listen on, or the path of a Unix socket.
+        :type address: tuple or str
+        :returns: The server, started. Its sockets give the address it listens on, e.g. the port picked for port 0.
+        :rtype: asyncio.AbstractServer
+        """
+        if isinstance(address, str):
+            return await asyncio.start_unix_server(self.handle_client, address)
+        return await asyncio.start_server(self.handle_client, *address)
+
+    async def handle_client(self, reader, writer):
+        """
+        Sends a client the snapshot and the operations since, then orders the operations it sends until it
+        disconnects. The connection is closed at once if every client id is taken.
+        :param self: The calling object
+        :type self: CanvasServer
+        :param reader: The stream to read the client's operations from.
+        :type reader: asyncio.StreamReader
+        :param writer: The stream to the client.
+        :type writer: asyncio.StreamWriter
+        """
+        if len(self.connected) >= MAX_CLIENTS:
+            writer.close()
+            return
+        # Ids are 16-bit and reused once they wrap around, skipping those of clients still connected, so that the
+        # operations of two clients never share an id
+        while self.next_id in self.connected:
+            self.next_id = self.next_id % MAX_CLIENTS + 1
+        client = self.next_id
+        self.next_id = self.next_id % MAX_CLIENTS + 1
+        self.connected.add(client)
+        self.clients += 1
+        # Send the operations still to broadcast first, so that the client gets each operation once: from the tail
+        # below, or broadcast once it is added
+        self.broadcast()
+        welcome = WELCOME.pack(b"W", VERSION, client) + self.snapshot[1]
+        writer.write(MESSAGE.pack(len(welcome), 0) + welcome)
+        writer.writelines(message for _, message in self.tail)
+        self.writers[client] = writer
+        try:
+            while True:
+                length, _ = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+                if length > MAX_OPERATION:
+                    raise ValueError("operation of %d bytes" % length)
+                self.order(client, await reader.readexactly(length))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, asyncio.CancelledError):
+            pass  # The client disconnected, sent an invalid operation, or the server is stopping
+        finally:
+            self.writers.pop(client, None)
+            if client in self.replica.strokes:
+                self.order(client, END)  # End the stroke the client was painting
+            self.connected.discard(client)
+            writer.close()
+
+    def order(self, sender, op):
+        """
+        Gives an operation the next number, applies it to the server's painting and queues it for broadcasting.
+        :param self: The calling object
+        :type self: CanvasServer
+        :param sender: The id of the client that sent it.
+        :type sender: int
+        :param op: The operation.
+        :type op: bytes
+        :raises ValueError: If the operation isn't valid, in which case it is dropped.
+        """
+        started = asyncio.get_running_loop().time()
+        self.replica.apply(sender, op)
+        self.apply_time += asyncio.get_running_loop().time() - started
+        self.sequence += 1
+        message = MESSAGE.pack(len(op), sender) + op
+        self.tail.append((self.sequence, message))
+        if not self.outgoing:
+            asyncio.get_running_loop().call_soon(self.broadcast)
+        self.outgoing.append(message)
+        if not self.snapshotting and self.sequence - self.snapshot[0] >= SNAPSHOT_INTERVAL:
+            self.snapshotting = True
+            asyncio.get_running_loop().create_task(self.take_snapshot())
+
+    def broadcast(self):
+        """
+        Sends the operations ordered since the last broadcast to every client, dropping the clients that fell too
+        far behind.
+        :param self: The calling object
+        :type self: CanvasServer
+        """
+        if not self.outgoing:
+            return
+        data = b"".join(self.outgoing)
+        self.outgoing = []
+        for client, writer in list(self.writers.items()):
+            if writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                del self.writers[client]
+                writer.transport.abort()
+            else:
+                writer.write(data)
+
+    async def take_snapshot(self):
+        """
+        Snapshots the painting, compressing it on another thread, and forgets the operations before it.
+        :param self: The calling object
+        :type self: CanvasServer
+        """
+        sequence = self.sequence
+        data = await asyncio.get_running_loop().run_in_executor(None, encode_snapshot, self.replica.capture())
+        self.snapshot = (sequence, data)
+        while self.tail and self.tail[0][0] <= sequence:
+            self.tail.popleft()
+        self.snapshots += 1
+        self.snapshotting = False
+
+
+class Client:
+    """Connection of the paint app to a shared painting.
+    The connection is run by an asyncio event loop on a background thread, which queues the operations the server
+    broadcasts and posts an event to wake the app up to apply them; the app sends its operations through it without
+    waiting."""
+
+    def __init__(self, address, wake_event):
+        """Connects to a server and receives the painting.
+        :param self: The calling object/object being initialized
+        :type self: Client
+        :param address: The (host, port) of the server, or the path of its Unix socket.
+        :type address: tuple or str
+        :param wake_event: The type of the event to post when operations arrive or the connection is lost.
+        :type wake_event: int
+        :raises OSError: If the server can't be reached.
+        :raises ValueError: If the server doesn't send a valid snapshot.
+        """
+        self.wake_event = wake_event
+        self.received = collections.deque()  # (sender, operation) of each operation to apply, in order
+        self.waking = False  # Whether a wake event was posted that the app hasn't handled yet
+        self.closed = False  # Whether the connection was lost
+        self.writer = None
+        self.receiving = None  # The task receiving operations
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="shared canvas", daemon=True)
+        self.thread.start()
+        future = asyncio.run_coroutine_threadsafe(self.connect(address), self.loop)
+        try:
+            self.id, snapshot = future.result(CONNECT_TIMEOUT)
+        except BaseException:
+            self.close()
+            raise
+        self.replica = decode_snapshot(snapshot)
+
+    async def connect(self, address):
+        """
+        Opens the connection and reads the welcome, then starts receiving operations. Runs on the event loop.
+        :param self: The calling object
+        :type self: Client
+        :param address: The (host, port) of the server, or the path of its Unix socket.
+        :type address: tuple or str
+        :returns: The id the server gave the client and the compressed snapshot.
+        :rtype: tuple
+        :raises ValueError: If the server doesn't start with a welcome of this version.
+        """
+        if isinstance(address, str):
+            reader, self.writer = await asyncio.open_unix_connection(address)
+        else:
+            reader, self.writer = await asyncio.open_connection(*address)
+        try:
+            length, _ = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+            welcome = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise ValueError("the server closed the connection") from None
+        tag, version, client = WELCOME.unpack_from(welcome)
+        if tag != b"W" or version != VERSION:
+            raise ValueError("not a version %d shared canvas server" % VERSION)
+        self.receiving = self.loop.create_task(self.receive(reader))
+        return client, welcome[WELCOME.size:]
+
+    async def receive(self, reader):
+        """
+        Queues the operations the server broadcasts until the connection is lost. Runs on the event loop.
+        :param self: The calling object
+        :type self: Client
+        :param reader: The stream from the server.
+        :type reader: asyncio.StreamReader
+        """
+        try:
+            while True:
+                length, sender = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+                self.received.append((sender, await reader.readexactly(length)))
+                self.wake()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.closed = True
+            self.wake()
+
+    def wake(self):
+        """
+        Posts the wake event unless one is already waiting to be handled.
+        :param self: The calling object
+        :type self: Client
+        """
+        if not self.waking:
+            self.waking = True
+            pygame.event.post(pygame.event.Event(self.wake_event))
+
+    def apply_received(self):
+        """
+        Applies the operations received since the last call to the painting, in order.
+        :param self: The calling object
+        :type self: Client
+        :returns: The rectangle of the canvas changed by each operation, or None if it changed nothing.
+        :rtype: generator
+        """
+        # Operations queued from here on post another event
+        self.waking = False
+        received = self.received
+        while received:
+            sender, op = received.popleft()
+            try:
+                yield self.replica.apply(sender, op)
+            except ValueError:
+                pass  # The server applied it too, so it can't be invalid unless the server is of another version
+
+    def send(self, op):
+        """
+        Sends an operation to the server, to be applied once the server broadcasts it.
+        :param self: The calling object
+        :type self: Client
+        :param op: The operation.
+        :type op: bytes
+        """
+        if not self.closed:
+            self.loop.call_soon_threadsafe(self.writer.write, MESSAGE.pack(len(op), 0) + op)
+
+    def send_stroke(self, points, new_stroke, brush):
+        """
+        Sends the points a stroke continues through, as many operations as it takes.
+        :param self: The calling object
+        :type self: Client
+        :param points: The canvas positions, in order.
+        :type points: list
+        :param new_stroke: Whether the points start a new stroke.
+        :type new_stroke: bool
+        :param brush: The paintbrush, whose color, thickness, opacity and anti-aliasing the stroke is painted with,
+            and which erases unless it is painting.
+        :type brush: PaintBrush
+        """
+        for start in range(0, max(len(points) - 1, 1), MAX_POINTS - 1):
+            self.send(stroke_op(points[start:start + MAX_POINTS], new_stroke and start == 0, brush.color,
+                                brush.thickness, brush.opacity, not brush.is_painting, brush.antialias))
+
+    async def disconnect(self):
+        """
+        Stops receiving operations and closes the connection. Runs on the event loop.
+        :param self: The calling object
+        :type self: Client
+        """
+        if self.receiving is not None:
+            self.receiving.cancel()
+            try:
+                await self.receiving
+            except asyncio.CancelledError:
+                pass
+        if self.writer is not None:
+            self.writer.close()
+
+    def close(self):
+        """
+        Closes the connection and stops the event loop.
+        :param self: The calling object
+        :type self: Client
+        """
+        self.closed = True
+        asyncio.run_coroutine_threadsafe(self.disconnect(), self.loop).result(CONNECT_TIMEOUT)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
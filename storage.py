@@ -0,0 +1,413 @@
+"""Saving and loading paintings, and autosaving them as they are painted.
+
+Paintings are saved as PNG images, or in a native format holding the tiles of the canvas as they are stored: a header,
+a table of the tiles that aren't of the background color, and the raw pixels of the allocated tiles. A native file is
+memory-mapped to load it, and saving one only writes the tiles that were painted on.
+
+An autosave directory holds a snapshot of the painting in the native format and an append-only journal of the tiles
+changed since the snapshot was written. The journal is appended to by a background thread, so autosaving costs the
+render loop no more than a copy of the changed tiles, and the last session is recovered by loading the snapshot and
+replaying the journal over it.
+"""
+import mmap
+import os
+import queue
+import struct
+import threading
+import zlib
+
+import numpy as np
+import pygame
+
+from canvas import Canvas
+
+# Magic, version, bytes per pixel, tile size, width, height and background color of a native file or a journal
+HEADER = struct.Struct("<4sBBHII3B")
+SNAPSHOT_MAGIC = b"PCNV"
+JOURNAL_MAGIC = b"PJNL"
+VERSION = 1
+# Column, row, kind, color and offset of the pixels of each tile of a native file
+TILE_ENTRY = struct.Struct("<iiB3BQ")
+# Column, row, kind, color and length of the compressed pixels of each record of a journal
+RECORD = struct.Struct("<iiB3BI")
+UNIFORM, PIXELS = 0, 1  # Kinds of tile: of one color, or with pixels of its own
+
+SNAPSHOT_NAME = "snapshot.canvas"
+JOURNAL_NAME = "journal"
+
+
+def write_header(output, magic, canvas):
+    """
+    Writes the header describing a canvas, and its palette if it is indexed.
+    :param output: The file to write to.
+    :type output: file
+    :param magic: SNAPSHOT_MAGIC or JOURNAL_MAGIC.
+    :type magic: bytes
+    :param canvas: The canvas.
+    :type canvas: Canvas
+    """
+    output.write(HEADER.pack(magic, VERSION, canvas.format.get_bytesize(), canvas.TILE_SIZE, canvas.width,
+                             canvas.height, *canvas.background_color))
+    if canvas.palette is not None:
+        output.write(bytes(channel for color in canvas.palette for channel in color))
+
+
+def read_header(data, magic):
+    """
+    :param data: The contents of a native file or a journal.
+    :type data: bytes
+    :param magic: SNAPSHOT_MAGIC or JOURNAL_MAGIC.
+    :type magic: bytes
+    :returns: A new canvas of the background color described by the header, and the offset of the data after it.
+    :rtype: tuple
+    :raises ValueError: If the data doesn't start with a valid header.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("file is too short to hold a header")
+    found, version, bytesize, tile_size, width, height, *background = HEADER.unpack_from(data)
+    if found != magic or version != VERSION:
+        raise ValueError("not a version %d %s file" % (VERSION, magic.decode()))
+    if tile_size != Canvas.TILE_SIZE or bytesize not in (1, 4):
+        raise ValueError("unsupported tile size %d or pixel size %d" % (tile_size, bytesize))
+    offset = HEADER.size
+    palette = None
+    if bytesize == 1:
+        palette = np.frombuffer(data, np.uint8, 256 * 3, offset).reshape(256, 3).tolist()
+        offset += 256 * 3
+    return Canvas(width, height, tuple(background), palette), offset
+
+
+def tile_data(canvas, tile):
+    """
+    :param canvas: A canvas.
+    :type canvas: Canvas
+    :param tile: The (column, row) of a tile.
+    :type tile: tuple
+    :returns: The kind of the tile, its color, and a copy of its raw pixels, or None for a tile of one color.
+    :rtype: tuple
+    """
+    surface = canvas.tiles.get(tile)
+    if surface is None:
+        return UNIFORM, canvas.tile_color(tile), None
+    return PIXELS, (0, 0, 0), np.ascontiguousarray(pygame.surfarray.pixels2d(surface)).tobytes()
+
+
+def set_tile(canvas, tile, kind, color, pixels):
+    """
+    Replaces the pixels of a tile with saved ones.
+    :param canvas: A canvas.
+    :type canvas: Canvas
+    :param tile: The (column, row) of a tile.
+    :type tile: tuple
+    :param kind: UNIFORM or PIXELS.
+    :type kind: int
+    :param color: The color of every pixel of a UNIFORM tile.
+    :type color: tuple
+    :param pixels: The raw pixels of a PIXELS tile.
+    :type pixels: bytes
+    """
+    rect = canvas.tile_rect(tile)
+    if rect.width == 0 or rect.height == 0:
+        raise ValueError("tile %r is off the canvas" % (tile,))
+    if kind == UNIFORM:
+        canvas.set_uniform(tile, color)
+    else:
+        destination = pygame.surfarray.pixels2d(canvas.surface(tile))
+        destination[:] = np.frombuffer(pixels, destination.dtype, destination.size).reshape(destination.shape)
+        del destination
+    canvas.invalidate(rect)
+
+
+def copy_tiles(canvas, tiles):
+    """
+    :param canvas: A canvas.
+    :type canvas: Canvas
+    :param tiles: The (column, row) of tiles of the canvas.
+    :type tiles: iterable
+    :returns: The (column, row), kind, color and a copy of the raw pixels of each tile, in order, which stay valid as
+        the canvas changes.
+    :rtype: list
+    """
+    return [(tile,) + tile_data(canvas, tile) for tile in sorted(tiles)]
+
+
+def write_native(output, canvas, tiles):
+    """
+    Writes a canvas in the native format. Only the canvas's size and pixel format are read, so this may run on
+    another thread while the canvas changes.
+    :param output: The file to write to.
+    :type output: file
+    :param canvas: The canvas.
+    :type canvas: Canvas
+    :param tiles: Every tile of the canvas that isn't of the background color, as returned by copy_tiles.
+    :type tiles: list
+    """
+    start = output.tell()  # Offsets are from the start of the header
+    write_header(output, SNAPSHOT_MAGIC, canvas)
+    output.write(struct.pack("<I", len(tiles)))
+    offset = output.tell() - start + len(tiles) * TILE_ENTRY.size
+    for (column, row), kind, color, pixels in tiles:
+        output.write(TILE_ENTRY.pack(column, row, kind, *color, offset if pixels is not None else 0))
+        if pixels is not None:
+            offset += len(pixels)
+    for _, _, _, pixels in tiles:
+        if pixels is not None:
+            output.write(pixels)
+
+
+def read_native(data):
+    """
+    :param data: The contents of a native file, e.g. memory-mapped.
+    :type data: bytes
+    :returns: The canvas the data holds.
+    :rtype: Canvas
+    :raises ValueError: If the data isn't a valid native file.
+    """
+    canvas, offset = read_header(data, SNAPSHOT_MAGIC)
+    (count,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    if offset + count * TILE_ENTRY.size > len(data):
+        raise ValueError("tile table runs past the end of the file")
+    for column, row, kind, *color, start in TILE_ENTRY.iter_unpack(data[offset:offset + count * TILE_ENTRY.size]):
+        tile = (column, row)
+        pixels = None
+        if kind == PIXELS:
+            rect = canvas.tile_rect(tile)
+            end = start + rect.width * rect.height * canvas.format.get_bytesize()
+            if end > len(data):
+                raise ValueError("pixels of tile %r run past the end of the file" % (tile,))
+            pixels = memoryview(data)[start:end]
+        set_tile(canvas, tile, kind, tuple(color), pixels)
+        del pixels  # A memory map can't be closed while a view of it is held
+    canvas.take_changed()  # Loading isn't a change to save
+    return canvas
+
+
+def save_native(canvas, path):
+    """
+    Saves a canvas in the native format. Only the tiles that aren't of the background color are written, so the time
+    taken grows with the painted area rather than the size of the canvas.
+    The file is written next to path and then moved over it, so a crash never leaves a partly written file.
+    :param canvas: The canvas to save.
+    :type canvas: Canvas
+    :param path: The path of the file.
+    :type path: str
+    """
+    with open(path + ".tmp", "wb") as output:
+        write_native(output, canvas, copy_tiles(canvas, canvas.used_tiles()))
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def load_native(path):
+    """
+    Loads a canvas saved in the native format. The file is memory-mapped, so the pixels of each tile are copied
+    straight from the pages of the file.
+    :param path: The path of the file.
+    :type path: str
+    :returns: The canvas.
+    :rtype: Canvas
+    :raises ValueError: If the file isn't a valid native file.
+    """
+    with open(path, "rb") as source, mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return read_native(data)
+
+
+def save(canvas, path):
+    """
+    Saves a canvas as a PNG image if the path ends in .png, and in the native format otherwise.
+    :param canvas: The canvas to save.
+    :type canvas: Canvas
+    :param path: The path of the file.
+    :type path: str
+    """
+    if path.lower().endswith(".png"):
+        pygame.image.save(canvas.to_surface(), path)
+    else:
+        save_native(canvas, path)
+
+
+def load(path, background_color=(255, 255, 255), palette=None):
+    """
+    Loads a canvas from any image format pygame can read, or from the native format.
+    :param path: The path of the file.
+    :type path: str
+    :param background_color: The background color of a canvas loaded from an image.
+    :type background_color: tuple
+    :param palette: The palette of an indexed canvas to load an image into, or None for an RGB canvas. A native file
+        keeps the format it was saved with.
+    :type palette: list
+    :returns: The canvas.
+    :rtype: Canvas
+    :raises ValueError: If the file isn't a valid native file or image.
+    """
+    with open(path, "rb") as source:
+        magic = source.read(len(SNAPSHOT_MAGIC))
+    if magic == SNAPSHOT_MAGIC:
+        return load_native(path)
+    try:
+        image = pygame.image.load(path)
+    except pygame.error as error:
+        raise ValueError("%s: %s" % (path, error)) from None
+    canvas = Canvas(image.get_width(), image.get_height(), background_color, palette)
+    canvas.blit(image, (0, 0))
+    canvas.take_changed()
+    return canvas
+
+
+def replay_journal(canvas, path):
+    """
+    Applies the records of a journal to a canvas in order. A record cut short by a crash ends the journal.
+    :param canvas: The canvas the journal was written for.
+    :type canvas: Canvas
+    :param path: The path of the journal.
+    :type path: str
+    :returns: The number of records applied.
+    :rtype: int
+    :raises ValueError: If the journal wasn't written for a canvas like this one.
+    """
+    with open(path, "rb") as source:
+        data = source.read()
+    journal_canvas, offset = read_header(data, JOURNAL_MAGIC)
+    if (journal_canvas.width, journal_canvas.height, journal_canvas.palette) != (canvas.width, canvas.height,
+                                                                               canvas.palette):
+        raise ValueError("journal was written for a different canvas")
+    count = 0
+    while offset + RECORD.size <= len(data):
+        column, row, kind, *color, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if offset + length > len(data):
+            break
+        try:
+            pixels = zlib.decompress(data[offset:offset + length]) if kind == PIXELS else None
+        except zlib.error:
+            break
+        offset += length
+        set_tile(canvas, (column, row), kind, tuple(color), pixels)
+        count += 1
+    canvas.take_changed()
+    return count
+
+
+def recover(directory):
+    """
+    Recovers the painting of the last session autosaved to a directory.
+    :param directory: The autosave directory.
+    :type directory: str
+    :returns: The canvas as it was at the last checkpoint, or None if nothing was autosaved there.
+    :rtype: Canvas
+    :raises ValueError: If the autosaved files are damaged.
+    """
+    snapshot = os.path.join(directory, SNAPSHOT_NAME)
+    journal = os.path.join(directory, JOURNAL_NAME)
+    canvas = None
+    if os.path.exists(snapshot):
+        canvas = load_native(snapshot)
+    if os.path.exists(journal) and os.path.getsize(journal) > 0:
+        if canvas is None:
+            with open(journal, "rb") as source:
+                canvas, _ = read_header(source.read(HEADER.size + 256 * 3), JOURNAL_MAGIC)
+        replay_journal(canvas, journal)
+    return canvas
+
+
+class Autosaver:
+    """Autosaves a canvas to a directory as a snapshot and a journal of the tiles changed since.
+    At each checkpoint the tiles changed since the last one are copied on the calling thread, and a background
+    thread compresses them and appends them to the journal, so a checkpoint takes time in proportion to the painted
+    area it saves. The journal is folded into a new snapshot when the autosaver is closed."""
+
+    def __init__(self, canvas, directory):
+        """Writes a snapshot of the canvas with an empty journal, and starts the thread writing the journal.
+        :param self: The calling object/object being initialized
+        :type self: Autosaver
+        :param canvas: The canvas to autosave, e.g. the one recovered from the directory.
+        :type canvas: Canvas
+        :param directory: The directory to autosave to, created if it doesn't exist.
+        :type directory: str
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.canvas = canvas
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.journal_path = os.path.join(directory, JOURNAL_NAME)
+        self.checkpoints = 0  # Number of checkpoints that saved changed tiles
+        self.tiles_saved = 0  # Number of tiles saved by them
+        self.error = None  # The last error writing the journal, or None
+        self.pending = queue.Queue()  # Lists of copied tiles for the thread to append, None to stop it
+        self.journal = None
+        # Drop the journal of the last session first, so that it's never replayed over a snapshot of another canvas
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        canvas.take_changed()
+        save_native(canvas, self.snapshot_path)
+        self.reset_journal()
+        self.thread = threading.Thread(target=self.write_journal, name="autosave", daemon=True)
+        self.thread.start()
+
+    def reset_journal(self):
+        """
+        Starts an empty journal, written over the snapshot.
+        :param self: The calling object
+        :type self: Autosaver
+        """
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = open(self.journal_path, "wb")
+        write_header(self.journal, JOURNAL_MAGIC, self.canvas)
+        self.journal.flush()
+
+    def checkpoint(self):
+        """
+        Hands the tiles of the canvas changed since the last checkpoint to the thread writing the journal.
+        :param self: The calling object
+        :type self: Autosaver
+        :returns: The number of tiles saved.
+        :rtype: int
+        """
+        changed = self.canvas.take_changed()
+        if not changed:
+            return 0
+        self.pending.put(copy_tiles(self.canvas, changed))
+        self.checkpoints += 1
+        self.tiles_saved += len(changed)
+        return len(changed)
+
+    def write_journal(self):
+        """
+        Appends the tiles of each checkpoint to the journal until close is called. Runs in the background thread.
+        :param self: The calling object
+        :type self: Autosaver
+        """
+        while True:
+            tiles = self.pending.get()
+            if tiles is None:
+                return
+            try:
+                for (column, row), kind, color, pixels in tiles:
+                    data = zlib.compress(pixels, 1) if pixels is not None else b""
+                    self.journal.write(RECORD.pack(column, row, kind, *color, len(data)))
+                    self.journal.write(data)
+                self.journal.flush()
+                os.fsync(self.journal.fileno())
+            except OSError as error:
+                self.error = error
+
+    def close(self):
+        """
+        Saves the changes since the last checkpoint, stops the thread, and folds the journal into a new snapshot of
+        the canvas.
+        :param self: The calling object
+        :type self: Autosaver
+        """
+        self.checkpoint()
+        self.pending.put(None)
+        self.thread.join()
+        try:
+            # A crash after the new snapshot is written but before the journal is emptied only replays changes the
+            # snapshot already holds
+            save_native(self.canvas, self.snapshot_path)
+            self.reset_journal()
+        except OSError as error:
+            self.error = error
+        self.journal.close()